@@ -6,7 +6,10 @@ from config.settings import config_by_name
 from app.infraestructure.utils.currency_utils import format_currency_simple
 
 # 👉 Importa la instancia global de SQLAlchemy que ya tienes
-from app.infraestructure.utils.db import db, DATABASE_URL
+from app.infraestructure.utils.db import db, DATABASE_URL, print_pool_report
+from app.infraestructure.utils.unit_of_work import init_unit_of_work
+from app.infraestructure.utils.query_counter import init_query_counter
+from app.infraestructure.utils.cie10 import indice_cie10
 
 # Blueprints existentes
 from adapters.input.flask_app.controllers.user_controller import user_html
@@ -51,26 +54,29 @@ def create_app(config_name: str = "development") -> Flask:
     flask_app.jinja_env.filters["currency"] = format_currency_simple
 
     # ────────────── SQLAlchemy: bind de la app ──────────────
-    # MUY IMPORTANTE: con esto db.session queda atado a la app
+    # MUY IMPORTANTE: con esto db.session queda atado a la app.
+    # Aquí se crea el engine del proceso desde SQLALCHEMY_DATABASE_URI y
+    # SQLALCHEMY_ENGINE_OPTIONS de esta config; SessionLocal usa ese mismo pool.
     db.init_app(flask_app)
+    print_pool_report()
 
-    # Autocommit por request:
-    # - Si no hubo excepción -> commit
-    # - Si hubo -> rollback
+    # Una sesión/conexión por request compartida por repositorios, servicios y
+    # controladores (SessionLocal()), con métricas de checkout y hold
+    init_unit_of_work(flask_app)
+
+    # Conteo de SQL por request + alerta de N+1 (headers X-DB-Queries/X-DB-Time en dev)
+    init_query_counter(flask_app)
+
+    # Catálogo CIE-10 en memoria para el autocompletado de diagnósticos.
+    # Si no se puede leer aquí, queda vacío y se reintenta más tarde (ver utils/cie10.py).
+    print(f"🩺 Catálogo CIE-10: {len(indice_cie10())} códigos en memoria")
+
+    # db.session es la sesión del request (ver _SharedEngineSQLAlchemy en utils/db.py):
+    # NO se confirma al terminar el request. Cada caso de uso hace su commit explícito
+    # y lo no confirmado se descarta en end_request_session (init_unit_of_work).
     @flask_app.teardown_request
-    def _auto_commit_teardown(exc):
-        try:
-            if exc is None:
-                db.session.commit()
-            else:
-                db.session.rollback()
-        except Exception:
-            # si commit falla, aseguremos rollback y propagamos
-            db.session.rollback()
-            raise
-        finally:
-            # siempre limpia el session context
-            db.session.remove()
+    def _remove_db_session(exc):
+        db.session.remove()
 
     # ────────────── Registro de Blueprints (evita doble registro) ──────────────
     if "user_html" not in flask_app.blueprints:
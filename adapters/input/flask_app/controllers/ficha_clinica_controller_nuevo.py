@@ -15,8 +15,36 @@ from app.domain.models.examenes_medicos import (
     DiagnosticoMedico,
     Tratamiento,
 )
+from app.domain.models.cliente import Cliente
+from app.infraestructure.repositories.autoguardado_repository import AutoguardadoRepository
+from app.infraestructure.repositories.ficha_examenes_repository import FichaExamenesRepository
+from app.infraestructure.utils.numeracion import numero_consulta_sql
+from app.infraestructure.utils.refraccion import COLUMNAS_DERIVADAS, COLUMNAS_NUMERICAS, valores_numericos
+from app.domain.use_cases.services.refraccion_analytics_service import invalidar_serie_paciente
+from sqlalchemy import or_, select, tuple_
 from sqlalchemy.orm import joinedload
-from datetime import datetime
+from datetime import datetime, timedelta
+import base64
+
+# Paginación del listado de fichas (keyset sobre fecha_consulta, ficha_id)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Secciones de examen que carga cada vista (una consulta por sección, no por ficha)
+LISTADO_SECCIONES = (
+    'biomicroscopia', 'reflejos_pupilares', 'fondo_ojo',
+    'parametros_clinicos', 'diagnostico', 'tratamiento',
+)
+TIMELINE_SECCIONES = ('biomicroscopia', 'fondo_ojo', 'presion_intraocular', 'diagnostico', 'tratamiento')
+
+# Columnas que acepta el autoguardado (PATCH); identidad, numeración, auditoría y
+# valores numéricos derivados de la refracción quedan fuera
+CAMPOS_FICHA_AUTOGUARDADO = frozenset(
+    col.key for col in FichaClinica.__table__.c if not col.system
+) - {'ficha_id', 'paciente_medico_id', 'usuario_id', 'numero_consulta', 'fecha_creacion'} - COLUMNAS_DERIVADAS
+
+# Campos cuya edición deja obsoleta la serie de refracción cacheada del paciente
+CAMPOS_SERIE_REFRACCION = frozenset(COLUMNAS_NUMERICAS) | {'fecha_consulta', 'paciente_medico_id'}
 
 class FichaClinicaController:
     """
@@ -87,6 +115,19 @@ class FichaClinicaController:
             partes.append(fo.observaciones)
         return ". ".join(partes)
 
+    def _resumen_diagnostico(self, dx: DiagnosticoMedico) -> str:
+        principal = (dx.diagnostico_principal or "").strip()
+        if dx.cie_10_principal:
+            principal = f"{principal} ({dx.cie_10_principal})".strip()
+        return self._join_values(principal, dx.diagnosticos_secundarios)
+
+    def _resumen_tratamiento(self, tx: Tratamiento) -> str:
+        return ". ".join(
+            str(v).strip()
+            for v in (tx.medicamentos, tx.tratamiento_no_farmacologico, tx.recomendaciones)
+            if v and str(v).strip()
+        )
+
     def _resumen_parametros(self, parametros: ParametrosClinicos) -> str:
         presion = self._join_values(
             parametros.presion_sistolica and f"PAS {parametros.presion_sistolica}",
@@ -128,21 +169,125 @@ class FichaClinicaController:
     # ---------------------------------------------------------------------
     # LISTAR TODAS
     # ---------------------------------------------------------------------
+    @staticmethod
+    def _encode_cursor(ficha: FichaClinica) -> str:
+        raw = f"{ficha.fecha_consulta.isoformat()}|{ficha.ficha_id}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str):
+        """Devuelve (fecha_consulta, ficha_id) o None si el cursor no es válido."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            fecha_txt, ficha_txt = raw.rsplit("|", 1)
+            return datetime.fromisoformat(fecha_txt), int(ficha_txt)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _parse_fecha_filtro(valor, fin_de_dia=False):
+        if not valor:
+            return None
+        try:
+            fecha = datetime.fromisoformat(valor)
+        except ValueError:
+            return None
+        if fin_de_dia and len(valor) <= 10:
+            # 'YYYY-MM-DD' como límite superior incluye todo el día
+            fecha = fecha + timedelta(days=1)
+        return fecha
+
+    def _filtrar_fichas(self, query, args):
+        """Aplica los filtros de servidor: rango de fechas, médico, estado y paciente."""
+        fecha_desde = self._parse_fecha_filtro(args.get("fecha_desde"))
+        fecha_hasta = self._parse_fecha_filtro(args.get("fecha_hasta"), fin_de_dia=True)
+        if fecha_desde:
+            query = query.filter(FichaClinica.fecha_consulta >= fecha_desde)
+        if fecha_hasta:
+            query = query.filter(FichaClinica.fecha_consulta < fecha_hasta)
+
+        usuario_id = args.get("usuario_id", type=int)
+        if usuario_id:
+            query = query.filter(FichaClinica.usuario_id == usuario_id)
+
+        estado = (args.get("estado") or "").strip()
+        if estado:
+            query = query.filter(FichaClinica.estado == self._normalizar_estado(estado))
+
+        paciente_medico_id = args.get("paciente_medico_id", type=int)
+        if paciente_medico_id:
+            query = query.filter(FichaClinica.paciente_medico_id == paciente_medico_id)
+
+        q = (args.get("q") or "").strip()
+        if q:
+            like = f"%{q}%"
+            pacientes_ids = (
+                select(PacienteMedico.paciente_medico_id)
+                .join(Cliente, Cliente.cliente_id == PacienteMedico.cliente_id)
+                .where(
+                    or_(
+                        Cliente.nombres.ilike(like),
+                        Cliente.ap_pat.ilike(like),
+                        Cliente.ap_mat.ilike(like),
+                        Cliente.rut.ilike(like),
+                        PacienteMedico.numero_ficha.ilike(like),
+                    )
+                )
+            )
+            query = query.filter(
+                or_(
+                    FichaClinica.paciente_medico_id.in_(pacientes_ids),
+                    FichaClinica.numero_consulta.ilike(like),
+                )
+            )
+        return query
+
     def get_all_fichas_clinicas(self):
-        """Obtiene todas las fichas clínicas"""
+        """
+        Lista fichas clínicas paginadas por cursor (keyset) sobre (fecha_consulta, ficha_id).
+
+        Query params:
+          limit        : tamaño de página (por defecto 50, máximo 200)
+          cursor       : valor 'next_cursor' de la página anterior
+          fecha_desde, fecha_hasta, usuario_id, estado, paciente_medico_id, q
+        """
         try:
+            args = request.args
+            limit = min(max(args.get("limit", DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+            cursor = (args.get("cursor") or "").strip()
+
             session = SessionLocal()
             try:
+                query = self._filtrar_fichas(session.query(FichaClinica), args)
+
+                if cursor:
+                    decoded = self._decode_cursor(cursor)
+                    if not decoded:
+                        return jsonify({"success": False, "error": "Cursor inválido"}), 400
+                    # Orden descendente: la siguiente página es estrictamente "menor" que el cursor
+                    query = query.filter(
+                        tuple_(FichaClinica.fecha_consulta, FichaClinica.ficha_id) < tuple_(*decoded)
+                    )
+
                 fichas = (
-                    session.query(FichaClinica)
-                    .options(
+                    query.options(
                         joinedload(FichaClinica.paciente_medico).joinedload(PacienteMedico.cliente),
                         joinedload(FichaClinica.usuario),
                     )
-                    .order_by(FichaClinica.fecha_consulta.desc())
+                    .order_by(FichaClinica.fecha_consulta.desc(), FichaClinica.ficha_id.desc())
+                    .limit(limit + 1)
                     .all()
                 )
 
+                has_more = len(fichas) > limit
+                fichas = fichas[:limit]
+                next_cursor = self._encode_cursor(fichas[-1]) if has_more and fichas else None
+
+                # Una consulta por tabla de examen para todas las fichas (evita N×6)
+                examenes = FichaExamenesRepository(session).cargar_examenes(
+                    [f.ficha_id for f in fichas], LISTADO_SECCIONES
+                )
+
                 result = []
                 for ficha in fichas:
                     data = ficha.to_dict()
@@ -169,12 +314,7 @@ class FichaClinicaController:
                             "username": ficha.usuario.username,
                         }
 
-                    bio = (
-                        session.query(Biomicroscopia)
-                        .filter(Biomicroscopia.ficha_id == ficha.ficha_id)
-                        .order_by(Biomicroscopia.fecha_examen.desc())
-                        .first()
-                    )
+                    bio = examenes["biomicroscopia"].get(ficha.ficha_id)
                     if bio:
                         data["biomicroscopia"] = {
                             "biomicroscopia_id": bio.biomicroscopia_id,
@@ -182,59 +322,40 @@ class FichaClinicaController:
                             "resumen": self._resumen_biomicroscopia(bio),
                         }
 
-                    reflejos = (
-                        session.query(ReflejosPupilares)
-                        .filter(ReflejosPupilares.ficha_id == ficha.ficha_id)
-                        .order_by(ReflejosPupilares.fecha_registro.desc())
-                        .first()
-                    )
+                    reflejos = examenes["reflejos_pupilares"].get(ficha.ficha_id)
                     if reflejos:
                         data["reflejos_pupilares"] = reflejos.to_dict()
 
-                    fondo = (
-                        session.query(FondoOjo)
-                        .filter(FondoOjo.ficha_id == ficha.ficha_id)
-                        .order_by(FondoOjo.fecha_examen.desc())
-                        .first()
-                    )
+                    fondo = examenes["fondo_ojo"].get(ficha.ficha_id)
                     if fondo:
                         resumen_fondo = self._resumen_fondo_ojo(fondo)
                         info_fondo = fondo.to_dict()
                         info_fondo["resumen"] = resumen_fondo
                         data["fondo_ojo_extendido"] = info_fondo
 
-                    parametros = (
-                        session.query(ParametrosClinicos)
-                        .filter(ParametrosClinicos.ficha_id == ficha.ficha_id)
-                        .order_by(ParametrosClinicos.fecha_registro.desc())
-                        .first()
-                    )
+                    parametros = examenes["parametros_clinicos"].get(ficha.ficha_id)
                     if parametros:
                         info_param = parametros.to_dict()
                         info_param["resumen"] = self._resumen_parametros(parametros)
                         data["parametros_clinicos"] = info_param
 
-                    diagnostico = (
-                        session.query(DiagnosticoMedico)
-                        .filter(DiagnosticoMedico.ficha_id == ficha.ficha_id)
-                        .order_by(DiagnosticoMedico.fecha_diagnostico.desc())
-                        .first()
-                    )
+                    diagnostico = examenes["diagnostico"].get(ficha.ficha_id)
                     if diagnostico:
                         data["diagnostico"] = diagnostico.to_dict()
 
-                    tratamiento = (
-                        session.query(Tratamiento)
-                        .filter(Tratamiento.ficha_id == ficha.ficha_id)
-                        .order_by(Tratamiento.fecha_tratamiento.desc())
-                        .first()
-                    )
+                    tratamiento = examenes["tratamiento"].get(ficha.ficha_id)
                     if tratamiento:
                         data["tratamiento"] = tratamiento.to_dict()
 
                     result.append(data)
 
-                return jsonify({"success": True, "data": result, "total": len(result)})
+                return jsonify({
+                    "success": True,
+                    "data": result,
+                    "total": len(result),
+                    "next_cursor": next_cursor,
+                    "has_more": has_more,
+                })
             finally:
                 session.close()
         except Exception as e:
@@ -304,9 +425,6 @@ class FichaClinicaController:
                 if not data.get("paciente_medico_id"):
                     return jsonify({"success": False, "error": "ID del paciente médico es obligatorio"}), 400
 
-                if not data.get("numero_consulta"):
-                    return jsonify({"success": False, "error": "Número de consulta es obligatorio"}), 400
-
                 # Parse fecha_consulta (ISO con o sin zona)
                 fc = data.get("fecha_consulta")
                 if fc:
@@ -321,7 +439,8 @@ class FichaClinicaController:
                 nueva_ficha = FichaClinica(
                     paciente_medico_id=data.get("paciente_medico_id"),
                     usuario_id=data.get("usuario_id", 1),  # Default admin user
-                    numero_consulta=data.get("numero_consulta"),
+                    # Sin número explícito: correlativo de secuencia dentro del INSERT
+                    numero_consulta=(data.get("numero_consulta") or "").strip() or numero_consulta_sql(fecha_consulta),
                     fecha_consulta=fecha_consulta,
                     motivo_consulta=data.get("motivo_consulta"),
                     historia_actual=data.get("historia_actual"),
@@ -352,6 +471,7 @@ class FichaClinicaController:
                 session.add(nueva_ficha)
                 session.commit()
                 session.refresh(nueva_ficha)
+                invalidar_serie_paciente(nueva_ficha.paciente_medico_id)
 
                 return jsonify(
                     {"success": True, "data": nueva_ficha.to_dict(), "message": "Ficha clínica creada exitosamente"}
@@ -375,30 +495,93 @@ class FichaClinicaController:
                 if not ficha:
                     return jsonify({"success": False, "error": "Ficha clínica no encontrada"}), 404
 
-                # Actualizar campos (salvo PK)
+                paciente_anterior = ficha.paciente_medico_id
+                # Actualizar campos (salvo PK y versión, que es de solo lectura)
                 for key, value in data.items():
-                    if key == "ficha_id":
+                    if key in ("ficha_id", "version") or key in COLUMNAS_DERIVADAS:
                         continue
                     if hasattr(ficha, key):
-                        if key == "estado":
-                            value = self._normalizar_estado(value)
-                        # parse suave para fecha_consulta
-                        if key == "fecha_consulta" and isinstance(value, str):
-                            try:
-                                value = datetime.fromisoformat(value.replace("Z", "+00:00"))
-                            except Exception:
-                                pass
-                        setattr(ficha, key, value)
+                        setattr(ficha, key, self._valor_campo_ficha(key, value))
 
                 session.commit()
                 session.refresh(ficha)
 
+                if CAMPOS_SERIE_REFRACCION & set(data):
+                    invalidar_serie_paciente(paciente_anterior)
+                    invalidar_serie_paciente(ficha.paciente_medico_id)
+
                 return jsonify({"success": True, "data": ficha.to_dict(), "message": "Ficha clínica actualizada exitosamente"})
             finally:
                 session.close()
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
+    def _valor_campo_ficha(self, key, value):
+        """Normaliza estado y hace parse suave de fecha_consulta (PUT y autoguardado)."""
+        if key == "estado":
+            return self._normalizar_estado(value)
+        if key == "fecha_consulta" and isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except Exception:
+                pass
+        return value
+
+    # ---------------------------------------------------------------------
+    # AUTOGUARDADO (PATCH con solo los campos cambiados)
+    # ---------------------------------------------------------------------
+    def patch_ficha_clinica(self, ficha_id):
+        """
+        Guarda un delta de la ficha: {"version": "...", "cambios": {campo: valor}}.
+        Solo se actualizan las columnas recibidas y solo si la ficha sigue en esa
+        versión; responde la nueva versión o 409 con la ficha vigente.
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            version = str(data.get("version") or "").strip()
+            cambios = data.get("cambios")
+
+            if not version.isdigit():
+                return jsonify({"success": False, "error": "version es requerida"}), 400
+            if not isinstance(cambios, dict) or not cambios:
+                return jsonify({"success": False, "error": "No hay cambios para guardar"}), 400
+            no_editables = sorted(set(cambios) - CAMPOS_FICHA_AUTOGUARDADO)
+            if no_editables:
+                return jsonify({"success": False, "error": f"Campos no editables: {', '.join(no_editables)}"}), 400
+
+            valores = {key: self._valor_campo_ficha(key, value) for key, value in cambios.items()}
+            # El UPDATE directo no pasa por el evento del modelo: se derivan aquí
+            valores.update(valores_numericos(valores))
+
+            session = SessionLocal()
+            try:
+                repo = AutoguardadoRepository(session)
+                nueva_version = repo.actualizar(FichaClinica, FichaClinica.ficha_id, ficha_id, valores, version)
+
+                if nueva_version is None:
+                    # El UPDATE no tocó filas: no hay nada que deshacer (un rollback
+                    # descartaría el resto del unit of work del request)
+                    ficha = repo.actual(FichaClinica, FichaClinica.ficha_id, ficha_id)
+                    if not ficha:
+                        return jsonify({"success": False, "error": "Ficha clínica no encontrada"}), 404
+                    return jsonify({
+                        "success": False,
+                        "error": "La ficha fue modificada por otra sesión",
+                        "version": ficha.version,
+                        "data": ficha.to_dict(),
+                    }), 409
+
+                session.commit()
+                if CAMPOS_SERIE_REFRACCION & set(cambios):
+                    invalidar_serie_paciente(session.scalar(
+                        select(FichaClinica.paciente_medico_id).where(FichaClinica.ficha_id == ficha_id)
+                    ))
+                return jsonify({"success": True, "version": nueva_version})
+            finally:
+                session.close()
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+
     # ---------------------------------------------------------------------
     # LISTAR POR PACIENTE (para historial_paciente.html)  **DEVUELVE ARRAY**
     # ---------------------------------------------------------------------
@@ -448,4 +631,136 @@ class FichaClinicaController:
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
+    # ---------------------------------------------------------------------
+    # LÍNEA DE TIEMPO DEL PACIENTE (historial completo en una petición)
+    # ---------------------------------------------------------------------
+    def _item_timeline(self, ficha: FichaClinica, examenes) -> dict:
+        ficha_id = ficha.ficha_id
+        item = {
+            "ficha_id": ficha_id,
+            "numero_consulta": ficha.numero_consulta,
+            "fecha_consulta": ficha.fecha_consulta.isoformat() if ficha.fecha_consulta else None,
+            "motivo_consulta": ficha.motivo_consulta,
+            "estado": ficha.estado or "en_proceso",
+            "medico": None,
+            "biomicroscopia": None,
+            "fondo_ojo": None,
+            "presion_intraocular": None,
+            "diagnostico": None,
+            "tratamiento": None,
+        }
+        if ficha.usuario:
+            item["medico"] = {
+                "usuario_id": ficha.usuario.usuario_id,
+                "nombre": " ".join(p for p in (ficha.usuario.nombre, ficha.usuario.ap_pat) if p),
+            }
+
+        bio = examenes["biomicroscopia"].get(ficha_id)
+        if bio:
+            item["biomicroscopia"] = {"resumen": self._resumen_biomicroscopia(bio)}
+
+        fondo = examenes["fondo_ojo"].get(ficha_id)
+        if fondo:
+            item["fondo_ojo"] = {"resumen": self._resumen_fondo_ojo(fondo)}
+
+        pio = examenes["presion_intraocular"].get(ficha_id)
+        if pio:
+            item["presion_intraocular"] = {
+                "pio_od": pio.pio_od,
+                "pio_oi": pio.pio_oi,
+                "metodo_medicion": pio.metodo_medicion,
+            }
+
+        dx = examenes["diagnostico"].get(ficha_id)
+        if dx:
+            item["diagnostico"] = {
+                "diagnostico_principal": dx.diagnostico_principal,
+                "cie_10_principal": dx.cie_10_principal,
+                "severidad": dx.severidad,
+                "resumen": self._resumen_diagnostico(dx),
+            }
+
+        tx = examenes["tratamiento"].get(ficha_id)
+        if tx:
+            item["tratamiento"] = {
+                "proxima_cita": tx.proxima_cita.isoformat() if tx.proxima_cita else None,
+                "resumen": self._resumen_tratamiento(tx),
+            }
+        return item
+
+    def get_timeline_paciente(self, paciente_medico_id):
+        """
+        Historial clínico del paciente con el resumen de sus exámenes, de la
+        consulta más reciente a la más antigua.
+
+        Query params:
+          limit  : fichas por página (por defecto MAX_PAGE_SIZE, que cubre el historial
+                   completo de casi cualquier paciente en una sola petición)
+          cursor : 'next_cursor' de la página anterior (keyset sobre fecha_consulta, ficha_id)
 
+        Costo fijo: paciente + fichas (con médico) + una consulta por sección de examen,
+        sin importar cuántas fichas tenga el paciente.
+        """
+        try:
+            args = request.args
+            limit = min(max(args.get("limit", MAX_PAGE_SIZE, type=int) or MAX_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+            cursor = (args.get("cursor") or "").strip()
+
+            session = SessionLocal()
+            try:
+                paciente = (
+                    session.query(PacienteMedico)
+                    .options(joinedload(PacienteMedico.cliente))
+                    .filter(PacienteMedico.paciente_medico_id == paciente_medico_id)
+                    .first()
+                )
+                if not paciente:
+                    return jsonify({"success": False, "error": "Paciente no encontrado"}), 404
+
+                query = (
+                    session.query(FichaClinica)
+                    .options(joinedload(FichaClinica.usuario))
+                    .filter(FichaClinica.paciente_medico_id == paciente_medico_id)
+                )
+                if cursor:
+                    decoded = self._decode_cursor(cursor)
+                    if not decoded:
+                        return jsonify({"success": False, "error": "Cursor inválido"}), 400
+                    query = query.filter(
+                        tuple_(FichaClinica.fecha_consulta, FichaClinica.ficha_id) < tuple_(*decoded)
+                    )
+
+                fichas = (
+                    query.order_by(FichaClinica.fecha_consulta.desc(), FichaClinica.ficha_id.desc())
+                    .limit(limit + 1)
+                    .all()
+                )
+                has_more = len(fichas) > limit
+                fichas = fichas[:limit]
+                next_cursor = self._encode_cursor(fichas[-1]) if has_more and fichas else None
+
+                examenes = FichaExamenesRepository(session).cargar_examenes(
+                    [f.ficha_id for f in fichas], TIMELINE_SECCIONES
+                )
+
+                cliente = paciente.cliente
+                return jsonify({
+                    "success": True,
+                    "paciente": {
+                        "paciente_medico_id": paciente.paciente_medico_id,
+                        "numero_ficha": paciente.numero_ficha,
+                        "cliente_id": paciente.cliente_id,
+                        "nombres": cliente.nombres if cliente else None,
+                        "ap_pat": cliente.ap_pat if cliente else None,
+                        "ap_mat": cliente.ap_mat if cliente else None,
+                        "rut": cliente.rut if cliente else None,
+                        "telefono": cliente.telefono if cliente else None,
+                    },
+                    "data": [self._item_timeline(f, examenes) for f in fichas],
+                    "next_cursor": next_cursor,
+                    "has_more": has_more,
+                })
+            finally:
+                session.close()
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
@@ -3,20 +3,23 @@
 Controller de Pacientes Médicos
 - Crea/actualiza Cliente por rut (cédula/RUC EC) y asocia PacienteMedico.
 - Evita duplicados por cliente_id.
-- Genera numero_ficha único si no viene del front.
+- Asigna numero_ficha desde una secuencia de PostgreSQL si no viene del front.
 - Devuelve JSON consistente para el front actual.
 """
 
 from flask import request, jsonify
-from sqlalchemy.orm import joinedload
-from sqlalchemy import func
+from sqlalchemy.orm import joinedload, contains_eager
 from datetime import datetime
-import random
 import re
 
 from app.infraestructure.utils.db import SessionLocal
 from app.domain.models.cliente import Cliente
 from app.domain.models.paciente import PacienteMedico
+from app.infraestructure.utils.numeracion import numero_ficha_sql
+from app.infraestructure.repositories.sql_persona_search_repository import (
+    SQLPersonaSearchRepository,
+    limite_busqueda,
+)
 
 
 class PacienteMedicoController:
@@ -64,24 +67,6 @@ class PacienteMedicoController:
     def _normalizar_rut(self, valor: str) -> str:
         return re.sub(r"\D+", "", valor or "").strip()
 
-    def _generar_numero_ficha(self, db) -> str:
-        """
-        Genera un número de ficha único estilo FM-YYYYMM-<ticks>-NNN.
-        Verifica colisión en BD por si hay varias creaciones simultáneas.
-        """
-        for _ in range(5):
-            ahora = datetime.utcnow()
-            pref = f"FM-{ahora.year}{str(ahora.month).zfill(2)}-{int(ahora.timestamp() * 1000)}-{random.randint(100,999)}"
-            existe = (
-                db.query(PacienteMedico)
-                  .filter(PacienteMedico.numero_ficha == pref)
-                  .first()
-            )
-            if not existe:
-                return pref
-        # Último recurso (prácticamente imposible colisionar 5 veces)
-        return f"FM-{int(datetime.utcnow().timestamp()*1000)}-{random.randint(1000,9999)}"
-
     def _cliente_to_dict(self, c: Cliente) -> dict:
         if not c:
             return {}
@@ -159,28 +144,37 @@ class PacienteMedicoController:
         finally:
             db.close()
 
+    def _rut_si_identificacion(self, q: str):
+        """Si el texto parece cédula/RUC válido devuelve el rut normalizado (búsqueda exacta)."""
+        if re.fullmatch(r"[\d\s.-]+", q or ""):
+            rut = self._normalizar_rut(q)
+            if self._validar_identificacion_ec(rut):
+                return rut
+        return None
+
     def search_pacientes_medicos(self):
         """
-        GET /api/pacientes-medicos/search?q=texto
-        Busca por nombre/apellido/rut con ilike. Responde igual que get_all.
+        GET /api/pacientes-medicos/search?q=texto&limit=20
+        Cédula/RUC válido -> coincidencia exacta por rut; si no, búsqueda trigram
+        por nombre/apellidos/rut ordenada por relevancia (máx. BUSQUEDA_LIMIT_MAX).
+        Sin q lista todos los pacientes, como get_all. Responde igual que get_all.
         """
-        q = (request.args.get("q") or "").strip().lower()
+        q = (request.args.get("q") or "").strip()
+        if not q:
+            return self.get_all_pacientes_medicos()
+        limit = limite_busqueda(request.args.get("limit"))
         db = SessionLocal()
         try:
             query = (
                 db.query(PacienteMedico)
                   .join(Cliente, Cliente.cliente_id == PacienteMedico.cliente_id)
-                  .options(joinedload(PacienteMedico.cliente))
+                  .options(contains_eager(PacienteMedico.cliente))
             )
-            if q:
-                like = f"%{q}%"
-                query = query.filter(
-                    (func.lower(Cliente.nombres).ilike(like)) |
-                    (func.lower(Cliente.ap_pat).ilike(like)) |
-                    (func.lower(Cliente.ap_mat).ilike(like)) |
-                    (func.lower(Cliente.rut).ilike(like))
-                )
-            pacientes = query.order_by(PacienteMedico.paciente_medico_id.desc()).all()
+            busqueda = SQLPersonaSearchRepository(db)
+            rut = self._rut_si_identificacion(q)
+            pacientes = busqueda.aplicar(query, q, rut=rut).limit(limit).all() if rut else []
+            if not pacientes:
+                pacientes = busqueda.aplicar(query, q).limit(limit).all()
             data = [self._paciente_to_dict(p) for p in pacientes]
             return jsonify({"success": True, "data": data})
         except Exception as e:
@@ -262,18 +256,18 @@ class PacienteMedicoController:
                 return jsonify({"success": True, "message": "El cliente ya es paciente.", "data": data})
 
             # ---------- 4) Crear PacienteMedico ----------
+            # Sin número explícito se asigna desde la secuencia dentro del mismo INSERT
             numero_ficha = (pac_in.get("numero_ficha") or "").strip()
-            if not numero_ficha:
-                numero_ficha = self._generar_numero_ficha(db)
-            else:
-                # Verifica unicidad si viene desde el front
+            if numero_ficha:
+                # Número manual: si ya existe, se ignora y se usa el correlativo
                 colision = (
-                    db.query(PacienteMedico)
+                    db.query(PacienteMedico.paciente_medico_id)
                       .filter(PacienteMedico.numero_ficha == numero_ficha)
                       .first()
                 )
                 if colision:
-                    numero_ficha = self._generar_numero_ficha(db)
+                    numero_ficha = None
+            numero_ficha = numero_ficha or numero_ficha_sql()
 
             paciente = PacienteMedico(
                 cliente_id=cliente.cliente_id,
@@ -1,7 +1,11 @@
 # adapters/input/flask_app/controllers/product_controller.py
 
-from flask import Blueprint, render_template, redirect, url_for, request, session, flash
+from datetime import datetime
+from flask import Blueprint, render_template, redirect, url_for, request, session, flash, jsonify
 from app.domain.use_cases.product_use_cases import ProductUseCases
+from app.infraestructure.repositories.sql_product_repository import SQLProductRepository
+from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.utils.tabular_export import Columna, FORMATOS, export_response
 from app.domain.use_cases.services.sale_service import SaleService
 
 product_html = Blueprint('product_html', __name__)
@@ -15,35 +19,24 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('user_html.login'))
 
-    # Valores por defecto
-    stock_total_productos = 0
-    productos_bajo_stock = []
-    total_ventas_hoy = 0
-    ventas_recientes = []
-
+    stats = {}
     try:
-        # Si el servicio trae el método, úsalo
-        if hasattr(sale_service, "get_dashboard_stats"):
-            stats = sale_service.get_dashboard_stats() or {}
-            stock_total_productos = stats.get('total_stock', 0)
-            productos_bajo_stock = stats.get('productos_stock_bajo', [])
-            total_ventas_hoy = stats.get('total_ventas_hoy', 0)
-            ventas_recientes = stats.get('ventas_recientes', [])
-        else:
-            # Fallback mínimo sin romper la vista
-            productos = product_use_cases.list_products()
-            stock_total_productos = sum(getattr(p, "stock", 0) or 0 for p in productos)
-            productos_bajo_stock = [p for p in productos if (getattr(p, "stock", 0) or 0) <= 10]
+        # Agregados SQL + caché corta (ver SaleService.get_dashboard_stats)
+        stats = sale_service.get_dashboard_stats()
     except Exception as e:
         print(f"Error en dashboard: {e}")
         flash('Ocurrió un error al cargar el dashboard.', 'danger')
 
     return render_template(
         'dashboard.html',
-        stock_total_productos=stock_total_productos,
-        productos_bajo_stock=productos_bajo_stock,
-        total_ventas_hoy=total_ventas_hoy,
-        ventas_recientes=ventas_recientes,
+        stock_total_productos=stats.get('total_stock', 0),
+        productos_bajo_stock=stats.get('productos_stock_bajo', []),
+        total_ventas_hoy=stats.get('total_ventas_hoy', 0),
+        ventas_recientes=stats.get('ventas_recientes', []),
+        productos_vendidos_hoy=stats.get('productos_vendidos_hoy', 0),
+        examenes_hoy=stats.get('examenes_hoy', 0),
+        pacientes_atendidos_hoy=stats.get('pacientes_atendidos_hoy', 0),
+        top_productos_mes=stats.get('top_productos_mes', []),
         pagos_pendientes=0
     )
 
@@ -209,80 +202,56 @@ def restaurar_producto(product_id):
         flash('Ocurrió un error al restaurar el producto.', 'danger')
     return redirect(url_for('product_html.productos_eliminados'))
 
-@product_html.route('/inventario/exportar-excel', methods=['POST'])
+# Columnas del reporte de inventario
+COLUMNAS_EXPORT_INVENTARIO = [
+    Columna('Fecha', lambda p: p.fecha.strftime('%d-%m-%Y') if p.fecha else '', ancho=12),
+    Columna('Nombre', 'nombre'),
+    Columna('Distribuidor', 'distribuidor'),
+    Columna('Marca', 'marca'),
+    Columna('Material', 'material'),
+    Columna('Tipo Armazón', 'tipo_armazon'),
+    Columna('Código', 'codigo'),
+    Columna('Diámetro 1', 'diametro_1', ancho=12),
+    Columna('Diámetro 2', 'diametro_2', ancho=12),
+    Columna('Color', 'color'),
+    Columna('Cantidad', 'cantidad', ancho=10),
+    Columna('Costo Unitario', 'costo_unitario', ancho=15),
+    Columna('Costo Total', 'costo_total', ancho=15),
+    Columna('Venta 1', 'costo_venta_1', ancho=12),
+    Columna('Venta 2', 'costo_venta_2', ancho=12),
+    Columna('Estado', lambda p: 'Activo' if p.estado else 'Inactivo', ancho=10),
+]
+
+
+@product_html.route('/inventario/exportar-excel', methods=['GET'])
 def exportar_inventario_excel():
-    """Genera un archivo Excel con el inventario actual"""
+    """
+    Exporta el inventario directamente desde la BD (streaming, memoria constante).
+
+    Query params opcionales (mismos filtros de la pantalla): marca, material, tipo_armazon,
+    cantidad=bajo|medio|alto, q (texto), formato=xlsx|csv.
+    """
+    if 'user_id' not in session:
+        return redirect(url_for('user_html.login'))
+
+    formato = (request.args.get('formato') or 'xlsx').lower()
+    if formato not in FORMATOS:
+        return jsonify({'success': False, 'error': 'Formato no soportado (xlsx o csv)'}), 400
+
     try:
-        from io import BytesIO
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        from flask import send_file
-        
-        data = request.get_json()
-        productos = data.get('productos', [])
-        
-        # Crear workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Inventario"
-        
-        # Encabezados con estilo
-        headers = ['Fecha', 'Nombre', 'Distribuidor', 'Marca', 'Material', 'Tipo Armazón', 
-                  'Código', 'Diámetro 1', 'Diámetro 2', 'Color', 'Cantidad', 
-                  'Costo Unitario', 'Costo Total', 'Venta 1', 'Venta 2', 'Estado']
-        
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Agregar datos
-        for row_num, producto in enumerate(productos, 2):
-            ws.cell(row=row_num, column=1, value=producto['fecha'])
-            ws.cell(row=row_num, column=2, value=producto['nombre'])
-            ws.cell(row=row_num, column=3, value=producto['distribuidor'])
-            ws.cell(row=row_num, column=4, value=producto['marca'])
-            ws.cell(row=row_num, column=5, value=producto['material'])
-            ws.cell(row=row_num, column=6, value=producto['tipo_armazon'])
-            ws.cell(row=row_num, column=7, value=producto['codigo'])
-            ws.cell(row=row_num, column=8, value=producto['diametro_1'])
-            ws.cell(row=row_num, column=9, value=producto['diametro_2'])
-            ws.cell(row=row_num, column=10, value=producto['color'])
-            ws.cell(row=row_num, column=11, value=producto['cantidad'])
-            ws.cell(row=row_num, column=12, value=producto['costo_unitario'])
-            ws.cell(row=row_num, column=13, value=producto['costo_total'])
-            ws.cell(row=row_num, column=14, value=producto['costo_venta_1'])
-            ws.cell(row=row_num, column=15, value=producto['costo_venta_2'])
-            ws.cell(row=row_num, column=16, value=producto['estado'])
-        
-        # Ajustar ancho de columnas
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Guardar en memoria
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'inventario_{request.args.get("fecha", "")}.xlsx'
-        )
+        with SessionLocal() as db:
+            query = SQLProductRepository(db).filtered_query(
+                marca=request.args.get('marca') or None,
+                material=request.args.get('material') or None,
+                tipo_armazon=request.args.get('tipo_armazon') or None,
+                nivel_stock=request.args.get('cantidad') or None,
+                q=request.args.get('q') or None,
+            )
+            return export_response(
+                db, query, COLUMNAS_EXPORT_INVENTARIO,
+                f"inventario_{datetime.now().strftime('%Y-%m-%d')}", formato,
+                titulo_hoja="Inventario", color_encabezado="366092",
+            )
     except Exception as e:
         print(f"Error al exportar inventario: {e}")
         return {'error': str(e)}, 500
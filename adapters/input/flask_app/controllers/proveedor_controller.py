@@ -13,9 +13,10 @@ class ProveedorController:
     Controlador para gestión de proveedores
     """
     
-    def __init__(self):
-        self.db_session = get_db_session()
-        self.repository = ProveedorRepository(self.db_session)
+    @property
+    def repository(self):
+        # Sesión del request en curso (unit of work), no una sesión de vida del proceso
+        return ProveedorRepository(get_db_session())
     
     def listar_proveedores(self):
         """Página principal de proveedores"""
@@ -259,8 +260,3 @@ class ProveedorController:
         except Exception as e:
             logger.error(f"Error al obtener proveedor: {e}")
             return jsonify({'success': False, 'message': 'Error al obtener el proveedor'}), 500
-    
-    def __del__(self):
-        """Cerrar sesión de base de datos"""
-        if hasattr(self, 'db_session'):
-            self.db_session.close()
\ No newline at end of file
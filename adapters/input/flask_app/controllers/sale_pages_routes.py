@@ -1,32 +1,46 @@
 # adapters/input/flask_app/controllers/sale_pages_routes.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, make_response
 import json
+import uuid
+from datetime import datetime
 from sqlalchemy.orm import joinedload
 
 from app.infraestructure.utils.db import SessionLocal
-from app.infraestructure.repositories.sql_product_repository import SQLProductRepository
+from app.infraestructure.repositories.sql_sale_repository import SQLSaleRepository
 from app.domain.use_cases.services.sale_service import SaleService
+from app.domain.use_cases.services.catalogo_service import CatalogoService
 from app.domain.models.sale import Sale, SaleDetail
+from app.infraestructure.utils.date_utils import CHILE_TIMEZONE
+from app.infraestructure.utils.tabular_export import Columna, FORMATOS, export_response
 
 sale_html = Blueprint("sale_html", __name__)
 
 sale_service = SaleService()
+catalogo_service = CatalogoService()
 
-# GET: pantalla para armar el pedido (usa registrar_venta.html)
+# GET: pantalla para armar el pedido (usa registrar_venta.html).
+# El catálogo ya no va embebido en el HTML: la página lo pide a /api/catalogo.
 @sale_html.route("/registrar-venta", methods=["GET"])
 def registrar_venta_page():
-    with SessionLocal() as db:
-        products = SQLProductRepository(db).get_all(include_deleted=False)
-        products_json = json.dumps([
-            {
-                "producto_id": p.producto_id,
-                "nombre": p.nombre,
-                "precio_unitario": float(p.precio_unitario or 0)
-            }
-            for p in products
-        ])
-    return render_template("registrar_venta.html", products_json=products_json)
+    return render_template("registrar_venta.html")
+
+
+# GET: catálogo para el punto de venta, con ETag por versión de catálogo.
+# El navegador revalida con If-None-Match y recibe 304 si nada cambió.
+@sale_html.route("/api/catalogo", methods=["GET"])
+def api_catalogo():
+    etag = f"catalogo-{catalogo_service.get_version()}"
+    if etag in request.if_none_match:
+        respuesta = make_response("", 304)
+    else:
+        _, cuerpo = catalogo_service.get_catalogo()
+        respuesta = make_response(cuerpo)
+        respuesta.mimetype = "application/json"
+    respuesta.set_etag(etag)
+    # Siempre revalidar (no servir de caché sin preguntar), pero solo para este usuario
+    respuesta.headers["Cache-Control"] = "private, no-cache"
+    return respuesta
 
 
 # POST: recibe los items del formulario anterior y muestra confirmar_venta.html
@@ -47,13 +61,27 @@ def revisar_venta_page():
     # Guardamos en sesión para usarlos al finalizar
     session["venta_items"] = items
     session["venta_total"] = total_general
+    # Clave de idempotencia de este checkout: viaja en el form y queda guardada en la venta
+    session["venta_idempotency_key"] = uuid.uuid4().hex
 
-    return render_template("confirmar_venta.html", items=items, total_general=total_general)
+    return render_template(
+        "confirmar_venta.html",
+        items=items,
+        total_general=total_general,
+        idempotency_key=session["venta_idempotency_key"],
+    )
 
 
 # POST: guarda cliente (si viene) + registra venta + detalles + descuenta stock y redirige a boleta
 @sale_html.route("/finalizar-venta-definitiva", methods=["POST"])
 def finalizar_venta_definitiva():
+    idempotency_key = (request.form.get("idempotency_key") or session.get("venta_idempotency_key") or "").strip()
+
+    # Reenvío (doble clic / reintento del cliente): la venta ya existe, ir directo a la boleta
+    venta_existente = sale_service.find_sale_id_by_idempotency_key(idempotency_key)
+    if venta_existente:
+        return redirect(url_for("sale_html.boleta_page", venta_id=venta_existente))
+
     items = session.get("venta_items", [])
     total_general = session.get("venta_total", 0.0)
 
@@ -86,7 +114,8 @@ def finalizar_venta_definitiva():
             cliente_data=cliente_data,
             metodo_pago="efectivo",
             observaciones=None,
-            descuento=0
+            descuento=0,
+            idempotency_key=idempotency_key or None,
         )
     except Exception as e:
         flash(f"Error al finalizar la venta definitiva: {e}", "danger")
@@ -95,6 +124,7 @@ def finalizar_venta_definitiva():
     # limpiar sesión de la venta
     session.pop("venta_items", None)
     session.pop("venta_total", None)
+    session.pop("venta_idempotency_key", None)
 
     return redirect(url_for("sale_html.boleta_page", venta_id=venta_id))
 
@@ -132,69 +162,50 @@ def historial_ventas_page():
         )
     return render_template("historial_ventas.html", ventas=ventas)
 
-@sale_html.route("/ventas/exportar-excel", methods=["POST"])
+# Columnas del reporte de ventas (una fila por línea de detalle).
+# fecha_venta se guarda en UTC sin zona: se exporta en hora de Chile.
+COLUMNAS_EXPORT_VENTAS = [
+    Columna("ID Venta", "venta_id", ancho=10),
+    Columna("Fecha", "fecha_venta", ancho=18, zona=CHILE_TIMEZONE),
+    Columna("Cliente", lambda r: " ".join(p for p in (r.nombres, r.ap_pat) if p) or "Sin cliente"),
+    Columna("Vendedor", lambda r: r.username or "N/A"),
+    Columna("Producto", lambda r: r.nombre or "N/A"),
+    Columna("Cantidad", "cantidad", ancho=10),
+    Columna("Precio Unitario", "precio_unitario", ancho=15),
+    Columna("Subtotal", "subtotal", ancho=15),
+    Columna("Total Venta", "total", ancho=15),
+    Columna("Método Pago", lambda r: r.metodo_pago or "", ancho=15),
+]
+
+
+@sale_html.route("/ventas/exportar-excel", methods=["GET"])
 def exportar_ventas_excel():
-    """Genera un archivo Excel con el historial de ventas"""
+    """
+    Exporta el historial de ventas directamente desde la BD (streaming, memoria constante).
+
+    Query params opcionales: fecha_desde, fecha_hasta (YYYY-MM-DD, días de Chile, ambos
+    inclusive), formato=xlsx|csv (por defecto xlsx).
+    """
     try:
-        from io import BytesIO
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        from flask import send_file
-        
-        data = request.get_json()
-        ventas = data.get('ventas', [])
-        
-        # Crear workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Historial Ventas"
-        
-        # Encabezados con estilo
-        headers = ['ID Venta', 'Producto', 'Cantidad', 'Total', 'Cliente', 'Vendedor', 'Fecha']
-        
-        header_fill = PatternFill(start_color="27ae60", end_color="27ae60", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Agregar datos
-        for row_num, venta in enumerate(ventas, 2):
-            ws.cell(row=row_num, column=1, value=venta['id_venta'])
-            ws.cell(row=row_num, column=2, value=venta['producto'])
-            ws.cell(row=row_num, column=3, value=venta['cantidad'])
-            ws.cell(row=row_num, column=4, value=venta['total'])
-            ws.cell(row=row_num, column=5, value=venta['cliente'])
-            ws.cell(row=row_num, column=6, value=venta['vendedor'])
-            ws.cell(row=row_num, column=7, value=venta['fecha'])
-        
-        # Ajustar ancho de columnas
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column].width = adjusted_width
-        
-        # Guardar en memoria
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'ventas_{request.args.get("fecha", "")}.xlsx'
-        )
+        fecha_desde = request.args.get("fecha_desde") or None
+        fecha_hasta = request.args.get("fecha_hasta") or None
+        desde = datetime.strptime(fecha_desde, "%Y-%m-%d").date() if fecha_desde else None
+        hasta = datetime.strptime(fecha_hasta, "%Y-%m-%d").date() if fecha_hasta else None
+    except ValueError:
+        return jsonify({"success": False, "error": "Formato de fecha inválido (use YYYY-MM-DD)"}), 400
+
+    formato = (request.args.get("formato") or "xlsx").lower()
+    if formato not in FORMATOS:
+        return jsonify({"success": False, "error": "Formato no soportado (xlsx o csv)"}), 400
+
+    try:
+        with SessionLocal() as db:
+            stmt = SQLSaleRepository(db).export_query(desde, hasta)
+            sufijo = "_".join(f for f in (fecha_desde, fecha_hasta) if f) or datetime.now().strftime('%Y-%m-%d')
+            return export_response(
+                db, stmt, COLUMNAS_EXPORT_VENTAS, f"ventas_{sufijo}", formato,
+                titulo_hoja="Historial Ventas", color_encabezado="27ae60",
+            )
     except Exception as e:
         print(f"Error al exportar ventas: {e}")
         return {'error': str(e)}, 500
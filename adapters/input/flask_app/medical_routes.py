@@ -11,14 +11,26 @@ from adapters.input.flask_app.controllers.paciente_controller import PacienteMed
 from adapters.input.flask_app.controllers.ficha_clinica_controller_nuevo import FichaClinicaController
 
 from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.utils.cache import TTLCache
+from app.infraestructure.utils.numeracion import numero_ficha_sql
+from app.infraestructure.utils import cie10
+from app.infraestructure.utils.date_utils import get_chile_date
+from app.infraestructure.repositories.certificado_repository import CertificadoRepository
+from app.infraestructure.repositories.ficha_examenes_repository import FichaExamenesRepository
 from sqlalchemy.orm import joinedload
-from sqlalchemy import or_
-from datetime import datetime
+from sqlalchemy import case, func
+from datetime import datetime, timedelta
+import os
 
 # Modelos nÃºcleo
 from app.domain.models.consulta_medica import FichaClinica
 from app.domain.models.paciente import PacienteMedico
 from app.domain.models.cliente import Cliente
+from app.infraestructure.repositories.sql_persona_search_repository import (
+    SQLPersonaSearchRepository,
+    limite_busqueda,
+    BUSQUEDA_LIMIT_MAX,
+)
 from app.domain.models.user import User
 
 # Modelos de exÃ¡menes (alineados con tu BD)
@@ -33,6 +45,8 @@ from app.domain.models.examenes_medicos import (
     ParametrosClinicos,
 )
 from app.domain.use_cases.services.biomicroscopia_service import BiomicroscopiaService
+from app.domain.use_cases.services.refraccion_analytics_service import RefraccionAnalyticsService
+from app.infraestructure.repositories.biomicroscopia_repository import BiomicroscopiaExamRepository
 
 from jinja2 import TemplateNotFound
 
@@ -232,159 +246,237 @@ def _compactar_textos_campos(obj, campos):
             valores.append(str(val).strip())
     return ", ".join(valores) if valores else None
 
+# Secciones de examen que muestra el certificado
+CERTIFICADO_SECCIONES = ('biomicroscopia', 'fondo_ojo', 'diagnostico', 'tratamiento')
+CERTIFICADOS_LOTE_MAX = 200
+
+_FOOTER_CERTIFICADO = {
+    "direccion": "CALLE GARCÃA AVILES 318 entre Av. 9 de OCTUBRE Y VELEZ",
+    "telefonos": "Telf: 0980632277 / 0998436958 / 0985394814",
+    "ciudad": "Guayaquil",
+}
+
+# HTML renderizado por ficha: {ficha_id: (huella, html)}. La huella (CertificadoRepository)
+# cambia con cualquier alta/edición/baja de la ficha, paciente o exámenes -> se re-renderiza.
+_certificados_cache = TTLCache(
+    ttl_seconds=int(os.getenv("CERTIFICADO_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("CERTIFICADO_CACHE_MAX", "500")),
+)
+
+def _query_fichas_certificado(db):
+    return (
+        db.query(FichaClinica)
+          .options(
+              joinedload(FichaClinica.paciente_medico).joinedload(PacienteMedico.cliente),
+              joinedload(FichaClinica.usuario)
+          )
+    )
+
+def _contexto_certificado(consulta, examenes):
+    """Variables del template de certificado para UNA ficha, con sus exámenes ya cargados."""
+    ficha_id = consulta.ficha_id
+    paciente = consulta.paciente_medico
+    cliente = paciente.cliente if paciente else None
+    usuario = consulta.usuario
+
+    nombre_partes = []
+    if cliente:
+        for attr in ('nombres', 'ap_pat', 'ap_mat'):
+            val = getattr(cliente, attr, None)
+            if val:
+                nombre_partes.append(str(val).strip())
+    elif paciente:
+        for attr in ('nombres', 'ap_pat', 'ap_mat'):
+            val = getattr(paciente, attr, None)
+            if val:
+                nombre_partes.append(str(val).strip())
+    paciente_nombre = " ".join(nombre_partes).strip() if nombre_partes else None
+
+    cliente_doc = None
+    if cliente:
+        for attr in ('rut', 'cedula', 'ci', 'documento', 'doc', 'dni'):
+            val = getattr(cliente, attr, None)
+            if val:
+                texto = str(val).strip()
+                if texto:
+                    cliente_doc = texto
+                    break
+
+    fecha_nacimiento = getattr(cliente, "fecha_nacimiento", None)
+    if not fecha_nacimiento and paciente:
+        fecha_nacimiento = getattr(paciente, "fecha_nacimiento", None)
+    edad = _calcular_edad(fecha_nacimiento, consulta.fecha_consulta)
+    fecha_consulta_str = _formatear_fecha_es(consulta.fecha_consulta)
+
+    # Biomicroscopía (resumen)
+    biomicroscopia_texto = None
+    bio = examenes['biomicroscopia'].get(ficha_id)
+    if bio:
+        od = _compactar_textos_campos(bio, [
+            "parpados_od", "conjuntiva_od", "cornea_od", "camara_anterior_od", "iris_od", "cristalino_od"
+        ])
+        oi = _compactar_textos_campos(bio, [
+            "parpados_oi", "conjuntiva_oi", "cornea_oi", "camara_anterior_oi", "iris_oi", "cristalino_oi"
+        ])
+        obs = getattr(bio, "observaciones_generales", None)
+        partes = []
+        if od: partes.append(f"OD: {od}")
+        if oi: partes.append(f"OI: {oi}")
+        if obs: partes.append(obs)
+        biomicroscopia_texto = ". ".join(partes) if partes else None
+
+    # Fondo de ojo (resumen)
+    fondo_ojo_texto = None
+    fo = examenes['fondo_ojo'].get(ficha_id)
+    if fo:
+        od = _compactar_textos_campos(fo, ["disco_optico_od", "macula_od", "vasos_od", "retina_periferica_od"])
+        oi = _compactar_textos_campos(fo, ["disco_optico_oi", "macula_oi", "vasos_oi", "retina_periferica_oi"])
+        obs = getattr(fo, "observaciones", None)
+        partes = []
+        if od: partes.append(f"OD: {od}")
+        if oi: partes.append(f"OI: {oi}")
+        if obs: partes.append(obs)
+        fondo_ojo_texto = ". ".join(partes) if partes else None
+
+    # Diagnóstico (principal/secundario)
+    diagnostico_texto = None
+    dx = examenes['diagnostico'].get(ficha_id)
+    if dx:
+        principal = (dx.diagnostico_principal or "").strip()
+        cie_p = f"({dx.cie_10_principal})" if dx.cie_10_principal else ""
+        secundarios = []
+        if dx.diagnosticos_secundarios:
+            secundarios.append(dx.diagnosticos_secundarios.strip())
+        if dx.cie_10_secundarios:
+            secundarios.append(f"({dx.cie_10_secundarios.strip()})")
+        secundarios_txt = ", ".join([s for s in secundarios if s])
+        partes = []
+        if principal:
+            partes.append(f"{principal} {cie_p}".strip())
+        if secundarios_txt:
+            partes.append(secundarios_txt)
+        diagnostico_texto = ", ".join([p for p in partes if p])
+
+    # Tratamiento (viñetas)
+    tratamiento_items = []
+    tx = examenes['tratamiento'].get(ficha_id)
+    if tx:
+        posibles = [
+            getattr(tx, "medicamentos", None),
+            getattr(tx, "tratamiento_no_farmacologico", None),
+            getattr(tx, "recomendaciones", None),
+            getattr(tx, "plan_seguimiento", None),
+        ]
+        for bloque in posibles:
+            if bloque:
+                for linea in str(bloque).splitlines():
+                    l = linea.strip().lstrip("âœ“").strip()
+                    if l:
+                        tratamiento_items.append(l)
+
+    # Firma
+    medico_nombre = None
+    if usuario:
+        partes_nombre = [getattr(usuario, "nombre", None), getattr(usuario, "ap_pat", None)]
+        medico_nombre = " ".join([p for p in partes_nombre if p])
+
+    return dict(
+        consulta=consulta,
+        paciente=paciente,
+        cliente=cliente,
+        paciente_nombre=paciente_nombre,
+        cliente_doc=cliente_doc,
+        edad=edad,
+        fecha_consulta_str=fecha_consulta_str,
+        biomicroscopia_texto=biomicroscopia_texto,
+        fondo_ojo_texto=fondo_ojo_texto,
+        diagnostico_texto=diagnostico_texto,
+        tratamiento_items=tratamiento_items,
+        medico_nombre=medico_nombre,
+    )
+
 @medical_bp.route('/consultas/<int:consulta_id>/certificado')
 @login_required
 def certificado_consulta(consulta_id):
+    """
+    Reimprimir un certificado sin cambios cuesta una sola consulta (la huella);
+    si algo cambió se vuelve a armar con ficha + una consulta por sección de examen.
+    """
     db = SessionLocal()
     try:
-        consulta = (
-            db.query(FichaClinica)
-              .options(
-                  joinedload(FichaClinica.paciente_medico).joinedload(PacienteMedico.cliente),
-                  joinedload(FichaClinica.usuario)
-              )
-              .filter(FichaClinica.ficha_id == consulta_id)
-              .first()
-        )
+        huella = CertificadoRepository(db).huellas([consulta_id]).get(consulta_id)
+        if huella is None:
+            abort(404, description="Ficha clÃ­nica no encontrada")
+
+        cacheado = _certificados_cache.get(consulta_id)
+        if cacheado and cacheado[0] == huella:
+            return cacheado[1]
+
+        consulta = _query_fichas_certificado(db).filter(FichaClinica.ficha_id == consulta_id).first()
         if not consulta:
             abort(404, description="Ficha clÃ­nica no encontrada")
+        examenes = FichaExamenesRepository(db).cargar_examenes([consulta_id], CERTIFICADO_SECCIONES)
 
-        paciente = consulta.paciente_medico
-        cliente = paciente.cliente if paciente else None
-        usuario = consulta.usuario
-
-        nombre_partes = []
-        if cliente:
-            for attr in ('nombres', 'ap_pat', 'ap_mat'):
-                val = getattr(cliente, attr, None)
-                if val:
-                    nombre_partes.append(str(val).strip())
-        elif paciente:
-            for attr in ('nombres', 'ap_pat', 'ap_mat'):
-                val = getattr(paciente, attr, None)
-                if val:
-                    nombre_partes.append(str(val).strip())
-        paciente_nombre = " ".join(nombre_partes).strip() if nombre_partes else None
-
-        cliente_doc = None
-        if cliente:
-            for attr in ('rut', 'cedula', 'ci', 'documento', 'doc', 'dni'):
-                val = getattr(cliente, attr, None)
-                if val:
-                    texto = str(val).strip()
-                    if texto:
-                        cliente_doc = texto
-                        break
-
-        fecha_nacimiento = getattr(cliente, "fecha_nacimiento", None)
-        if not fecha_nacimiento and paciente:
-            fecha_nacimiento = getattr(paciente, "fecha_nacimiento", None)
-        edad = _calcular_edad(fecha_nacimiento, consulta.fecha_consulta)
-        fecha_consulta_str = _formatear_fecha_es(consulta.fecha_consulta)
-
-        # BiomicroscopÃ­a (resumen)
-        biomicroscopia_texto = None
-        bio = db.query(Biomicroscopia).filter_by(ficha_id=consulta_id).first()
-        if bio:
-            od = _compactar_textos_campos(bio, [
-                "parpados_od", "conjuntiva_od", "cornea_od", "camara_anterior_od", "iris_od", "cristalino_od"
-            ])
-            oi = _compactar_textos_campos(bio, [
-                "parpados_oi", "conjuntiva_oi", "cornea_oi", "camara_anterior_oi", "iris_oi", "cristalino_oi"
-            ])
-            obs = getattr(bio, "observaciones_generales", None)
-            partes = []
-            if od: partes.append(f"OD: {od}")
-            if oi: partes.append(f"OI: {oi}")
-            if obs: partes.append(obs)
-            biomicroscopia_texto = ". ".join(partes) if partes else None
-
-        # Fondo de ojo (resumen)
-        fondo_ojo_texto = None
-        fo = db.query(FondoOjo).filter_by(ficha_id=consulta_id).first()
-        if fo:
-            od = _compactar_textos_campos(fo, ["disco_optico_od", "macula_od", "vasos_od", "retina_periferica_od"])
-            oi = _compactar_textos_campos(fo, ["disco_optico_oi", "macula_oi", "vasos_oi", "retina_periferica_oi"])
-            obs = getattr(fo, "observaciones", None)
-            partes = []
-            if od: partes.append(f"OD: {od}")
-            if oi: partes.append(f"OI: {oi}")
-            if obs: partes.append(obs)
-            fondo_ojo_texto = ". ".join(partes) if partes else None
-
-        # DiagnÃ³stico (principal/secundario)
-        diagnostico_texto = None
-        dx = (
-            db.query(DiagnosticoMedico)
-              .filter_by(ficha_id=consulta_id)
-              .order_by(DiagnosticoMedico.fecha_diagnostico.desc())
-              .first()
+        html = _render_view(
+            'medical/certificado.html', 'certificado.html',
+            footer_info=_FOOTER_CERTIFICADO,
+            **_contexto_certificado(consulta, examenes)
         )
-        if dx:
-            principal = (dx.diagnostico_principal or "").strip()
-            cie_p = f"({dx.cie_10_principal})" if dx.cie_10_principal else ""
-            secundarios = []
-            if dx.diagnosticos_secundarios:
-                secundarios.append(dx.diagnosticos_secundarios.strip())
-            if dx.cie_10_secundarios:
-                secundarios.append(f"({dx.cie_10_secundarios.strip()})")
-            secundarios_txt = ", ".join([s for s in secundarios if s])
-            partes = []
-            if principal:
-                partes.append(f"{principal} {cie_p}".strip())
-            if secundarios_txt:
-                partes.append(secundarios_txt)
-            diagnostico_texto = ", ".join([p for p in partes if p])
-
-        # Tratamiento (viÃ±etas)
-        tratamiento_items = []
-        tx = (
-            db.query(Tratamiento)
-              .filter_by(ficha_id=consulta_id)
-              .order_by(Tratamiento.fecha_tratamiento.desc())
-              .first()
+        _certificados_cache.set(consulta_id, (huella, html))
+        return html
+    finally:
+        db.close()
+
+def _rango_certificados(args):
+    """[desde, hasta) en hora local (como fichas.fecha_consulta). Por defecto, el día de hoy."""
+    try:
+        if args.get('fecha_desde') or args.get('fecha_hasta'):
+            desde = datetime.strptime(args.get('fecha_desde') or args.get('fecha_hasta'), '%Y-%m-%d')
+            hasta = datetime.strptime(args.get('fecha_hasta') or args.get('fecha_desde'), '%Y-%m-%d')
+        else:
+            fecha = args.get('fecha')
+            desde = datetime.strptime(fecha, '%Y-%m-%d') if fecha else datetime.combine(get_chile_date(), datetime.min.time())
+            hasta = desde
+    except ValueError:
+        abort(400, description="Fecha inválida (use AAAA-MM-DD)")
+    return desde, hasta + timedelta(days=1)
+
+@medical_bp.route('/consultas/certificados')
+@login_required
+def certificados_lote():
+    """
+    Certificados de varias fichas en un solo documento imprimible (cierre del día).
+    Query params: ids=1,2,3  |  fecha=AAAA-MM-DD  |  fecha_desde / fecha_hasta (por defecto, hoy).
+    Consultas fijas: fichas (con paciente, cliente y médico) + una por sección de examen.
+    """
+    db = SessionLocal()
+    try:
+        query = _query_fichas_certificado(db)
+        ids_txt = (request.args.get('ids') or '').strip()
+        if ids_txt:
+            try:
+                ids = [int(x) for x in ids_txt.split(',') if x.strip()]
+            except ValueError:
+                abort(400, description="ids inválidos")
+            query = query.filter(FichaClinica.ficha_id.in_(ids))
+        else:
+            desde, hasta = _rango_certificados(request.args)
+            query = query.filter(FichaClinica.fecha_consulta >= desde, FichaClinica.fecha_consulta < hasta)
+
+        fichas = (
+            query.order_by(FichaClinica.fecha_consulta, FichaClinica.ficha_id)
+                 .limit(CERTIFICADOS_LOTE_MAX + 1)
+                 .all()
         )
-        if tx:
-            posibles = [
-                getattr(tx, "medicamentos", None),
-                getattr(tx, "tratamiento_no_farmacologico", None),
-                getattr(tx, "recomendaciones", None),
-                getattr(tx, "plan_seguimiento", None),
-            ]
-            for bloque in posibles:
-                if bloque:
-                    for linea in str(bloque).splitlines():
-                        l = linea.strip().lstrip("âœ“").strip()
-                        if l:
-                            tratamiento_items.append(l)
-
-        # Firma
-        medico_nombre = None
-        if usuario:
-            partes_nombre = [getattr(usuario, "nombre", None), getattr(usuario, "ap_pat", None)]
-            medico_nombre = " ".join([p for p in partes_nombre if p])
-
-        footer_info = {
-            "direccion": "CALLE GARCÃA AVILES 318 entre Av. 9 de OCTUBRE Y VELEZ",
-            "telefonos": "Telf: 0980632277 / 0998436958 / 0985394814",
-            "ciudad": "Guayaquil",
-        }
+        truncado = len(fichas) > CERTIFICADOS_LOTE_MAX
+        fichas = fichas[:CERTIFICADOS_LOTE_MAX]
 
+        examenes = FichaExamenesRepository(db).cargar_examenes([f.ficha_id for f in fichas], CERTIFICADO_SECCIONES)
         return _render_view(
-            'medical/certificado.html', 'certificado.html',
-            consulta=consulta,
-            paciente=paciente,
-            cliente=cliente,
-            paciente_nombre=paciente_nombre,
-            cliente_doc=cliente_doc,
-            edad=edad,
-            fecha_consulta_str=fecha_consulta_str,
-            biomicroscopia_texto=biomicroscopia_texto,
-            fondo_ojo_texto=fondo_ojo_texto,
-            diagnostico_texto=diagnostico_texto,
-            tratamiento_items=tratamiento_items,
-            medico_nombre=medico_nombre,
-            footer_info=footer_info
+            'medical/certificados_lote.html',
+            certificados=[_contexto_certificado(f, examenes) for f in fichas],
+            truncado=truncado,
+            footer_info=_FOOTER_CERTIFICADO,
         )
     finally:
         db.close()
@@ -398,67 +490,68 @@ def api_get_personas():
     """
     Devuelve una lista unificada de:
     - Pacientes con su cliente embebido  -> type='paciente'
-    - Clientes sin ficha mÃ©dica          -> type='cliente'
+    - Clientes sin ficha médica          -> type='cliente'
     Filtros:
       q       : texto (nombre o rut)
       estado  : true/false (aplica al estado del registro correspondiente)
+      limit / offset : paginación (limit máx. BUSQUEDA_LIMIT_MAX)
+
+    Una sola consulta Cliente LEFT JOIN PacienteMedico (pacientes primero, luego
+    relevancia o apellido) paginada en SQL; meta.total sale de la misma consulta
+    con COUNT(*) OVER ().
     """
     q = (request.args.get('q') or '').strip()
     estado = request.args.get('estado')
-    limit = int(request.args.get('limit', 100))
-    offset = int(request.args.get('offset', 0))
+    limit = limite_busqueda(request.args.get('limit'), default=BUSQUEDA_LIMIT_MAX)
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
 
     db = SessionLocal()
     try:
-        items = []
-
-        # 1) Pacientes (join Cliente)
-        pq = (
-            db.query(PacienteMedico, Cliente)
-              .join(Cliente, PacienteMedico.cliente_id == Cliente.cliente_id)
+        busqueda = SQLPersonaSearchRepository(db)
+        # Cédula/RUC válido -> coincidencia exacta por rut (idx_clientes_rut)
+        rut = paciente_medico_controller._rut_si_identificacion(q)
+
+        es_cliente = PacienteMedico.paciente_medico_id.is_(None)
+        query = (
+            db.query(Cliente, PacienteMedico, func.count().over().label('total'))
+              .outerjoin(PacienteMedico, PacienteMedico.cliente_id == Cliente.cliente_id)
         )
-        if q:
-            like = f"%{q}%"
-            pq = pq.filter(or_(Cliente.nombres.ilike(like),
-                               Cliente.ap_pat.ilike(like),
-                               Cliente.ap_mat.ilike(like),
-                               Cliente.rut.ilike(like)))
-        if estado in ('true', 'false'):
-            val = (estado == 'true')
-            pq = pq.filter(PacienteMedico.estado == val)
-        pacientes = pq.all()
-
-        paciente_cliente_ids = set()
-        for p, c in pacientes:
-            items.append(_serialize_paciente(p, c))
-            paciente_cliente_ids.add(c.cliente_id)
-
-        # 2) Clientes sin ficha
-        cq = db.query(Cliente).filter(~Cliente.cliente_id.in_(paciente_cliente_ids))
-        if q:
-            like = f"%{q}%"
-            cq = cq.filter(or_(Cliente.nombres.ilike(like),
-                               Cliente.ap_pat.ilike(like),
-                               Cliente.ap_mat.ilike(like),
-                               Cliente.rut.ilike(like)))
         if estado in ('true', 'false'):
             val = (estado == 'true')
-            cq = cq.filter(Cliente.estado == val)
+            query = query.filter(case((es_cliente, Cliente.estado), else_=PacienteMedico.estado) == val)
 
-        clientes = cq.order_by(Cliente.nombres.asc()).offset(offset).limit(limit).all()
+        query = busqueda.aplicar(query.order_by(es_cliente), q, rut=rut)
+        query = query.order_by(Cliente.ap_pat, Cliente.nombres, Cliente.cliente_id)
+        filas = query.offset(offset).limit(limit).all()
 
-        for c in clientes:
-            items.append({
-                'type': 'cliente',
-                'cliente_id': c.cliente_id,
-                'estado': c.estado,
-                'cliente': _serialize_cliente(c)
-            })
+        if filas:
+            total = filas[0].total
+        else:
+            # Página fuera de rango: el total no viene en ninguna fila
+            total = query.order_by(None).count() if offset else 0
 
-        # Para pacientes tambiÃ©n respetamos paginaciÃ³n bÃ¡sica (opcional):
-        # AquÃ­ mantenemos items completos; si deseas paginar de verdad, unifica en SQL con UNION.
-
-        return jsonify({'success': True, 'data': items, 'meta': {'count': len(items)}})
+        items = []
+        for c, p, _ in filas:
+            if p is not None:
+                items.append(_serialize_paciente(p, c))
+            else:
+                items.append({
+                    'type': 'cliente',
+                    'cliente_id': c.cliente_id,
+                    'estado': c.estado,
+                    'cliente': _serialize_cliente(c)
+                })
+
+        return jsonify({'success': True, 'data': items, 'meta': {
+            'count': len(items),
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+            'has_more': offset + len(items) < total,
+        }})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
     finally:
@@ -544,7 +637,8 @@ def api_create_paciente_medico():
                 return jsonify({'success': False, 'message': 'El cliente ya posee ficha de Paciente'}), 409
 
             pmdata = payload.get('paciente_medico') or {}
-            numero_ficha = pmdata.get('numero_ficha') or f"FM-{datetime.now().strftime('%Y%m')}-{int(datetime.now().timestamp()*1000)}"
+            # Correlativo de secuencia evaluado en el mismo INSERT (sin lecturas previas)
+            numero_ficha = (pmdata.get('numero_ficha') or '').strip() or numero_ficha_sql()
 
             paciente = PacienteMedico(
                 cliente_id=cliente_obj.cliente_id,
@@ -624,6 +718,44 @@ def api_get_consultas_paciente(paciente_medico_id):
     finally:
         db.close()
 
+# ---------------------------------------------------------------------------
+# API - ANALÍTICA DE REFRACCIÓN (prevalencias, ejes, evolución por paciente)
+# ---------------------------------------------------------------------------
+@medical_bp.route('/api/analitica/refraccion', methods=['GET'])
+@login_required
+def api_analitica_refraccion():
+    """Query params opcionales: fecha_desde / fecha_hasta (AAAA-MM-DD, ambos inclusive)."""
+    try:
+        desde = request.args.get('fecha_desde')
+        hasta = request.args.get('fecha_hasta')
+        desde = datetime.strptime(desde, '%Y-%m-%d') if desde else None
+        hasta = datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1) if hasta else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Fecha inválida (use AAAA-MM-DD)'}), 400
+
+    try:
+        data = RefraccionAnalyticsService().resumen(desde, hasta)
+    except Exception as exc:
+        current_app.logger.exception('Error calculando analítica de refracción')
+        return jsonify({'success': False, 'message': str(exc)}), 500
+    return jsonify({'success': True, 'data': data})
+
+@medical_bp.route('/api/pacientes-medicos/<int:paciente_medico_id>/refraccion', methods=['GET'])
+@login_required
+def api_serie_refraccion_paciente(paciente_medico_id):
+    """Serie OD/OI de equivalente esférico, cilindro y agudeza (detalle_paciente.html)."""
+    try:
+        data = RefraccionAnalyticsService().serie_paciente(paciente_medico_id)
+    except Exception as exc:
+        current_app.logger.exception('Error calculando serie de refracción del paciente')
+        return jsonify({'success': False, 'message': str(exc)}), 500
+    return jsonify({'success': True, 'data': data})
+
+@medical_bp.route('/api/pacientes-medicos/<int:paciente_medico_id>/timeline', methods=['GET'])
+@login_required
+def api_get_timeline_paciente(paciente_medico_id):
+    return ficha_clinica_controller.get_timeline_paciente(paciente_medico_id)
+
 # ============================================================================
 # API - FICHAS CLÃNICAS
 # ============================================================================
@@ -647,6 +779,11 @@ def api_get_ficha_clinica_by_id(ficha_id):
 def api_update_ficha_clinica(ficha_id):
     return ficha_clinica_controller.update_ficha_clinica(ficha_id)
 
+@medical_bp.route('/api/fichas-clinicas/<int:ficha_id>', methods=['PATCH'])
+@login_required
+def api_patch_ficha_clinica(ficha_id):
+    return ficha_clinica_controller.patch_ficha_clinica(ficha_id)
+
 # ---------------------------------------------------------------------------
 # API - RESUMEN DE EXÃMENES POR FICHA (para detalle / historial si se quiere)
 # ---------------------------------------------------------------------------
@@ -691,6 +828,26 @@ def api_get_examenes_por_ficha(ficha_id):
     finally:
         db.close()
 
+# ---------------------------------------------------------------------------
+# API - CATÁLOGO CIE-10 (autocompletado en memoria, sin consultar la BD)
+# ---------------------------------------------------------------------------
+@medical_bp.route('/api/cie10', methods=['GET'])
+@login_required
+def api_buscar_cie10():
+    """?q= código ('H40.1', 'h40') o palabras de la descripción ('glauc ang'); ?limite= opcional."""
+    termino = (request.args.get('q') or '').strip()
+    limite = request.args.get('limite', cie10.LIMITE_DEFAULT, type=int)
+    limite = min(max(limite, 1), cie10.LIMITE_MAX)
+    if len(termino) < 2:
+        return jsonify({'success': True, 'data': []})
+
+    try:
+        data = cie10.indice_cie10().buscar(termino, limite)
+    except Exception as exc:
+        current_app.logger.exception('Error consultando catálogo CIE-10')
+        return jsonify({'success': False, 'message': str(exc)}), 500
+    return jsonify({'success': True, 'data': data})
+
 # ---------------------------------------------------------------------------
 # API - EXAMEN DE BIOMICROSCOPÍA COMPLETO
 # ---------------------------------------------------------------------------
@@ -719,9 +876,24 @@ def api_save_biomicroscopia():
     service = BiomicroscopiaService()
 
     try:
+        # El código CIE-10 se guarda en la forma del catálogo (validado en memoria)
+        cie10_txt = (payload.get('cie_10_principal') or '').strip()
+        entrada_cie10 = None
+        if cie10_txt:
+            indice = cie10.indice_cie10()
+            entrada_cie10 = indice.por_codigo(cie10_txt)
+            if entrada_cie10 is None:
+                # Sin catálogo cargado se acepta cualquier código con formato CIE-10
+                codigo = cie10.formatear_codigo(cie10_txt) if not len(indice) else None
+                if not codigo:
+                    return jsonify({'success': False, 'message': f'Código CIE-10 no válido: {cie10_txt}'}), 400
+                entrada_cie10 = {'codigo': codigo, 'descripcion': None}
+
         resultado = service.guardar_examen(ficha_id, payload)
 
         diagnostico_txt = (payload.get('diagnostico') or '').strip()
+        if not diagnostico_txt and entrada_cie10:
+            diagnostico_txt = entrada_cie10['descripcion'] or entrada_cie10['codigo']
         tratamiento_txt = (payload.get('tratamiento') or '').strip()
 
         if diagnostico_txt or tratamiento_txt:
@@ -737,6 +909,8 @@ def api_save_biomicroscopia():
                     if not diag:
                         diag = DiagnosticoMedico(ficha_id=ficha_id)
                     diag.diagnostico_principal = diagnostico_txt
+                    if 'cie_10_principal' in payload:
+                        diag.cie_10_principal = entrada_cie10['codigo'] if entrada_cie10 else None
                     db.add(diag)
 
                 if tratamiento_txt:
@@ -768,6 +942,28 @@ def api_save_biomicroscopia():
         current_app.logger.exception('Error guardando examen de biomicroscopía')
         return jsonify({'success': False, 'message': str(exc)}), 500
 
+
+@medical_bp.route('/api/biomicroscopia/<int:ficha_id>', methods=['PATCH'])
+@login_required
+def api_autoguardar_biomicroscopia(ficha_id):
+    """Autoguardado del examen: solo las secciones y campos que cambiaron, con su versión."""
+    payload = request.get_json(silent=True) or {}
+    try:
+        resultado = BiomicroscopiaService().guardar_delta(ficha_id, payload)
+    except ValueError as exc:
+        return jsonify({'success': False, 'message': str(exc)}), 400
+    except Exception as exc:
+        current_app.logger.exception('Error en autoguardado de biomicroscopía')
+        return jsonify({'success': False, 'message': str(exc)}), 500
+
+    if resultado['conflictos']:
+        return jsonify({
+            'success': False,
+            'message': 'El examen fue modificado por otra sesión',
+            'conflictos': resultado['conflictos'],
+        }), 409
+    return jsonify({'success': True, 'versiones': resultado['versiones']})
+
 # ---------------------------------------------------------------------------
 # API - GUARDAR EXAMEN OFTALMOLÃ“GICO (desde examen_oftalmologico_nuevo.html)
 # Guarda en tablas existentes: presion_intraocular y fondo_ojo
@@ -819,19 +1015,15 @@ def api_save_examen_oftalmologico():
         obs_agudeza = (payload.get('observaciones_agudeza') or "").strip()  # lo usamos como "observaciones" si llega
 
         if fondo_od or fondo_oi or obs_agudeza:
-            fo = FondoOjo(
-                ficha_id=ficha_id,
-                disco_optico_od=None,
-                macula_od=None,
-                vasos_od=None,
-                retina_periferica_od=fondo_od if fondo_od else None,
-                disco_optico_oi=None,
-                macula_oi=None,
-                vasos_oi=None,
-                retina_periferica_oi=fondo_oi if fondo_oi else None,
-                observaciones=obs_agudeza if obs_agudeza else None
+            # Una fila por ficha: actualiza solo lo que llega y conserva lo cargado en biomicroscopía
+            campos_fondo = {
+                'retina_periferica_od': fondo_od,
+                'retina_periferica_oi': fondo_oi,
+                'observaciones': obs_agudeza,
+            }
+            BiomicroscopiaExamRepository(db).upsert_fondo_ojo(
+                ficha_id, {k: v for k, v in campos_fondo.items() if v}
             )
-            db.add(fo)
             guardados['fondo_ojo'] = True
 
         # ---- PIO ----
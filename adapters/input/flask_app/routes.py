@@ -9,6 +9,8 @@ from app.domain.use_cases.services.cliente_service import ClienteService
 from app.infraestructure.repositories.sql_product_repository import SQLProductRepository
 from app.infraestructure.utils.db import SessionLocal
 from app.infraestructure.utils.db_session import get_db_session, close_db_session
+from app.infraestructure.utils.db import pool_report
+from app.infraestructure.utils.unit_of_work import db_metrics_snapshot
 from app.domain.models.products import Product
 from app.domain.models.sale import Sale
 from app.domain.models.cliente import Cliente
@@ -95,35 +97,87 @@ def productos():
         db_session.close()
 
 # --- (El resto de tus rutas como /inventario, /registrar-venta, /dashboard, etc., continúan aquí sin cambios) ---
+INVENTARIO_PER_PAGE = 50
+INVENTARIO_MAX_PER_PAGE = 200
+
+
+def _inventario_params():
+    """Filtros y página de inventario desde la query string (mismos nombres que el export)."""
+    filtros = {
+        'marca': request.args.get('marca') or None,
+        'material': request.args.get('material') or None,
+        'tipo_armazon': request.args.get('tipo_armazon') or None,
+        'nivel_stock': request.args.get('cantidad') or None,
+        'q': (request.args.get('q') or '').strip() or None,
+    }
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = request.args.get('per_page', INVENTARIO_PER_PAGE, type=int) or INVENTARIO_PER_PAGE
+    per_page = min(max(per_page, 1), INVENTARIO_MAX_PER_PAGE)
+    return filtros, page, per_page
+
+
 @bp.route('/inventario')
 def inventario():
     login_check = require_login()
     if login_check:
         return login_check
-    
+
+    filtros, page, per_page = _inventario_params()
     db_session = SessionLocal()
     try:
         product_repo = SQLProductRepository(db_session)
-        productos = product_repo.get_all()
-        
-        total_productos = len(productos)
-        total_stock = sum(p.cantidad for p in productos if p.cantidad)
-        stock_bajo = len([p for p in productos if p.cantidad and p.cantidad < 10])
-        categorias = len(set(p.marca for p in productos if p.marca))
-        
-        marcas_list = sorted(set(p.marca for p in productos if p.marca))
-        
-        stats = {
-            'total_productos': total_productos,
-            'total_stock': total_stock,
-            'stock_bajo': stock_bajo,
-            'categorias': categorias
-        }
-        
-        return render_template('inventario.html', 
-                             productos=productos, 
-                             stats=stats, 
-                             marcas=marcas_list)
+        # Totales y valores de filtros en una consulta agrupada; la tabla solo trae una página
+        stats, facetas = product_repo.inventory_stats()
+        productos, total = product_repo.get_page(page, per_page, **filtros)
+
+        return render_template('inventario.html',
+                             productos=productos,
+                             stats=stats,
+                             marcas=facetas['marcas'],
+                             materiales=facetas['materiales'],
+                             tipos_armazon=facetas['tipos_armazon'],
+                             total_filtrado=total,
+                             page=page,
+                             pages=max((total + per_page - 1) // per_page, 1))
+    finally:
+        db_session.close()
+
+
+@bp.route('/api/inventario')
+def api_inventario():
+    """Página de inventario filtrada en el servidor: datos + filas ya renderizadas."""
+    if 'user_id' not in session:
+        return jsonify({"success": False, "error": "No autenticado"}), 401
+
+    filtros, page, per_page = _inventario_params()
+    db_session = SessionLocal()
+    try:
+        productos, total = SQLProductRepository(db_session).get_page(page, per_page, **filtros)
+        return jsonify({
+            "success": True,
+            "productos": [
+                {
+                    "producto_id": p.producto_id,
+                    "nombre": p.nombre,
+                    "codigo": p.codigo,
+                    "marca": p.marca,
+                    "material": p.material,
+                    "tipo_armazon": p.tipo_armazon,
+                    "cantidad": p.cantidad,
+                    "costo_venta_1": float(p.costo_venta_1) if p.costo_venta_1 is not None else None,
+                    "estado": p.estado,
+                }
+                for p in productos
+            ],
+            "html": render_template('_inventario_filas.html', productos=productos),
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "pages": max((total + per_page - 1) // per_page, 1),
+        })
+    except Exception as e:
+        print(f"Error en /api/inventario: {e}")
+        return jsonify({"success": False, "error": "Error al cargar inventario"}), 500
     finally:
         db_session.close()
 
@@ -137,14 +191,8 @@ def registrar_venta():
         flash('Acceso denegado.', 'danger')
         return redirect(url_for('user_html.login'))
     
-    db_session = SessionLocal()
-    try:
-        product_repo = SQLProductRepository(db_session)
-        productos = product_repo.get_all()
-    finally:
-        db_session.close()
-    
-    return render_template('registrar_venta.html', products=productos)
+    # El catálogo lo carga la página desde /api/catalogo (cacheado por versión)
+    return render_template('registrar_venta.html')
 
 @bp.route('/historial-ventas')
 def historial_ventas():
@@ -169,29 +217,30 @@ def dashboard():
         flash('Acceso denegado.', 'danger')
         return redirect(url_for('user_html.login'))
     
-    # Esta ruta parece ser un dashboard genérico o alternativo.
-    # El dashboard principal del admin está en product_controller.
-    # Se debe asegurar que su propósito sea claro.
-    # Por ahora, se mantiene su lógica original.
+    # Dashboard alternativo: mismos agregados SQL cacheados que product_html.dashboard
     try:
-        db_session = get_db_session()
-        # ... (la lógica compleja del dashboard que tenías) ...
-        # Se recomienda mover esta lógica a un servicio para mantener limpio el controlador.
-        total_ventas_hoy = 0 # Placeholder
-        ventas_recientes = [] # Placeholder
-        productos_en_stock = 0 # Placeholder
-        
-        return render_template('dashboard.html', 
-                             productos_en_stock=productos_en_stock,
-                             total_ventas_hoy=total_ventas_hoy,
-                             ventas_recientes=ventas_recientes)
+        stats = get_sale_service().get_dashboard_stats()
     except Exception as e:
         print(f"Error en dashboard: {e}")
         flash("Error al cargar el dashboard.", "danger")
-        return render_template('dashboard.html', productos_en_stock=0, total_ventas_hoy=0, ventas_recientes=[])
-    finally:
-        if 'db_session' in locals() and db_session:
-            close_db_session(db_session)
+        stats = {}
+
+    return render_template('dashboard.html',
+                         productos_en_stock=stats.get('total_stock', 0),
+                         productos_bajo_stock=stats.get('productos_stock_bajo', []),
+                         total_ventas_hoy=stats.get('total_ventas_hoy', 0),
+                         ventas_recientes=stats.get('ventas_recientes', []),
+                         productos_vendidos_hoy=stats.get('productos_vendidos_hoy', 0),
+                         examenes_hoy=stats.get('examenes_hoy', 0),
+                         pacientes_atendidos_hoy=stats.get('pacientes_atendidos_hoy', 0),
+                         top_productos_mes=stats.get('top_productos_mes', []))
+
+@bp.route('/api/metricas/db')
+def metricas_db():
+    """Pool configurado + tiempos de checkout/hold de conexiones de este worker."""
+    if session.get('rol') != 'Administrador':
+        return jsonify({"success": False, "error": "Acceso denegado"}), 403
+    return jsonify({"success": True, "pool": pool_report(), "conexiones": db_metrics_snapshot()})
 
 # --- (El resto de las rutas como /boleta y las APIs continúan aquí) ---
 # ...
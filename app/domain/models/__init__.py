@@ -5,6 +5,7 @@ from .rol import Rol
 from .cliente import Cliente
 from .products import Product
 from .sale import Sale
+from .venta_diaria import VentaDiaria
 from .paciente import PacienteMedico
 from .consulta_medica import FichaClinica
 
@@ -30,6 +31,7 @@ __all__ = [
     "Cliente",
     "Product",
     "Sale",
+    "VentaDiaria",
     "PacienteMedico",
     "FichaClinica",
     "FondoOjo",
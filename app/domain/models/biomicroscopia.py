@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint, func
 from sqlalchemy.orm import relationship
-from app.infraestructure.utils.tables import Base
+from app.infraestructure.utils.tables import Base, columna_version
 
 class Biomicroscopia(Base):
     __tablename__ = 'biomicroscopia'
@@ -51,6 +51,12 @@ class Biomicroscopia(Base):
     observaciones_generales = Column(Text)
     otros_detalles = Column(Text)
     fecha_examen = Column(DateTime, default=func.now(), nullable=False)
+    version = columna_version()
+
+    # Una fila por ficha: el guardado es INSERT ... ON CONFLICT (ficha_id) DO UPDATE
+    __table_args__ = (
+        UniqueConstraint('ficha_id', name='biomicroscopia_ficha_id_key'),
+    )
 
     # Relación
     ficha = relationship("FichaClinica", foreign_keys=[ficha_id])
@@ -62,6 +68,7 @@ class Biomicroscopia(Base):
         return {
             'biomicroscopia_id': self.biomicroscopia_id,
             'ficha_id': self.ficha_id,
+            'version': self.version,
             'parpados_od': self.parpados_od,
             'conjuntiva_od': self.conjuntiva_od,
             'cornea_od': self.cornea_od,
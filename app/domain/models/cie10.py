@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Text
+from app.infraestructure.utils.tables import Base
+
+class Cie10(Base):
+    """
+    Catálogo CIE-10 (tabla 'cie10'). Se carga desde archivo con
+    python -m app.infraestructure.utils.cargar_cie10.
+    """
+    __tablename__ = 'cie10'
+
+    codigo = Column(String(10), primary_key=True)  # con punto: 'H40.1'
+    descripcion = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return f"<Cie10(codigo={self.codigo})>"
+
+    def to_dict(self):
+        return {
+            'codigo': self.codigo,
+            'descripcion': self.descripcion,
+        }
@@ -1,8 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Date
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Date, Computed, Index, DDL, event
 from sqlalchemy.orm import relationship
 from app.infraestructure.utils.tables import Base
 from datetime import datetime
 
+# Plegado de acentos compartido por la columna generada y por la normalización en Python
+# (ver SQLPersonaSearchRepository.normalizar): ambos lados deben transformar igual.
+ACENTOS = 'ÁÉÍÓÚÜÑáéíóúüñ'
+SIN_ACENTOS = 'AEIOUUNaeiouun'
+BUSQUEDA_SQL = (
+    "lower(translate(nombres || ' ' || ap_pat || ' ' || coalesce(ap_mat, '') || ' ' || rut, "
+    f"'{ACENTOS}', '{SIN_ACENTOS}'))"
+)
+
 class Cliente(Base):
     __tablename__ = 'clientes'
 
@@ -17,9 +26,27 @@ class Cliente(Base):
     fecha_nacimiento = Column(Date, nullable=True)
     fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=True)
     estado = Column(Boolean, default=True, nullable=True)
+    # Nombre completo + rut en minúsculas y sin acentos; lo calcula PostgreSQL (solo lectura)
+    busqueda = Column(Text, Computed(BUSQUEDA_SQL, persisted=True))
 
     # Relación con paciente médico
     paciente_medico = relationship("PacienteMedico", back_populates="cliente", uselist=False)
 
+    # idx_clientes_busqueda_trgm (pg_trgm) permite LIKE '%texto%' sin recorrer la tabla;
+    # idx_clientes_rut respalda la búsqueda exacta por cédula/RUC
+    __table_args__ = (
+        Index('idx_clientes_busqueda_trgm', 'busqueda',
+              postgresql_using='gin', postgresql_ops={'busqueda': 'gin_trgm_ops'}),
+        Index('idx_clientes_rut', 'rut'),
+    )
+
     def __repr__(self):
-        return f"<Cliente(nombres={self.nombres}, ap_pat={self.ap_pat}, estado={self.estado})>" 
\ No newline at end of file
+        return f"<Cliente(nombres={self.nombres}, ap_pat={self.ap_pat}, estado={self.estado})>"
+
+
+# El índice trigram necesita la extensión antes del create_all
+event.listen(
+    Base.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'),
+)
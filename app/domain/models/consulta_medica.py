@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Date, Text, DateTime, ForeignKey, func, Numeric, Boolean
+from sqlalchemy import Column, Integer, SmallInteger, String, Date, Text, DateTime, ForeignKey, func, Numeric, Boolean, Index, event, inspect
 from sqlalchemy.orm import relationship
-from app.infraestructure.utils.tables import Base
+from app.infraestructure.utils.tables import Base, columna_version
+from app.infraestructure.utils.refraccion import COLUMNAS_NUMERICAS
 from datetime import datetime
 
 class FichaClinica(Base):
@@ -41,20 +42,46 @@ class FichaClinica(Base):
     # DATOS GENERALES REFRACCIÓN
     distancia_pupilar = Column(String(10))
     tipo_lente = Column(String(50))
+
+    # VALORES NUMÉRICOS (derivados del texto al guardar; ver utils/refraccion.py)
+    esfera_od_d = Column(Numeric(5, 2, asdecimal=False))
+    cilindro_od_d = Column(Numeric(5, 2, asdecimal=False))
+    eje_od_grados = Column(SmallInteger)
+    adicion_od_d = Column(Numeric(5, 2, asdecimal=False))
+    av_od_sc_logmar = Column(Numeric(4, 2, asdecimal=False))
+    av_od_cc_logmar = Column(Numeric(4, 2, asdecimal=False))
+    av_od_ph_logmar = Column(Numeric(4, 2, asdecimal=False))
+    esfera_oi_d = Column(Numeric(5, 2, asdecimal=False))
+    cilindro_oi_d = Column(Numeric(5, 2, asdecimal=False))
+    eje_oi_grados = Column(SmallInteger)
+    adicion_oi_d = Column(Numeric(5, 2, asdecimal=False))
+    av_oi_sc_logmar = Column(Numeric(4, 2, asdecimal=False))
+    av_oi_cc_logmar = Column(Numeric(4, 2, asdecimal=False))
+    av_oi_ph_logmar = Column(Numeric(4, 2, asdecimal=False))
     
     estado = Column(String(20), default='en_proceso')
     fecha_creacion = Column(DateTime, default=func.now())
+    version = columna_version()
 
     # Relaciones
     paciente_medico = relationship("PacienteMedico", foreign_keys=[paciente_medico_id])
     usuario = relationship("User", foreign_keys=[usuario_id])
 
+    # idx_fichas_fecha_id respalda la paginación por cursor: (fecha_consulta, ficha_id) < (...)
+    # con ORDER BY ambos DESC es un solo rango del índice leído hacia atrás.
+    # idx_fichas_paciente_fecha, la línea de tiempo de un paciente
+    __table_args__ = (
+        Index('idx_fichas_fecha_id', 'fecha_consulta', 'ficha_id'),
+        Index('idx_fichas_paciente_fecha', 'paciente_medico_id', 'fecha_consulta', 'ficha_id'),
+    )
+
     def __repr__(self):
         return f"<FichaClinica(ficha_id={self.ficha_id}, numero_consulta={self.numero_consulta}, estado={self.estado})>"
 
     def to_dict(self):
         return {
             'ficha_id': self.ficha_id,
+            'version': self.version,
             'paciente_medico_id': self.paciente_medico_id,
             'usuario_id': self.usuario_id,
             'numero_consulta': self.numero_consulta,
@@ -88,5 +115,16 @@ class FichaClinica(Base):
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None
         }
 
+
+@event.listens_for(FichaClinica, 'before_insert')
+@event.listens_for(FichaClinica, 'before_update')
+def _normalizar_refraccion(mapper, connection, target):
+    """Recalcula las columnas numéricas de los campos de texto que cambiaron."""
+    estado = inspect(target)
+    for campo, (destino, parser) in COLUMNAS_NUMERICAS.items():
+        if estado.pending or estado.attrs[campo].history.has_changes():
+            setattr(target, destino, parser(getattr(target, campo)))
+
+
 # Alias para compatibilidad con diferentes importaciones
 ConsultaMedica = FichaClinica
\ No newline at end of file
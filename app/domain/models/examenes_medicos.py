@@ -1,7 +1,7 @@
 # app/domain/models/examenes_medicos.py
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Time, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Time, ForeignKey, UniqueConstraint, func
 from sqlalchemy.orm import relationship
-from app.infraestructure.utils.tables import Base
+from app.infraestructure.utils.tables import Base, columna_version
 
 class FondoOjo(Base):
     __tablename__ = 'fondo_ojo'
@@ -44,6 +44,11 @@ class FondoOjo(Base):
     observaciones = Column(Text)
     otros_detalles = Column(Text)
     fecha_examen = Column(DateTime, default=func.now(), nullable=False)
+    version = columna_version()
+
+    __table_args__ = (
+        UniqueConstraint('ficha_id', name='fondo_ojo_ficha_id_key'),
+    )
 
     # Relación
     ficha = relationship("FichaClinica", foreign_keys=[ficha_id])
@@ -55,6 +60,7 @@ class FondoOjo(Base):
         return {
             'fondo_ojo_id': self.fondo_ojo_id,
             'ficha_id': self.ficha_id,
+            'version': self.version,
             'disco_optico_od': self.disco_optico_od,
             'macula_od': self.macula_od,
             'vasos_od': self.vasos_od,
@@ -220,6 +226,11 @@ class ReflejosPupilares(Base):
     consensual_dos = Column(Text)
     observaciones = Column(Text)
     fecha_registro = Column(DateTime, default=func.now(), nullable=False)
+    version = columna_version()
+
+    __table_args__ = (
+        UniqueConstraint('ficha_id', name='reflejos_pupilares_ficha_id_key'),
+    )
 
     ficha = relationship("FichaClinica", foreign_keys=[ficha_id])
 
@@ -230,6 +241,7 @@ class ReflejosPupilares(Base):
         return {
             'reflejo_id': self.reflejo_id,
             'ficha_id': self.ficha_id,
+            'version': self.version,
             'acomodativo_uno': self.acomodativo_uno,
             'fotomotor_uno': self.fotomotor_uno,
             'consensual_uno': self.consensual_uno,
@@ -255,6 +267,11 @@ class ParametrosClinicos(Base):
     atp = Column(String(20))
     colesterol = Column(String(20))
     fecha_registro = Column(DateTime, default=func.now(), nullable=False)
+    version = columna_version()
+
+    __table_args__ = (
+        UniqueConstraint('ficha_id', name='parametros_clinicos_ficha_id_key'),
+    )
 
     ficha = relationship("FichaClinica", foreign_keys=[ficha_id])
 
@@ -265,6 +282,7 @@ class ParametrosClinicos(Base):
         return {
             'parametro_id': self.parametro_id,
             'ficha_id': self.ficha_id,
+            'version': self.version,
             'presion_sistolica': self.presion_sistolica,
             'presion_diastolica': self.presion_diastolica,
             'saturacion_o2': self.saturacion_o2,
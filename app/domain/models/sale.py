@@ -1,5 +1,5 @@
 # app/domain/models/sale.py
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.infraestructure.utils.tables import Base
 from datetime import datetime
@@ -16,6 +16,12 @@ class Sale(Base):
     metodo_pago = Column(String(50), nullable=True)
     observaciones = Column(Text, nullable=True)
     estado = Column(String(20), nullable=True)
+    # Clave emitida en /revisar-venta; un reenvío del checkout devuelve esta misma venta
+    idempotency_key = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('idempotency_key', name='ventas_idempotency_key_key'),
+    )
 
     # Relaciones (EAGER por defecto para evitar DetachedInstanceError en templates)
     detalles = relationship(
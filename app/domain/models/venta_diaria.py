@@ -0,0 +1,34 @@
+# app/domain/models/venta_diaria.py
+from sqlalchemy import Column, Integer, String, Date, Numeric, PrimaryKeyConstraint, Index
+from app.infraestructure.utils.tables import Base
+
+
+class VentaDiaria(Base):
+    """
+    Rollup de ventas por día (calendario de Chile), producto, vendedor y método de pago.
+
+    Lo mantiene register_sale_from_cart con un upsert en la misma transacción de la venta;
+    rebuild_ventas_diarias lo reconstruye desde ventas/detalle_ventas.
+    usuario_id = 0 y metodo_pago = '' representan "sin vendedor" / "sin método"
+    (la clave primaria no admite NULL).
+    """
+    __tablename__ = 'ventas_diarias'
+
+    fecha = Column(Date, nullable=False)
+    producto_id = Column(Integer, nullable=False)
+    usuario_id = Column(Integer, nullable=False, default=0)
+    metodo_pago = Column(String(50), nullable=False, default='')
+    unidades = Column(Integer, nullable=False, default=0)
+    monto = Column(Numeric(14, 2), nullable=False, default=0)
+    num_ventas = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('fecha', 'producto_id', 'usuario_id', 'metodo_pago', name='ventas_diarias_pkey'),
+        Index('idx_ventas_diarias_producto', 'producto_id', 'fecha'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<VentaDiaria(fecha={self.fecha}, producto_id={self.producto_id}, "
+            f"usuario_id={self.usuario_id}, unidades={self.unidades}, monto={self.monto})>"
+        )
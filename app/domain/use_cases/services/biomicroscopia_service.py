@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.repositories.autoguardado_repository import AutoguardadoRepository
 from app.infraestructure.repositories.biomicroscopia_repository import (
     BiomicroscopiaExamRepository,
+    SECCIONES_EXAMEN,
 )
-from app.domain.models.examenes_medicos import DiagnosticoMedico, Tratamiento
 
 
 class BiomicroscopiaService:
@@ -16,25 +17,7 @@ class BiomicroscopiaService:
         session = SessionLocal()
         try:
             repo = BiomicroscopiaExamRepository(session)
-            data = repo.obtener_examen_completo(ficha_id)
-
-            diag = (
-                session.query(DiagnosticoMedico)
-                .filter(DiagnosticoMedico.ficha_id == ficha_id)
-                .order_by(DiagnosticoMedico.fecha_diagnostico.desc())
-                .first()
-            )
-            tx = (
-                session.query(Tratamiento)
-                .filter(Tratamiento.ficha_id == ficha_id)
-                .order_by(Tratamiento.fecha_tratamiento.desc())
-                .first()
-            )
-
-            data['diagnostico'] = diag.to_dict() if diag else None
-            data['tratamiento'] = tx.to_dict() if tx else None
-
-            return data
+            return repo.obtener_examen_completo(ficha_id)
         finally:
             session.close()
 
@@ -43,24 +26,80 @@ class BiomicroscopiaService:
         try:
             repo = BiomicroscopiaExamRepository(session)
 
-            seccion_bio = payload.get('biomicroscopia') or {}
-            seccion_reflejos = payload.get('reflejos') or {}
-            seccion_fondo = payload.get('fondo_ojo') or {}
-            seccion_parametros = payload.get('parametros') or {}
-
-            bio = repo.upsert_biomicroscopia(ficha_id, seccion_bio)
-            reflejos = repo.upsert_reflejos(ficha_id, seccion_reflejos)
-            fondo = repo.upsert_fondo_ojo(ficha_id, seccion_fondo)
-            parametros = repo.upsert_parametros(ficha_id, seccion_parametros)
+            secciones = repo.guardar_secciones(ficha_id, payload)
 
             session.commit()
 
-            return {
-                'biomicroscopia': bio.to_dict(),
-                'reflejos': reflejos.to_dict(),
-                'fondo_ojo': fondo.to_dict(),
-                'parametros': parametros.to_dict(),
-            }
+            return {seccion: record.to_dict() for seccion, record in secciones.items()}
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @staticmethod
+    def _validar_delta(seccion: str, delta: Any, campos: frozenset) -> Tuple[Optional[str], Dict[str, Any]]:
+        if not isinstance(delta, dict):
+            raise ValueError(f'{seccion}: se espera {{"version": ..., "cambios": {{...}}}}')
+        version = delta.get('version')
+        if version is not None:
+            version = str(version).strip()
+            if not version.isdigit():
+                raise ValueError(f'{seccion}: version no es válida')
+        cambios = delta.get('cambios')
+        if not isinstance(cambios, dict) or not cambios:
+            raise ValueError(f'{seccion}: no hay cambios para guardar')
+        no_editables = sorted(set(cambios) - campos)
+        if no_editables:
+            raise ValueError(f'{seccion}: campos no editables: {", ".join(no_editables)}')
+        return version, cambios
+
+    def guardar_delta(self, ficha_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Autoguardado: {seccion: {"version": str | None, "cambios": {campo: valor}}}.
+
+        Solo se escriben las columnas recibidas; version None crea la fila de la sección.
+        Si alguna sección cambió en otra sesión no se guarda nada y se devuelven sus
+        datos vigentes en 'conflictos' (None si la fila ya no existe).
+        """
+        deltas = {
+            seccion: self._validar_delta(seccion, delta, SECCIONES_EXAMEN[seccion][1])
+            for seccion, delta in payload.items()
+            if seccion in SECCIONES_EXAMEN
+        }
+        if not deltas:
+            raise ValueError('No hay cambios para guardar')
+
+        session = SessionLocal()
+        try:
+            repo = AutoguardadoRepository(session)
+            versiones: Dict[str, str] = {}
+            conflictos = []
+            # SAVEPOINT: ante un conflicto se deshacen solo las secciones de este guardado
+            savepoint = session.begin_nested()
+
+            for seccion, (version, cambios) in deltas.items():
+                model = SECCIONES_EXAMEN[seccion][0]
+                if version is None:
+                    nueva = repo.crear_por_ficha(model, ficha_id, cambios)
+                else:
+                    nueva = repo.actualizar(model, model.ficha_id, ficha_id, cambios, version)
+                if nueva is None:
+                    conflictos.append(seccion)
+                else:
+                    versiones[seccion] = nueva
+
+            if conflictos:
+                savepoint.rollback()
+                vigentes = {}
+                for seccion in conflictos:
+                    model = SECCIONES_EXAMEN[seccion][0]
+                    record = repo.actual(model, model.ficha_id, ficha_id)
+                    vigentes[seccion] = record.to_dict() if record else None
+                return {'versiones': {}, 'conflictos': vigentes}
+
+            savepoint.commit()
+            session.commit()
+            return {'versiones': versiones, 'conflictos': {}}
         except Exception:
             session.rollback()
             raise
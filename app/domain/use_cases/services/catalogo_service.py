@@ -0,0 +1,50 @@
+# catalogo_service.py
+import json
+import os
+
+from app.domain.models.products import Product
+from app.infraestructure.utils.cache import TTLCache
+from app.infraestructure.utils.catalog_version import current_catalog_version
+from app.infraestructure.utils.db import SessionLocal
+
+# Caché del proceso indexada por versión; el TTL solo cubre el caso de un bump perdido
+_catalogo_cache = TTLCache(ttl_seconds=int(os.getenv("CATALOGO_CACHE_TTL", "600")), max_entries=4)
+
+
+class CatalogoService:
+    """Catálogo de productos activos para la pantalla de venta (punto de venta)."""
+
+    def get_version(self):
+        with SessionLocal() as db:
+            return current_catalog_version(db)
+
+    def get_catalogo(self):
+        """
+        Devuelve (version, json_bytes). Si la versión no cambió, sale de la caché
+        sin volver a leer productos: solo cuesta leer la secuencia de versión.
+        """
+        with SessionLocal() as db:
+            version = current_catalog_version(db)
+            cuerpo = _catalogo_cache.get(version)
+            if cuerpo is None:
+                productos = (
+                    db.query(Product.producto_id, Product.nombre, Product.costo_venta_1, Product.cantidad)
+                    .filter(Product.estado.is_(True))
+                    .order_by(Product.nombre)
+                    .all()
+                )
+                cuerpo = json.dumps({
+                    "success": True,
+                    "version": version,
+                    "productos": [
+                        {
+                            "producto_id": p.producto_id,
+                            "nombre": p.nombre,
+                            "precio_unitario": float(p.costo_venta_1 or 0),
+                            "stock": p.cantidad or 0,
+                        }
+                        for p in productos
+                    ],
+                }, ensure_ascii=False).encode("utf-8")
+                _catalogo_cache.set(version, cuerpo)
+            return version, cuerpo
@@ -1,5 +1,6 @@
 from app.domain.models.cliente import Cliente
 from app.infraestructure.repositories.sql_cliente_repository import SQLClienteRepository
+from app.infraestructure.repositories.sql_persona_search_repository import SQLPersonaSearchRepository
 from app.infraestructure.utils.db_session import get_db_session, close_db_session
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -34,13 +35,12 @@ class ClienteService:
             close_db_session(db_session)
 
     def get_cliente_by_name(self, nombres, ap_pat):
-        """Busca un cliente por nombre y apellido paterno"""
+        """Busca un cliente por nombre y apellido paterno (el más relevante, sin acentos)"""
         db_session, cliente_repository = self._get_repository()
         try:
-            cliente = db_session.query(Cliente).filter(
-                Cliente.nombres.ilike(f"%{nombres}%"),
-                Cliente.ap_pat.ilike(f"%{ap_pat}%")
-            ).first()
+            busqueda = SQLPersonaSearchRepository(db_session)
+            resultados = busqueda.buscar_clientes(f"{nombres or ''} {ap_pat or ''}", limit=1)
+            cliente = resultados[0] if resultados else None
             if cliente:
                 # Devolver solo el ID para evitar problemas de sesión
                 return cliente.cliente_id
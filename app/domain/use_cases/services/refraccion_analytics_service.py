@@ -0,0 +1,282 @@
+"""
+Analítica poblacional de refracción sobre las columnas numéricas de fichas_clinicas.
+
+Todas las fichas del rango se cargan en una sola consulta como matriz NumPy (una
+columna por dato) y los indicadores se calculan vectorizados. Cada ojo es una
+observación; para prevalencias se usa la última medición de cada paciente-ojo,
+así los pacientes con muchos controles no pesan más.
+
+La serie de un paciente (evolución OD/OI para controles) usa las mismas columnas
+y se cachea por paciente junto con la huella de sus fichas (max ficha_id, cantidad).
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.infraestructure.utils.cache import TTLCache
+from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.repositories.refraccion_repository import (
+    COLUMNAS_ANALITICA,
+    RefraccionRepository,
+)
+
+# Umbrales sobre el equivalente esférico (EE = esfera + cilindro / 2), en dioptrías
+MIOPIA_EE = -0.50
+MIOPIA_ALTA_EE = -6.00
+HIPERMETROPIA_EE = 0.50
+ASTIGMATISMO_CIL = 0.75
+# Peor que 6/18: discapacidad visual moderada o mayor (OMS)
+DISCAPACIDAD_VISUAL_LOGMAR = 0.48
+# Evolución: seguimiento mínimo y tasa que se considera progresión miópica
+SEGUIMIENTO_MIN_ANIOS = 0.5
+PROGRESION_MIOPIA_D_ANIO = -0.50
+
+BORDES_EE = np.arange(-10.0, 10.5, 0.5)
+BORDES_TASA = np.arange(-2.0, 2.25, 0.25)
+EJE_BIN_GRADOS = 10
+TENDENCIA_SPAN_MIN_DIAS = 30
+_SEGUNDOS_POR_ANIO = 365.25 * 24 * 3600
+_COL = {nombre: i for i, nombre in enumerate(COLUMNAS_ANALITICA)}
+
+# paciente_medico_id -> ((max ficha_id, cantidad), serie). Crear o eliminar fichas
+# cambia la huella y la entrada deja de servir. Las ediciones solo se invalidan en
+# el worker que las atendió; en los demás las corrige el TTL corto.
+_series_cache = TTLCache(
+    ttl_seconds=int(os.getenv("TENDENCIA_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("TENDENCIA_CACHE_MAX", "2000")),
+)
+
+
+def _ojos(datos: np.ndarray) -> Dict[str, np.ndarray]:
+    """Apila OD y OI en vectores de 2n observaciones; 'grupo' identifica paciente-ojo."""
+    def col(nombre):
+        return datos[:, _COL[nombre]]
+
+    def ambos(dato):
+        return np.concatenate([col(dato.format(ojo='od')), col(dato.format(ojo='oi'))])
+
+    n = datos.shape[0]
+    paciente = np.concatenate([col('paciente_medico_id')] * 2)
+    lado = np.repeat([0, 1], n)
+    av_cc, av_sc = ambos('av_{ojo}_cc_logmar'), ambos('av_{ojo}_sc_logmar')
+    return {
+        'grupo': paciente * 2 + lado,
+        'paciente': paciente,
+        'fecha': np.concatenate([col('fecha_epoch')] * 2),
+        'esfera': ambos('esfera_{ojo}_d'),
+        'cilindro': ambos('cilindro_{ojo}_d'),
+        'eje': ambos('eje_{ojo}_grados'),
+        'av': np.where(np.isnan(av_cc), av_sc, av_cc),
+    }
+
+
+def _cilindro_negativo(esfera, cilindro, eje):
+    """Transpone las recetas en cilindro positivo a la convención de cilindro negativo."""
+    positivo = cilindro > 0
+    return (
+        np.where(positivo, esfera + cilindro, esfera),
+        np.where(positivo, -cilindro, cilindro),
+        np.where(positivo, (eje + 90) % 180, eje % 180),
+    )
+
+
+def _ordenados_por_grupo(grupo, fecha, validos):
+    """Índices válidos ordenados por (grupo, fecha) y máscaras de primero/último de cada grupo."""
+    idx = np.flatnonzero(validos)
+    orden = idx[np.lexsort((fecha[idx], grupo[idx]))]
+    if orden.size == 0:
+        vacio = np.zeros(0, dtype=bool)
+        return orden, vacio, vacio
+    g = grupo[orden]
+    corte = g[1:] != g[:-1]
+    return orden, np.r_[True, corte], np.r_[corte, True]
+
+
+def _conteo(mascara: np.ndarray, total: int) -> Dict[str, Any]:
+    ojos = int(np.count_nonzero(mascara))
+    return {'ojos': ojos, 'porcentaje': round(100.0 * ojos / total, 1) if total else 0.0}
+
+
+def _estadisticos(valores: np.ndarray) -> Optional[Dict[str, float]]:
+    if valores.size == 0:
+        return None
+    p10, p50, p90 = np.percentile(valores, [10, 50, 90])
+    return {
+        'media': round(float(valores.mean()), 2),
+        'mediana': round(float(p50), 2),
+        'p10': round(float(p10), 2),
+        'p90': round(float(p90), 2),
+    }
+
+
+def _histograma(valores: np.ndarray, bordes: np.ndarray) -> Dict[str, list]:
+    # Los extremos se acumulan en el primer/último intervalo
+    conteos, _ = np.histogram(np.clip(valores, bordes[0], bordes[-1]), bins=bordes)
+    return {'bordes': [round(float(b), 2) for b in bordes], 'conteos': conteos.tolist()}
+
+
+def calcular_resumen(datos: np.ndarray) -> Dict[str, Any]:
+    """Indicadores a partir de la matriz de COLUMNAS_ANALITICA (NaN = sin dato)."""
+    ojos = _ojos(datos)
+    esfera, cilindro, eje = _cilindro_negativo(ojos['esfera'], ojos['cilindro'], ojos['eje'])
+    cilindro = np.nan_to_num(cilindro)          # cilindro en blanco = sin astigmatismo
+    ee = esfera + cilindro / 2
+
+    # Prevalencias: última refracción de cada paciente-ojo
+    orden, es_primero, es_ultimo = _ordenados_por_grupo(ojos['grupo'], ojos['fecha'], ~np.isnan(ee))
+    primeros, ultimos = orden[es_primero], orden[es_ultimo]
+    ee_ult, cil_ult, eje_ult = ee[ultimos], cilindro[ultimos], eje[ultimos]
+    total = ultimos.size
+
+    con_eje = (np.abs(cil_ult) >= ASTIGMATISMO_CIL) & ~np.isnan(eje_ult)
+    ejes = eje_ult[con_eje]
+    bordes_eje = np.arange(0, 180 + EJE_BIN_GRADOS, EJE_BIN_GRADOS)
+    conteos_eje, _ = np.histogram(ejes, bins=bordes_eje)
+
+    # Agudeza visual (mejor corregida disponible): última de cada paciente-ojo
+    orden_av, _, es_ultimo_av = _ordenados_por_grupo(ojos['grupo'], ojos['fecha'], ~np.isnan(ojos['av']))
+    av_ult = ojos['av'][orden_av[es_ultimo_av]]
+
+    # Evolución: primera vs. última refracción de cada paciente-ojo con seguimiento suficiente
+    anios = (ojos['fecha'][ultimos] - ojos['fecha'][primeros]) / _SEGUNDOS_POR_ANIO
+    seguidos = anios >= SEGUIMIENTO_MIN_ANIOS
+    tasa = (ee_ult[seguidos] - ee[primeros][seguidos]) / anios[seguidos]
+
+    return {
+        'fichas': int(datos.shape[0]),
+        'pacientes': int(np.unique(ojos['paciente'][ultimos]).size),
+        'prevalencia': {
+            'ojos': total,
+            'miopia': _conteo(ee_ult <= MIOPIA_EE, total),
+            'miopia_alta': _conteo(ee_ult <= MIOPIA_ALTA_EE, total),
+            'emetropia': _conteo((ee_ult > MIOPIA_EE) & (ee_ult < HIPERMETROPIA_EE), total),
+            'hipermetropia': _conteo(ee_ult >= HIPERMETROPIA_EE, total),
+            'astigmatismo': _conteo(np.abs(cil_ult) >= ASTIGMATISMO_CIL, total),
+        },
+        'equivalente_esferico': {
+            **(_estadisticos(ee_ult) or {}),
+            'histograma': _histograma(ee_ult, BORDES_EE),
+        },
+        'ejes_astigmatismo': {
+            'ojos': int(ejes.size),
+            'bordes': bordes_eje.tolist(),
+            'conteos': conteos_eje.tolist(),
+            # Convención de cilindro negativo
+            'a_favor_regla': _conteo((ejes <= 30) | (ejes >= 150), ejes.size),
+            'contra_regla': _conteo((ejes >= 60) & (ejes <= 120), ejes.size),
+            'oblicuo': _conteo(((ejes > 30) & (ejes < 60)) | ((ejes > 120) & (ejes < 150)), ejes.size),
+        },
+        'agudeza_visual': {
+            'ojos': int(av_ult.size),
+            'logmar': _estadisticos(av_ult),
+            'discapacidad_moderada_o_mas': _conteo(av_ult > DISCAPACIDAD_VISUAL_LOGMAR, av_ult.size),
+        },
+        'cambio_por_paciente': {
+            'ojos': int(tasa.size),
+            'tasa_d_anio': _estadisticos(tasa),
+            'progresion_miopica': _conteo(tasa <= PROGRESION_MIOPIA_D_ANIO, tasa.size),
+            'histograma': _histograma(tasa, BORDES_TASA),
+        },
+    }
+
+
+def _lista(valores: np.ndarray) -> list:
+    return [None if np.isnan(v) else round(float(v), 2) for v in valores]
+
+
+def _pendiente_anual(anios: np.ndarray, valores: np.ndarray) -> Optional[float]:
+    """Pendiente de mínimos cuadrados por año; None con menos de dos puntos o poco seguimiento."""
+    validos = ~np.isnan(valores)
+    x, y = anios[validos], valores[validos]
+    if x.size < 2 or (x.max() - x.min()) * 365.25 < TENDENCIA_SPAN_MIN_DIAS:
+        return None
+    dx = x - x.mean()
+    return round(float((dx * (y - y.mean())).sum() / (dx * dx).sum()), 2)
+
+
+def _cambio_total(valores: np.ndarray) -> Optional[float]:
+    validos = valores[~np.isnan(valores)]
+    return round(float(validos[-1] - validos[0]), 2) if validos.size >= 2 else None
+
+
+def calcular_serie(paciente_medico_id: int, filas: list) -> Dict[str, Any]:
+    """Serie cronológica OD/OI (EE, cilindro, eje, logMAR) con tendencia anual por ojo."""
+    datos = np.array([fila[2:] for fila in filas], dtype=float).reshape(-1, len(COLUMNAS_ANALITICA) - 1)
+    col = {nombre: i for i, nombre in enumerate(COLUMNAS_ANALITICA[1:])}
+    anios = datos[:, col['fecha_epoch']] / _SEGUNDOS_POR_ANIO
+
+    serie = {
+        'paciente_medico_id': paciente_medico_id,
+        'puntos': len(filas),
+        'ficha_ids': [fila[0] for fila in filas],
+        'fechas': [fila[1].isoformat() if fila[1] else None for fila in filas],
+    }
+    for ojo in ('od', 'oi'):
+        esfera, cilindro, eje = _cilindro_negativo(
+            datos[:, col[f'esfera_{ojo}_d']], datos[:, col[f'cilindro_{ojo}_d']], datos[:, col[f'eje_{ojo}_grados']]
+        )
+        # Cilindro en blanco con esfera medida = sin astigmatismo
+        cilindro = np.where(np.isnan(esfera), cilindro, np.nan_to_num(cilindro))
+        ee = esfera + cilindro / 2
+        av_cc, av_sc = datos[:, col[f'av_{ojo}_cc_logmar']], datos[:, col[f'av_{ojo}_sc_logmar']]
+        av = np.where(np.isnan(av_cc), av_sc, av_cc)
+        serie[ojo] = {
+            'equivalente_esferico': _lista(ee),
+            'cilindro': _lista(cilindro),
+            'eje': _lista(np.where(eje == 0, 180, eje)),  # notación clínica 1-180
+            'av_logmar': _lista(av),
+            'tendencia_anual': {
+                'equivalente_esferico': _pendiente_anual(anios, ee),
+                'cilindro': _pendiente_anual(anios, cilindro),
+                'av_logmar': _pendiente_anual(anios, av),
+            },
+            'cambio_total': {
+                'equivalente_esferico': _cambio_total(ee),
+                'cilindro': _cambio_total(cilindro),
+                'av_logmar': _cambio_total(av),
+            },
+        }
+    return serie
+
+
+def invalidar_serie_paciente(paciente_medico_id: int) -> None:
+    """Descarta la serie cacheada tras editar una ficha existente del paciente."""
+    _series_cache.invalidate(paciente_medico_id)
+
+
+class RefraccionAnalyticsService:
+    """Caso de uso: indicadores poblacionales de refracción para un rango de fechas."""
+
+    def resumen(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> Dict[str, Any]:
+        session = SessionLocal()
+        try:
+            filas = RefraccionRepository(session).columnas_analitica(desde, hasta)
+        finally:
+            session.close()
+        datos = np.array(filas, dtype=float).reshape(-1, len(COLUMNAS_ANALITICA))
+        return calcular_resumen(datos)
+
+    def serie_paciente(self, paciente_medico_id: int) -> Dict[str, Any]:
+        """
+        Evolución de refracción y agudeza del paciente en todas sus fichas.
+        Con la serie en caché y sin fichas nuevas ni eliminadas, solo se consulta la huella.
+        """
+        session = SessionLocal()
+        try:
+            repo = RefraccionRepository(session)
+            huella = repo.huella_fichas(paciente_medico_id)
+            cacheado = _series_cache.get(paciente_medico_id)
+            if cacheado and cacheado[0] == huella:
+                return cacheado[1]
+            filas = repo.serie_paciente(paciente_medico_id) if huella[1] else []
+        finally:
+            session.close()
+
+        serie = calcular_serie(paciente_medico_id, filas)
+        if huella[1]:
+            _series_cache.set(paciente_medico_id, (huella, serie))
+        return serie
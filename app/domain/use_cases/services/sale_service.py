@@ -1,4 +1,6 @@
 # sale_service.py
+import os
+from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy.orm import joinedload
 from sqlalchemy.exc import IntegrityError
@@ -7,7 +9,17 @@ from app.domain.models.sale import Sale, SaleDetail
 from app.domain.models.cliente import Cliente
 from app.infraestructure.repositories.sql_sale_repository import SQLSaleRepository
 from app.infraestructure.repositories.sql_product_repository import SQLProductRepository
+from app.infraestructure.repositories.sql_dashboard_repository import SQLDashboardRepository
+from app.infraestructure.repositories.sql_venta_diaria_repository import SQLVentaDiariaRepository
+from app.infraestructure.utils.cache import TTLCache
+from app.infraestructure.utils.date_utils import chile_day_start_utc, get_chile_date
 from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.utils.exceptions import InsufficientStockError
+
+
+UMBRAL_STOCK_BAJO = 10
+# El dashboard tolera unos segundos de atraso; así cuesta lo mismo con 100 o 100.000 productos
+_dashboard_cache = TTLCache(ttl_seconds=int(os.getenv("DASHBOARD_CACHE_TTL", "30")))
 
 
 def q2(value) -> Decimal:
@@ -36,21 +48,42 @@ class SaleService:
         metodo_pago=None,
         observaciones=None,
         descuento=0,
+        idempotency_key=None,
     ):
         """
         Crea (opcional) el Cliente, registra una Venta y sus Detalles,
-        descuenta stock con bloqueo de fila y hace UN SOLO commit al final.
+        descuenta stock de todo el carrito en un solo UPDATE y hace UN SOLO commit al final.
 
         Seguridad:
         - No confiamos en subtotales del frontend: tomamos precio desde BD.
-        - Bloqueo FOR UPDATE por producto.
-        - CHECK (stock >= 0) actúa de red mínima si hay carreras.
+        - Filas de producto bloqueadas en orden de producto_id (sin deadlocks entre cajas)
+          y descontadas con UPDATE ... WHERE cantidad >= x RETURNING; si alguna línea no
+          alcanza, se informa por línea (InsufficientStockError) y se hace rollback.
+        - CHECK (cantidad >= 0) actúa de red mínima si hay carreras.
+        - El rollup ventas_diarias se actualiza con upsert dentro de la misma transacción.
+
+        Idempotencia:
+        - Si se entrega 'idempotency_key' y ya existe una venta con esa clave, se devuelve
+          su venta_id sin bloquear filas ni tocar stock (reenvíos/reintentos seguros).
+        - Dos envíos simultáneos con la misma clave chocan en el índice único; el perdedor
+          vuelve al SAVEPOINT (sin descartar el resto del request) y devuelve la venta del ganador.
         """
         cliente_data = cliente_data or {}
+        idempotency_key = (idempotency_key or "").strip() or None
 
         def operation(db, sale_repo, product_repo):
+            # 0) Reenvío de una venta ya registrada: devolverla tal cual
+            if idempotency_key:
+                existente = sale_repo.get_id_by_idempotency_key(idempotency_key)
+                if existente:
+                    return existente
+
             cliente_id = None
 
+            # SAVEPOINT para cliente + venta: si otro envío con la misma clave gana la
+            # carrera solo se deshace esto, no el resto del unit of work del request
+            savepoint = db.begin_nested()
+
             # 1) Crear/usar cliente si se proporcionó RUC/Cédula (campo 'rut' en backend)
             rut = (cliente_data.get("rut") or "").strip()
             if rut:
@@ -81,64 +114,104 @@ class SaleService:
                 metodo_pago=metodo_pago,
                 observaciones=observaciones,
                 estado="completada",
+                idempotency_key=idempotency_key,
             )
             db.add(venta)
-            db.flush()  # obtener venta.venta_id
-
-            # 3) Crear detalles + descontar stock con bloqueo; calcular TOTAL REAL desde BD
-            total_real = Decimal("0.00")
+            try:
+                db.flush()  # obtener venta.venta_id
+            except IntegrityError:
+                savepoint.rollback()
+                # Otro envío con la misma clave ganó la carrera: devolver su venta
+                existente = sale_repo.get_id_by_idempotency_key(idempotency_key) if idempotency_key else None
+                if existente:
+                    return existente
+                raise
+            savepoint.commit()
 
+            # 3) Descontar stock de TODO el carrito en una sola sentencia guardada
+            #    (cantidad >= x); las filas devueltas traen el precio vigente desde BD.
+            lineas = []
+            cantidades = {}
             for it in cart_items:
                 producto_id = int(it["producto_id"])
                 cantidad = int(it.get("cantidad", 0) or 0)
                 if cantidad <= 0:
                     continue
+                lineas.append((producto_id, cantidad))
+                cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
 
-                # Bloquea la fila del producto (FOR UPDATE) para evitar overselling
-                prod = product_repo.get_by_id(producto_id, for_update=True)
-                if not prod:
-                    raise ValueError(f"Producto ID {producto_id} no existe.")
+            actualizados = product_repo.decrement_stock_bulk(cantidades)
 
-                stock_actual = int(prod.stock or 0)
-                if stock_actual < cantidad:
-                    raise ValueError(f"Stock insuficiente para el producto {getattr(prod, 'nombre', 'N/D')}.")
+            faltantes = [pid for pid in cantidades if pid not in actualizados]
+            if faltantes:
+                niveles = product_repo.get_stock_levels(faltantes)
+                detalle_faltantes = []
+                for pid in faltantes:
+                    nombre, disponible = niveles.get(pid, (None, None))
+                    detalle_faltantes.append({
+                        "producto_id": pid,
+                        "nombre": nombre,
+                        "solicitado": cantidades[pid],
+                        # None => el producto no existe
+                        "disponible": (disponible or 0) if pid in niveles else None,
+                    })
+                raise InsufficientStockError(detalle_faltantes)
 
+            # 4) Crear detalles con el precio tomado de BD (un solo INSERT); calcular TOTAL REAL
+            total_real = Decimal("0.00")
+            detalles = []
+
+            for producto_id, cantidad in lineas:
                 # Precio desde BD (no confiamos en el cliente)
-                precio = q2(prod.precio_unitario or 0)
+                precio = q2(actualizados[producto_id].costo_venta_1 or 0)
                 subtotal = q2(precio * cantidad)
 
-                detalle = SaleDetail(
-                    venta_id=venta.venta_id,
-                    producto_id=prod.producto_id,
-                    cantidad=cantidad,
-                    precio_unitario=precio,
-                    subtotal=subtotal,
-                )
-                db.add(detalle)
-
-                # Descontar stock (sin commit, solo flush dentro de la misma transacción)
-                prod.stock = stock_actual - cantidad
-                # Como el objeto ya está en la sesión, basta con flushear;
-                # usamos el repo por consistencia (no comitea).
-                product_repo.save(prod, commit=False)
+                detalles.append({
+                    "venta_id": venta.venta_id,
+                    "producto_id": producto_id,
+                    "cantidad": cantidad,
+                    "precio_unitario": precio,
+                    "subtotal": subtotal,
+                })
 
                 total_real += subtotal
 
+            sale_repo.add_details_bulk(detalles)
+
+            # Rollup diario (día de Chile × producto × vendedor × método) en la misma transacción
+            por_producto = {}
+            for d in detalles:
+                unidades, monto = por_producto.get(d["producto_id"], (0, Decimal("0.00")))
+                por_producto[d["producto_id"]] = (unidades + d["cantidad"], monto + d["subtotal"])
+            SQLVentaDiariaRepository(db).acumular(get_chile_date(), usuario_id, metodo_pago, por_producto)
+
             # Aplicar descuento al total (si corresponde)
             venta.total = q2(total_real)
 
             try:
-                # 4) Un solo commit para toda la operación
+                # 5) Un solo commit para toda la operación
                 db.commit()
             except IntegrityError as ie:
+                # El COMMIT falló: la transacción completa ya no sirve
                 db.rollback()
                 # Si el CHECK (stock >= 0) u otra condición salta por carrera
                 raise ValueError("No se pudo completar la venta por cambios concurrentes en stock. Intenta nuevamente.") from ie
 
+            _dashboard_cache.invalidate("dashboard")
             return venta.venta_id
 
         return self._execute_with_session(operation)
 
+    def find_sale_id_by_idempotency_key(self, idempotency_key):
+        """Devuelve el venta_id ya registrado con esa clave, o None."""
+        if not idempotency_key:
+            return None
+
+        def operation(db, sale_repo, product_repo):
+            return sale_repo.get_id_by_idempotency_key(idempotency_key)
+
+        return self._execute_with_session(operation)
+
     def get_sale_details_for_receipt(self, venta_id):
         """
         Devuelve la venta con relaciones cargadas (eager) para evitar DetachedInstanceError
@@ -174,3 +247,61 @@ class SaleService:
             return ventas
 
         return self._execute_with_session(operation)
+
+    def get_dashboard_stats(self):
+        """
+        Indicadores del dashboard calculados con agregados SQL (4 consultas en total;
+        montos y unidades salen del rollup ventas_diarias) y cacheados DASHBOARD_CACHE_TTL segundos por worker.
+        """
+        return _dashboard_cache.get_or_set("dashboard", self._compute_dashboard_stats)
+
+    def _compute_dashboard_stats(self):
+        hoy = get_chile_date()
+        # Día y mes calendario de Chile, expresados en UTC como ventas.fecha_venta
+        ventas_desde = chile_day_start_utc(hoy)
+        ventas_hasta = chile_day_start_utc(hoy + timedelta(days=1))
+        # fichas.fecha_consulta se guarda en hora local sin zona
+        fichas_desde = datetime.combine(hoy, datetime.min.time())
+        fichas_hasta = fichas_desde + timedelta(days=1)
+
+        def operation(db, sale_repo, product_repo):
+            repo = SQLDashboardRepository(db)
+            resumen = repo.resumen(hoy, ventas_desde, ventas_hasta, fichas_desde, fichas_hasta, UMBRAL_STOCK_BAJO)
+            bajo_stock = repo.productos_stock_bajo(UMBRAL_STOCK_BAJO)
+            recientes = repo.ventas_recientes()
+            top = repo.top_productos(hoy.replace(day=1), hoy)
+
+            # Estructuras planas (dicts) con las claves que usa dashboard.html
+            return {
+                'total_stock': int(resumen['total_stock'] or 0),
+                'productos_stock_bajo_count': int(resumen['productos_stock_bajo_count'] or 0),
+                'productos_stock_bajo': [
+                    {'producto_id': p.producto_id, 'nombre': p.nombre, 'stock': p.cantidad or 0}
+                    for p in bajo_stock
+                ],
+                'total_ventas_hoy': float(resumen['total_ventas_hoy'] or 0),
+                'cantidad_ventas_hoy': int(resumen['cantidad_ventas_hoy'] or 0),
+                'productos_vendidos_hoy': int(resumen['productos_vendidos_hoy'] or 0),
+                'examenes_hoy': int(resumen['examenes_hoy'] or 0),
+                'pacientes_atendidos_hoy': int(resumen['pacientes_atendidos_hoy'] or 0),
+                'ventas_recientes': [
+                    {
+                        'venta_id': v.venta_id,
+                        'total': float(v.total or 0),
+                        'fecha_venta': v.fecha_venta,
+                        'cliente': {'nombres': v.nombres} if v.nombres else None,
+                        'producto': {'nombre': v.producto} if v.producto else None,
+                    }
+                    for v in recientes
+                ],
+                'top_productos_mes': [
+                    {'nombre': t.nombre, 'cantidad_vendida': int(t.cantidad_vendida or 0)}
+                    for t in top
+                ],
+            }
+
+        return self._execute_with_session(operation)
+
+    @staticmethod
+    def invalidate_dashboard_cache():
+        _dashboard_cache.invalidate("dashboard")
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+
+class AutoguardadoRepository:
+    """Guardado parcial (delta) con concurrencia optimista sobre la versión de fila (xmin).
+
+    Cada escritura es un único UPDATE/INSERT que toca solo las columnas cambiadas y
+    devuelve la nueva versión con RETURNING. El commit queda a cargo del llamador.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def actualizar(self, model: Any, clave: Any, valor: Any, cambios: Dict[str, Any], version: str) -> Optional[str]:
+        """UPDATE de *cambios* si la fila sigue en *version*.
+
+        Devuelve la nueva versión, o None si la fila no existe o cambió mientras tanto.
+        """
+        stmt = (
+            update(model)
+            .where(clave == valor, model.version == version)
+            .values(**cambios)
+            .returning(model.version)
+            .execution_options(synchronize_session=False)
+        )
+        return self.session.execute(stmt).scalar_one_or_none()
+
+    def crear_por_ficha(self, model: Any, ficha_id: int, cambios: Dict[str, Any]) -> Optional[str]:
+        """Primera escritura de una sección de examen (aún sin fila para la ficha).
+
+        Devuelve la versión creada, o None si otra sesión la creó antes (conflicto).
+        """
+        stmt = (
+            pg_insert(model)
+            .values(ficha_id=ficha_id, **cambios)
+            .on_conflict_do_nothing(index_elements=['ficha_id'])
+            .returning(model.version)
+        )
+        return self.session.execute(stmt).scalar_one_or_none()
+
+    def actual(self, model: Any, clave: Any, valor: Any) -> Optional[Any]:
+        """Fila vigente, para responder un conflicto con los datos y la versión actuales."""
+        return (
+            self.session.query(model)
+            .filter(clave == valor)
+            .populate_existing()
+            .first()
+        )
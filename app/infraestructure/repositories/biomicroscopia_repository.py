@@ -1,30 +1,91 @@
 from __future__ import annotations
 
 from typing import Any, Dict, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
 
 from app.domain.models.biomicroscopia import Biomicroscopia
+from app.domain.models.consulta_medica import FichaClinica
 from app.domain.models.examenes_medicos import (
     FondoOjo,
     ReflejosPupilares,
     ParametrosClinicos,
+    DiagnosticoMedico,
+    Tratamiento,
 )
 
 
-def _assign_attributes(model: Any, data: Dict[str, Any], allowed: Optional[set] = None) -> None:
-    """Setea atributos en *model* solo si existen y el valor es distinto de None.
-
-    Args:
-        model: instancia SQLAlchemy a modificar.
-        data: diccionario con valores entrantes.
-        allowed: conjunto opcional de campos permitidos; si es None se usan los keys presentes.
+CAMPOS_BIOMICROSCOPIA = frozenset({
+    'parpados_od', 'conjuntiva_od', 'cornea_od', 'camara_anterior_od', 'iris_od',
+    'pupila_od_mm', 'pupila_od_reaccion', 'cristalino_od', 'pupila_desc_od',
+    'pestanas_od', 'conjuntiva_bulbar_od', 'conjuntiva_tarsal_od', 'orbita_od',
+    'pliegue_semilunar_od', 'caruncula_od', 'conductos_lagrimales_od',
+    'parpado_superior_od', 'parpado_inferior_od',
+    'parpados_oi', 'conjuntiva_oi', 'cornea_oi', 'camara_anterior_oi', 'iris_oi',
+    'pupila_oi_mm', 'pupila_oi_reaccion', 'cristalino_oi', 'pupila_desc_oi',
+    'pestanas_oi', 'conjuntiva_bulbar_oi', 'conjuntiva_tarsal_oi', 'orbita_oi',
+    'pliegue_semilunar_oi', 'caruncula_oi', 'conductos_lagrimales_oi',
+    'parpado_superior_oi', 'parpado_inferior_oi', 'observaciones_generales',
+    'otros_detalles',
+})
+
+CAMPOS_REFLEJOS = frozenset({
+    'acomodativo_uno', 'fotomotor_uno', 'consensual_uno',
+    'acomodativo_dos', 'fotomotor_dos', 'consensual_dos', 'observaciones',
+})
+
+CAMPOS_FONDO_OJO = frozenset({
+    'disco_optico_od', 'macula_od', 'vasos_od', 'retina_periferica_od',
+    'av_temp_sup_od', 'av_temp_inf_od', 'av_nasal_sup_od', 'av_nasal_inf_od',
+    'retina_od', 'excavacion_od', 'papila_detalle_od', 'fijacion_od',
+    'color_od', 'borde_od',
+    'disco_optico_oi', 'macula_oi', 'vasos_oi', 'retina_periferica_oi',
+    'av_temp_sup_oi', 'av_temp_inf_oi', 'av_nasal_sup_oi', 'av_nasal_inf_oi',
+    'retina_oi', 'excavacion_oi', 'papila_detalle_oi', 'fijacion_oi',
+    'color_oi', 'borde_oi', 'observaciones', 'otros_detalles',
+})
+
+CAMPOS_PARAMETROS = frozenset({
+    'presion_sistolica', 'presion_diastolica', 'saturacion_o2',
+    'glucosa', 'trigliceridos', 'ttp', 'atp', 'colesterol',
+})
+
+# sección del payload -> (modelo, campos editables); ficha_id es único en cada tabla
+SECCIONES_EXAMEN = {
+    'biomicroscopia': (Biomicroscopia, CAMPOS_BIOMICROSCOPIA),
+    'reflejos': (ReflejosPupilares, CAMPOS_REFLEJOS),
+    'fondo_ojo': (FondoOjo, CAMPOS_FONDO_OJO),
+    'parametros': (ParametrosClinicos, CAMPOS_PARAMETROS),
+}
+
+
+def _upsert_stmt(model: Any, ficha_id: int, data: Dict[str, Any], allowed: frozenset):
+    """INSERT ... ON CONFLICT (ficha_id) DO UPDATE ... RETURNING de una sección.
+
+    Solo se escriben los campos permitidos que vienen en *data*; el resto conserva
+    su valor en la fila existente (o el default al insertar).
     """
-
-    fields = allowed or set(data.keys())
-    for key in fields:
-        if key in data and hasattr(model, key):
-            setattr(model, key, data[key])
+    valores = {key: data[key] for key in allowed if key in (data or {})}
+    stmt = pg_insert(model).values(ficha_id=ficha_id, **valores)
+    # Sin campos que actualizar se reasigna ficha_id para que RETURNING devuelva la fila
+    set_ = {key: stmt.excluded[key] for key in valores} or {'ficha_id': stmt.excluded.ficha_id}
+    return (
+        stmt.on_conflict_do_update(index_elements=['ficha_id'], set_=set_)
+        .returning(*model.__table__.c)
+    )
+
+
+def _ultimo_por_ficha(model: Any, fecha_col: Any, nombre: str):
+    """Entidad sobre un LATERAL con el registro más reciente de la ficha externa."""
+    lateral = (
+        select(model)
+        .where(model.ficha_id == FichaClinica.ficha_id)
+        .order_by(fecha_col.desc())
+        .limit(1)
+        .lateral(nombre)
+    )
+    return aliased(model, lateral)
 
 
 class BiomicroscopiaExamRepository:
@@ -37,35 +98,37 @@ class BiomicroscopiaExamRepository:
     def __init__(self, session: Session):
         self.session = session
 
+    def _upsert(self, model: Any, ficha_id: int, data: Dict[str, Any], allowed: frozenset):
+        stmt = _upsert_stmt(model, ficha_id, data, allowed)
+        orm_stmt = select(model).from_statement(stmt)
+        return self.session.execute(
+            orm_stmt, execution_options={'populate_existing': True}
+        ).scalar_one()
+
+    def guardar_secciones(self, ficha_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Upsert de las cuatro secciones en una sola sentencia (CTEs con INSERT ... RETURNING).
+
+        Devuelve {seccion: instancia} con los valores ya guardados.
+        """
+        entidades = {}
+        for seccion, (model, allowed) in SECCIONES_EXAMEN.items():
+            cte = _upsert_stmt(model, ficha_id, payload.get(seccion) or {}, allowed).cte(f'upsert_{seccion}')
+            entidades[seccion] = aliased(model, cte, adapt_on_names=True)
+
+        primera, *resto = entidades.values()
+        stmt = select(*entidades.values()).where(
+            *[entidad.ficha_id == primera.ficha_id for entidad in resto]
+        )
+        fila = self.session.execute(
+            stmt, execution_options={'populate_existing': True}
+        ).one()
+        return dict(zip(entidades, fila))
+
     # ------------------------------------------------------------------
     # Biomicroscopía anterior
     # ------------------------------------------------------------------
     def upsert_biomicroscopia(self, ficha_id: int, data: Dict[str, Any]) -> Biomicroscopia:
-        record = (
-            self.session.query(Biomicroscopia)
-            .filter(Biomicroscopia.ficha_id == ficha_id)
-            .first()
-        )
-
-        if not record:
-            record = Biomicroscopia(ficha_id=ficha_id)
-            self.session.add(record)
-
-        allowed = {
-            'parpados_od', 'conjuntiva_od', 'cornea_od', 'camara_anterior_od', 'iris_od',
-            'pupila_od_mm', 'pupila_od_reaccion', 'cristalino_od', 'pupila_desc_od',
-            'pestanas_od', 'conjuntiva_bulbar_od', 'conjuntiva_tarsal_od', 'orbita_od',
-            'pliegue_semilunar_od', 'caruncula_od', 'conductos_lagrimales_od',
-            'parpado_superior_od', 'parpado_inferior_od',
-            'parpados_oi', 'conjuntiva_oi', 'cornea_oi', 'camara_anterior_oi', 'iris_oi',
-            'pupila_oi_mm', 'pupila_oi_reaccion', 'cristalino_oi', 'pupila_desc_oi',
-            'pestanas_oi', 'conjuntiva_bulbar_oi', 'conjuntiva_tarsal_oi', 'orbita_oi',
-            'pliegue_semilunar_oi', 'caruncula_oi', 'conductos_lagrimales_oi',
-            'parpado_superior_oi', 'parpado_inferior_oi', 'observaciones_generales',
-            'otros_detalles'
-        }
-        _assign_attributes(record, data, allowed)
-        return record
+        return self._upsert(Biomicroscopia, ficha_id, data, CAMPOS_BIOMICROSCOPIA)
 
     def get_biomicroscopia(self, ficha_id: int) -> Optional[Dict[str, Any]]:
         record = (
@@ -79,22 +142,7 @@ class BiomicroscopiaExamRepository:
     # Reflejos pupilares
     # ------------------------------------------------------------------
     def upsert_reflejos(self, ficha_id: int, data: Dict[str, Any]) -> ReflejosPupilares:
-        record = (
-            self.session.query(ReflejosPupilares)
-            .filter(ReflejosPupilares.ficha_id == ficha_id)
-            .first()
-        )
-
-        if not record:
-            record = ReflejosPupilares(ficha_id=ficha_id)
-            self.session.add(record)
-
-        allowed = {
-            'acomodativo_uno', 'fotomotor_uno', 'consensual_uno',
-            'acomodativo_dos', 'fotomotor_dos', 'consensual_dos', 'observaciones'
-        }
-        _assign_attributes(record, data, allowed)
-        return record
+        return self._upsert(ReflejosPupilares, ficha_id, data, CAMPOS_REFLEJOS)
 
     def get_reflejos(self, ficha_id: int) -> Optional[Dict[str, Any]]:
         record = (
@@ -108,28 +156,7 @@ class BiomicroscopiaExamRepository:
     # Fondo de ojo extendido
     # ------------------------------------------------------------------
     def upsert_fondo_ojo(self, ficha_id: int, data: Dict[str, Any]) -> FondoOjo:
-        record = (
-            self.session.query(FondoOjo)
-            .filter(FondoOjo.ficha_id == ficha_id)
-            .first()
-        )
-
-        if not record:
-            record = FondoOjo(ficha_id=ficha_id)
-            self.session.add(record)
-
-        allowed = {
-            'disco_optico_od', 'macula_od', 'vasos_od', 'retina_periferica_od',
-            'av_temp_sup_od', 'av_temp_inf_od', 'av_nasal_sup_od', 'av_nasal_inf_od',
-            'retina_od', 'excavacion_od', 'papila_detalle_od', 'fijacion_od',
-            'color_od', 'borde_od',
-            'disco_optico_oi', 'macula_oi', 'vasos_oi', 'retina_periferica_oi',
-            'av_temp_sup_oi', 'av_temp_inf_oi', 'av_nasal_sup_oi', 'av_nasal_inf_oi',
-            'retina_oi', 'excavacion_oi', 'papila_detalle_oi', 'fijacion_oi',
-            'color_oi', 'borde_oi', 'observaciones', 'otros_detalles'
-        }
-        _assign_attributes(record, data, allowed)
-        return record
+        return self._upsert(FondoOjo, ficha_id, data, CAMPOS_FONDO_OJO)
 
     def get_fondo_ojo(self, ficha_id: int) -> Optional[Dict[str, Any]]:
         record = (
@@ -143,22 +170,7 @@ class BiomicroscopiaExamRepository:
     # Parámetros clínicos
     # ------------------------------------------------------------------
     def upsert_parametros(self, ficha_id: int, data: Dict[str, Any]) -> ParametrosClinicos:
-        record = (
-            self.session.query(ParametrosClinicos)
-            .filter(ParametrosClinicos.ficha_id == ficha_id)
-            .first()
-        )
-
-        if not record:
-            record = ParametrosClinicos(ficha_id=ficha_id)
-            self.session.add(record)
-
-        allowed = {
-            'presion_sistolica', 'presion_diastolica', 'saturacion_o2',
-            'glucosa', 'trigliceridos', 'ttp', 'atp', 'colesterol'
-        }
-        _assign_attributes(record, data, allowed)
-        return record
+        return self._upsert(ParametrosClinicos, ficha_id, data, CAMPOS_PARAMETROS)
 
     def get_parametros(self, ficha_id: int) -> Optional[Dict[str, Any]]:
         record = (
@@ -172,9 +184,38 @@ class BiomicroscopiaExamRepository:
     # Lectura agregada
     # ------------------------------------------------------------------
     def obtener_examen_completo(self, ficha_id: int) -> Dict[str, Any]:
+        """Todas las secciones del examen de la ficha en una sola consulta.
+
+        Las secciones con una fila por ficha van con LEFT JOIN; de diagnóstico y
+        tratamiento (puede haber varios) se toma el más reciente con LEFT JOIN LATERAL.
+        Las secciones sin registro (o una ficha inexistente) vuelven como None.
+        """
+        diagnostico = _ultimo_por_ficha(
+            DiagnosticoMedico, DiagnosticoMedico.fecha_diagnostico, 'diagnostico_ultimo'
+        )
+        tratamiento = _ultimo_por_ficha(
+            Tratamiento, Tratamiento.fecha_tratamiento, 'tratamiento_ultimo'
+        )
+        secciones = {
+            'biomicroscopia': Biomicroscopia,
+            'reflejos': ReflejosPupilares,
+            'fondo_ojo': FondoOjo,
+            'parametros': ParametrosClinicos,
+            'diagnostico': diagnostico,
+            'tratamiento': tratamiento,
+        }
+
+        stmt = select(*secciones.values()).select_from(FichaClinica)
+        for model in (Biomicroscopia, ReflejosPupilares, FondoOjo, ParametrosClinicos):
+            stmt = stmt.outerjoin(model, model.ficha_id == FichaClinica.ficha_id)
+        stmt = (
+            stmt.outerjoin(diagnostico, true())
+            .outerjoin(tratamiento, true())
+            .where(FichaClinica.ficha_id == ficha_id)
+        )
+
+        fila = self.session.execute(stmt).first() or (None,) * len(secciones)
         return {
-            'biomicroscopia': self.get_biomicroscopia(ficha_id),
-            'reflejos': self.get_reflejos(ficha_id),
-            'fondo_ojo': self.get_fondo_ojo(ficha_id),
-            'parametros': self.get_parametros(ficha_id),
+            seccion: record.to_dict() if record else None
+            for seccion, record in zip(secciones, fila)
         }
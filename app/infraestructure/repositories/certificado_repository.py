@@ -0,0 +1,46 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+
+# Huella de todo lo que aparece en un certificado: xmin de PostgreSQL cambia en cada
+# INSERT/UPDATE de la fila, y el listado de xmin de cada tabla de examen cambia también
+# al borrar. Si la huella no cambió, el HTML cacheado sigue siendo válido.
+_HUELLAS_SQL = text("""
+    SELECT f.ficha_id,
+           concat_ws('|',
+               f.xmin::text,
+               coalesce(pm.xmin::text, ''),
+               coalesce(c.xmin::text, ''),
+               coalesce(u.xmin::text, ''),
+               coalesce((SELECT string_agg(b.xmin::text, ',' ORDER BY b.biomicroscopia_id)
+                           FROM biomicroscopia b WHERE b.ficha_id = f.ficha_id), ''),
+               coalesce((SELECT string_agg(fo.xmin::text, ',' ORDER BY fo.fondo_ojo_id)
+                           FROM fondo_ojo fo WHERE fo.ficha_id = f.ficha_id), ''),
+               coalesce((SELECT string_agg(d.xmin::text, ',' ORDER BY d.diagnostico_id)
+                           FROM diagnosticos d WHERE d.ficha_id = f.ficha_id), ''),
+               coalesce((SELECT string_agg(t.xmin::text, ',' ORDER BY t.tratamiento_id)
+                           FROM tratamientos t WHERE t.ficha_id = f.ficha_id), '')
+           ) AS huella
+      FROM fichas_clinicas f
+      LEFT JOIN pacientes_medicos pm ON pm.paciente_medico_id = f.paciente_medico_id
+      LEFT JOIN clientes c ON c.cliente_id = pm.cliente_id
+      LEFT JOIN usuarios u ON u.usuario_id = f.usuario_id
+     WHERE f.ficha_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+class CertificadoRepository:
+    """Consultas de apoyo para la caché de certificados."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def huellas(self, ficha_ids: Iterable[int]) -> Dict[int, str]:
+        """Devuelve {ficha_id: huella}; las fichas inexistentes no aparecen."""
+        ids = list({int(fid) for fid in ficha_ids if fid is not None})
+        if not ids:
+            return {}
+        filas = self.session.execute(_HUELLAS_SQL, {"ids": ids}).all()
+        return {fila.ficha_id: fila.huella for fila in filas}
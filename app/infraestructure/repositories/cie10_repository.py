@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.domain.models.cie10 import Cie10
+
+
+class Cie10Repository:
+    """Tabla cie10: lectura completa para el índice en memoria y carga desde archivo."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def todos(self) -> List[tuple]:
+        """(codigo, descripcion) de todo el catálogo."""
+        return [tuple(fila) for fila in self.session.execute(select(Cie10.codigo, Cie10.descripcion))]
+
+    def guardar_lote(self, filas: Sequence[Dict[str, str]]) -> int:
+        """INSERT ... ON CONFLICT (codigo) DO UPDATE de la descripción."""
+        if not filas:
+            return 0
+        stmt = pg_insert(Cie10).values(list(filas))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['codigo'],
+            set_={'descripcion': stmt.excluded.descripcion},
+        )
+        self.session.execute(stmt)
+        return len(filas)
+
+    def vaciar(self) -> int:
+        """Borra el catálogo (la carga con --reemplazar lo hace en la misma transacción)."""
+        return self.session.execute(delete(Cie10)).rowcount
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from app.domain.models.biomicroscopia import Biomicroscopia
+from app.domain.models.examenes_medicos import (
+    FondoOjo,
+    PresionIntraocular,
+    ReflejosPupilares,
+    ParametrosClinicos,
+    DiagnosticoMedico,
+    Tratamiento,
+)
+
+
+# Tabla de examen -> columna de fecha usada para elegir el registro más reciente
+EXAMENES_POR_FICHA = {
+    'biomicroscopia': (Biomicroscopia, Biomicroscopia.fecha_examen),
+    'reflejos_pupilares': (ReflejosPupilares, ReflejosPupilares.fecha_registro),
+    'fondo_ojo': (FondoOjo, FondoOjo.fecha_examen),
+    'presion_intraocular': (PresionIntraocular, PresionIntraocular.fecha_medicion),
+    'parametros_clinicos': (ParametrosClinicos, ParametrosClinicos.fecha_registro),
+    'diagnostico': (DiagnosticoMedico, DiagnosticoMedico.fecha_diagnostico),
+    'tratamiento': (Tratamiento, Tratamiento.fecha_tratamiento),
+}
+
+
+class FichaExamenesRepository:
+    """Carga por lotes de los exámenes asociados a un conjunto de fichas.
+
+    En vez de consultar cada tabla de examen por ficha (N×6 consultas), se usa
+    ``DISTINCT ON (ficha_id)`` para traer el último registro de cada ficha en
+    una sola consulta por tabla, sin importar cuántas fichas tenga la página.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def ultimos_por_ficha(self, model: Any, fecha_col: Any, ficha_ids: Iterable[int]) -> Dict[int, Any]:
+        """Devuelve {ficha_id: registro más reciente} para *model*."""
+        ids = list({int(fid) for fid in ficha_ids if fid is not None})
+        if not ids:
+            return {}
+
+        registros = (
+            self.session.query(model)
+            .filter(model.ficha_id.in_(ids))
+            .order_by(model.ficha_id, fecha_col.desc())
+            .distinct(model.ficha_id)
+            .all()
+        )
+        return {r.ficha_id: r for r in registros}
+
+    def cargar_examenes(self, ficha_ids: List[int], secciones: Iterable[str] = None) -> Dict[str, Dict[int, Any]]:
+        """Carga el último registro por ficha de cada sección pedida.
+
+        Returns:
+            {'biomicroscopia': {ficha_id: Biomicroscopia}, 'fondo_ojo': {...}, ...}
+        """
+        nombres = list(secciones) if secciones is not None else list(EXAMENES_POR_FICHA)
+        resultado: Dict[str, Dict[int, Any]] = {}
+        for nombre in nombres:
+            model, fecha_col = EXAMENES_POR_FICHA[nombre]
+            resultado[nombre] = self.ultimos_por_ficha(model, fecha_col, ficha_ids)
+        return resultado
@@ -14,12 +14,16 @@ class ProveedorRepository:
     def save(self, proveedor: Proveedor) -> bool:
         """Guarda un proveedor en la base de datos"""
         try:
-            self.session.add(proveedor)
+            with self.session.begin_nested():
+                self.session.add(proveedor)
+                self.session.flush()
             self.session.commit()
             self.session.refresh(proveedor)
             return True
         except Exception as e:
-            self.session.rollback()
+            # Un flush fallido ya volvió al SAVEPOINT; solo un COMMIT fallido exige rollback
+            if not self.session.is_active:
+                self.session.rollback()
             print(f"Error al guardar proveedor: {e}")
             return False
     
@@ -85,11 +89,14 @@ class ProveedorRepository:
     def update(self, proveedor: Proveedor) -> bool:
         """Actualiza un proveedor existente"""
         try:
-            self.session.merge(proveedor)
+            with self.session.begin_nested():
+                self.session.merge(proveedor)
+                self.session.flush()
             self.session.commit()
             return True
         except Exception as e:
-            self.session.rollback()
+            if not self.session.is_active:
+                self.session.rollback()
             print(f"Error al actualizar proveedor: {e}")
             return False
     
@@ -98,12 +105,15 @@ class ProveedorRepository:
         try:
             proveedor = self.get_by_id(proveedor_id)
             if proveedor:
-                proveedor.estado = False
+                with self.session.begin_nested():
+                    proveedor.estado = False
+                    self.session.flush()
                 self.session.commit()
                 return True
             return False
         except Exception as e:
-            self.session.rollback()
+            if not self.session.is_active:
+                self.session.rollback()
             print(f"Error al eliminar proveedor: {e}")
             return False
     
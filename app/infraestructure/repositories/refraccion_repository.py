@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from sqlalchemy import extract, func, select, update
+from sqlalchemy.orm import Session
+
+from app.domain.models.consulta_medica import FichaClinica
+from app.infraestructure.utils.refraccion import COLUMNAS_NUMERICAS, valores_numericos
+
+# Orden de las columnas que devuelve columnas_analitica (todas numéricas)
+COLUMNAS_ANALITICA = (
+    'paciente_medico_id', 'fecha_epoch',
+    'esfera_od_d', 'cilindro_od_d', 'eje_od_grados', 'av_od_sc_logmar', 'av_od_cc_logmar',
+    'esfera_oi_d', 'cilindro_oi_d', 'eje_oi_grados', 'av_oi_sc_logmar', 'av_oi_cc_logmar',
+)
+
+
+class RefraccionRepository:
+    """Columnas numéricas de refracción/agudeza: backfill por lotes y carga para analítica."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def lote_textos(self, despues_de: int, limite: int) -> List[Any]:
+        """Siguiente lote (keyset por ficha_id) con los campos de texto a normalizar."""
+        columnas = [getattr(FichaClinica, campo) for campo in COLUMNAS_NUMERICAS]
+        stmt = (
+            select(FichaClinica.ficha_id, *columnas)
+            .where(FichaClinica.ficha_id > despues_de)
+            .order_by(FichaClinica.ficha_id)
+            .limit(limite)
+        )
+        return self.session.execute(stmt).all()
+
+    def guardar_numericos(self, filas: Sequence[Any]) -> int:
+        """UPDATE por lotes (executemany por PK) de las columnas derivadas de *filas*."""
+        if not filas:
+            return 0
+        valores = [
+            {'ficha_id': fila.ficha_id, **valores_numericos(fila._mapping)}
+            for fila in filas
+        ]
+        self.session.execute(update(FichaClinica), valores)
+        return len(valores)
+
+    @staticmethod
+    def _columnas_numericas():
+        return [
+            extract('epoch', FichaClinica.fecha_consulta),
+            *[getattr(FichaClinica, nombre) for nombre in COLUMNAS_ANALITICA[2:]],
+        ]
+
+    def columnas_analitica(self, desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> List[tuple]:
+        """Filas de COLUMNAS_ANALITICA en [desde, hasta); NULL donde no hay dato."""
+        stmt = select(FichaClinica.paciente_medico_id, *self._columnas_numericas())
+        if desde:
+            stmt = stmt.where(FichaClinica.fecha_consulta >= desde)
+        if hasta:
+            stmt = stmt.where(FichaClinica.fecha_consulta < hasta)
+        return [tuple(fila) for fila in self.session.execute(stmt)]
+
+    def huella_fichas(self, paciente_medico_id: int) -> tuple:
+        """
+        (max(ficha_id), cantidad) de las fichas del paciente, con un index-only scan
+        de idx_fichas_paciente_fecha. Cambia con cada ficha nueva aunque venga con
+        fecha_consulta anterior, y con cada ficha eliminada.
+        """
+        stmt = (
+            select(func.max(FichaClinica.ficha_id), func.count())
+            .where(FichaClinica.paciente_medico_id == paciente_medico_id)
+        )
+        return tuple(self.session.execute(stmt).one())
+
+    def serie_paciente(self, paciente_medico_id: int) -> List[tuple]:
+        """Fichas del paciente en orden cronológico: (ficha_id, fecha_consulta, *COLUMNAS_ANALITICA[1:])."""
+        stmt = (
+            select(FichaClinica.ficha_id, FichaClinica.fecha_consulta, *self._columnas_numericas())
+            .where(FichaClinica.paciente_medico_id == paciente_medico_id)
+            .order_by(FichaClinica.fecha_consulta, FichaClinica.ficha_id)
+        )
+        return [tuple(fila) for fila in self.session.execute(stmt)]
@@ -0,0 +1,86 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.domain.models.cliente import Cliente
+from app.domain.models.consulta_medica import FichaClinica
+from app.domain.models.products import Product
+from app.domain.models.sale import Sale, SaleDetail
+from app.domain.models.venta_diaria import VentaDiaria
+
+
+class SQLDashboardRepository:
+    """
+    Agregados del dashboard calculados en PostgreSQL: el costo no depende de
+    cuántos productos o ventas existan (no se cargan filas en Python).
+    """
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def resumen(self, hoy, ventas_desde, ventas_hasta, fichas_desde, fichas_hasta, umbral_stock_bajo: int):
+        """
+        Todos los indicadores numéricos en UN solo SELECT de subconsultas escalares.
+        Montos y unidades de hoy salen del rollup ventas_diarias (fecha de Chile = hoy).
+        """
+        activos = Product.estado.is_(True)
+        ventas_hoy = (Sale.fecha_venta >= ventas_desde) & (Sale.fecha_venta < ventas_hasta)
+        fichas_hoy = (FichaClinica.fecha_consulta >= fichas_desde) & (FichaClinica.fecha_consulta < fichas_hasta)
+
+        stmt = select(
+            select(func.coalesce(func.sum(Product.cantidad), 0)).where(activos)
+            .scalar_subquery().label("total_stock"),
+            select(func.count()).select_from(Product)
+            .where(activos, func.coalesce(Product.cantidad, 0) <= umbral_stock_bajo)
+            .scalar_subquery().label("productos_stock_bajo_count"),
+            select(func.coalesce(func.sum(VentaDiaria.monto), 0)).where(VentaDiaria.fecha == hoy)
+            .scalar_subquery().label("total_ventas_hoy"),
+            select(func.count()).select_from(Sale).where(ventas_hoy)
+            .scalar_subquery().label("cantidad_ventas_hoy"),
+            select(func.coalesce(func.sum(VentaDiaria.unidades), 0)).where(VentaDiaria.fecha == hoy)
+            .scalar_subquery().label("productos_vendidos_hoy"),
+            select(func.count()).select_from(FichaClinica).where(fichas_hoy)
+            .scalar_subquery().label("examenes_hoy"),
+            select(func.count(func.distinct(FichaClinica.paciente_medico_id))).where(fichas_hoy)
+            .scalar_subquery().label("pacientes_atendidos_hoy"),
+        )
+        return self.db.execute(stmt).one()._asdict()
+
+    def productos_stock_bajo(self, umbral: int, limit: int = 20):
+        stmt = (
+            select(Product.producto_id, Product.nombre, Product.cantidad)
+            .where(Product.estado.is_(True), func.coalesce(Product.cantidad, 0) <= umbral)
+            .order_by(Product.cantidad.asc().nullsfirst(), Product.nombre)
+            .limit(limit)
+        )
+        return self.db.execute(stmt).all()
+
+    def ventas_recientes(self, limit: int = 10):
+        """Últimas ventas con cliente y el primer producto del detalle (sin cargar relaciones)."""
+        primer_producto = (
+            select(Product.nombre)
+            .join(SaleDetail, SaleDetail.producto_id == Product.producto_id)
+            .where(SaleDetail.venta_id == Sale.venta_id)
+            .order_by(SaleDetail.detalle_id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(Sale.venta_id, Sale.total, Sale.fecha_venta, Cliente.nombres, primer_producto.label("producto"))
+            .outerjoin(Cliente, Cliente.cliente_id == Sale.cliente_id)
+            .order_by(Sale.fecha_venta.desc(), Sale.venta_id.desc())
+            .limit(limit)
+        )
+        return self.db.execute(stmt).all()
+
+    def top_productos(self, desde, hasta, limit: int = 5):
+        """Más vendidos entre dos fechas de Chile (inclusive), leyendo el rollup diario."""
+        vendidos = func.sum(VentaDiaria.unidades)
+        stmt = (
+            select(Product.nombre, vendidos.label("cantidad_vendida"))
+            .join(Product, Product.producto_id == VentaDiaria.producto_id)
+            .where(VentaDiaria.fecha.between(desde, hasta))
+            .group_by(Product.producto_id, Product.nombre)
+            .order_by(vendidos.desc())
+            .limit(limit)
+        )
+        return self.db.execute(stmt).all()
@@ -89,12 +89,16 @@ class SqlDiagnosticoRepository:
                     severidad=data.get("severidad"),
                     observaciones=data.get("observaciones"),
                 )
-                session.add(diagnostico)
+                with session.begin_nested():
+                    session.add(diagnostico)
+                    session.flush()
                 session.commit()
                 session.refresh(diagnostico)
                 return diagnostico
             except (KeyError, SQLAlchemyError) as exc:
-                session.rollback()
+                # Un flush fallido ya volvió al SAVEPOINT; solo un COMMIT fallido exige rollback
+                if not session.is_active:
+                    session.rollback()
                 print(f"Error al crear diagnostico: {exc}")
                 return None
 
@@ -109,10 +113,13 @@ class SqlDiagnosticoRepository:
                 )
                 if not diagnostico:
                     return False
-                session.delete(diagnostico)
+                with session.begin_nested():
+                    session.delete(diagnostico)
+                    session.flush()
                 session.commit()
                 return True
             except SQLAlchemyError as exc:
-                session.rollback()
+                if not session.is_active:
+                    session.rollback()
                 print(f"Error al eliminar diagnostico: {exc}")
                 return False
@@ -0,0 +1,75 @@
+import re
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.domain.models.cliente import Cliente, ACENTOS, SIN_ACENTOS
+
+BUSQUEDA_LIMIT_DEFAULT = 20
+BUSQUEDA_LIMIT_MAX = 50
+_MAX_TOKENS = 5
+_PLEGAR_ACENTOS = str.maketrans(ACENTOS, SIN_ACENTOS)
+
+
+def limite_busqueda(valor, default: int = BUSQUEDA_LIMIT_DEFAULT) -> int:
+    """Convierte el parámetro limit del request a un entero acotado (tope duro)."""
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        limite = default
+    return max(1, min(limite, BUSQUEDA_LIMIT_MAX))
+
+
+class SQLPersonaSearchRepository:
+    """
+    Búsqueda de clientes/pacientes sobre la columna normalizada clientes.busqueda
+    (nombre completo + rut, minúsculas y sin acentos) con índice GIN pg_trgm.
+
+    Cada palabra del texto debe aparecer (LIKE '%palabra%', resuelto por el índice)
+    y el orden prioriza coincidencias al inicio y luego la similitud trigram.
+    Las consultas deben incluir Cliente (directamente o con join).
+    """
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    @staticmethod
+    def normalizar(texto: str) -> str:
+        """Mismo plegado que la columna generada: sin acentos, minúsculas, espacios simples."""
+        return " ".join((texto or "").translate(_PLEGAR_ACENTOS).lower().split())
+
+    @staticmethod
+    def _escape_like(valor: str) -> str:
+        return re.sub(r"([\\%_])", r"\\\1", valor)
+
+    def aplicar(self, query, texto: str, rut: str = None):
+        """
+        Agrega filtro y orden de relevancia a una query que ya incluye Cliente.
+        Si viene rut (cédula/RUC ya validado) usa la ruta exacta por idx_clientes_rut.
+        """
+        if rut:
+            return query.filter(Cliente.rut == rut)
+
+        normalizado = self.normalizar(texto)
+        tokens = normalizado.split()[:_MAX_TOKENS]
+        if not tokens:
+            return query
+
+        for token in tokens:
+            query = query.filter(Cliente.busqueda.like(f"%{self._escape_like(token)}%", escape="\\"))
+
+        al_inicio = case(
+            (Cliente.busqueda.like(f"{self._escape_like(tokens[0])}%", escape="\\"), 0),
+            else_=1,
+        )
+        return query.order_by(
+            al_inicio,
+            func.word_similarity(normalizado, Cliente.busqueda).desc(),
+            Cliente.ap_pat,
+            Cliente.nombres,
+            Cliente.cliente_id,
+        )
+
+    def buscar_clientes(self, texto: str, rut: str = None, limit: int = BUSQUEDA_LIMIT_DEFAULT):
+        query = self.aplicar(self.db.query(Cliente), texto, rut=rut)
+        return query.limit(limite_busqueda(limit)).all()
@@ -1,5 +1,14 @@
+from sqlalchemy import Integer, column, func, literal_column, or_, select, tuple_, update, values
 from sqlalchemy.orm import Session
 from app.domain.models.products import Product
+from app.infraestructure.utils.catalog_version import mark_catalog_changed
+
+UMBRAL_STOCK_BAJO = 10
+
+
+def stock_bajo(umbral: int = UMBRAL_STOCK_BAJO):
+    """Predicado de stock bajo; sin cantidad registrada (NULL) cuenta como 0."""
+    return func.coalesce(Product.cantidad, 0) < umbral
 
 
 class SQLProductRepository:
@@ -18,6 +27,89 @@ class SQLProductRepository:
             return query.filter(Product.estado.is_(True)).all()
         return query.all()
 
+    def filtered_query(self, marca: str = None, nivel_stock: str = None, q: str = None,
+                       include_deleted: bool = False, material: str = None, tipo_armazon: str = None):
+        """
+        Query de productos con los filtros de la pantalla de inventario:
+        - marca / material / tipo_armazon: igualdad exacta
+        - nivel_stock: 'bajo' (<10), 'medio' (10-50), 'alto' (>50)
+        - q: texto en código, nombre, distribuidor o marca
+        """
+        query = self.db.query(Product)
+        if not include_deleted:
+            query = query.filter(Product.estado.is_(True))
+        if marca:
+            query = query.filter(Product.marca == marca)
+        if material:
+            query = query.filter(Product.material == material)
+        if tipo_armazon:
+            query = query.filter(Product.tipo_armazon == tipo_armazon)
+        if nivel_stock == 'bajo':
+            query = query.filter(stock_bajo())
+        elif nivel_stock == 'medio':
+            query = query.filter(Product.cantidad.between(10, 50))
+        elif nivel_stock == 'alto':
+            query = query.filter(Product.cantidad > 50)
+        if q:
+            patron = f"%{q.strip()}%"
+            query = query.filter(or_(
+                Product.codigo.ilike(patron),
+                Product.nombre.ilike(patron),
+                Product.distribuidor.ilike(patron),
+                Product.marca.ilike(patron),
+            ))
+        return query.order_by(Product.producto_id)
+
+    def get_page(self, page: int = 1, per_page: int = 50, **filtros):
+        """Una página de filtered_query() y el total filtrado (LIMIT/OFFSET + COUNT)."""
+        query = self.filtered_query(**filtros)
+        total = query.order_by(None).count()
+        items = query.limit(per_page).offset((page - 1) * per_page).all()
+        return items, total
+
+    def inventory_stats(self, umbral_stock_bajo: int = UMBRAL_STOCK_BAJO):
+        """
+        Estadísticas de inventario y valores de filtros en UNA consulta agrupada
+        (GROUPING SETS): el conjunto vacío da los totales y cada columna sus valores distintos.
+        """
+        bajo = func.count().filter(stock_bajo(umbral_stock_bajo))
+        stmt = (
+            select(
+                Product.marca,
+                Product.material,
+                Product.tipo_armazon,
+                func.grouping(Product.marca).label("g_marca"),
+                func.grouping(Product.material).label("g_material"),
+                func.grouping(Product.tipo_armazon).label("g_tipo"),
+                func.count().label("productos"),
+                func.coalesce(func.sum(Product.cantidad), 0).label("stock"),
+                bajo.label("stock_bajo"),
+            )
+            .where(Product.estado.is_(True))
+            .group_by(func.grouping_sets(
+                literal_column("()"),  # conjunto vacío = totales
+                tuple_(Product.marca),
+                tuple_(Product.material),
+                tuple_(Product.tipo_armazon),
+            ))
+        )
+
+        stats = {'total_productos': 0, 'total_stock': 0, 'stock_bajo': 0, 'categorias': 0}
+        marcas, materiales, tipos = [], [], []
+        for r in self.db.execute(stmt):
+            if r.g_marca and r.g_material and r.g_tipo:
+                stats['total_productos'] = r.productos
+                stats['total_stock'] = int(r.stock or 0)
+                stats['stock_bajo'] = r.stock_bajo
+            elif not r.g_marca and r.marca:
+                marcas.append(r.marca)
+            elif not r.g_material and r.material:
+                materiales.append(r.material)
+            elif not r.g_tipo and r.tipo_armazon:
+                tipos.append(r.tipo_armazon)
+        stats['categorias'] = len(marcas)
+        return stats, {'marcas': sorted(marcas), 'materiales': sorted(materiales), 'tipos_armazon': sorted(tipos)}
+
     def get_by_id(self, product_id: int, for_update: bool = False):
         """
         Obtiene un producto por ID. Si for_update=True, bloquea la fila (SELECT ... FOR UPDATE).
@@ -35,16 +127,20 @@ class SQLProductRepository:
         permitir transacciones atómicas a nivel de servicio.
         - commit=False -> solo flush/refresh (deja el commit al servicio)
         - commit=True  -> commit inmediato (para usos fuera de la venta)
+        Si el flush falla se vuelve al SAVEPOINT: no se descarta el resto de la transacción.
         """
         try:
-            self.db.add(product)
-            self.db.flush()
+            with self.db.begin_nested():
+                mark_catalog_changed(self.db)
+                self.db.add(product)
+                self.db.flush()
             self.db.refresh(product)
             if commit:
                 self.db.commit()
             return product
         except Exception as e:
-            self.db.rollback()
+            if not self.db.is_active:  # falló el COMMIT: la transacción ya no sirve
+                self.db.rollback()
             print(f"Error al guardar producto: {e}")
             raise
 
@@ -58,29 +154,29 @@ class SQLProductRepository:
             return None
 
         try:
-            self.db.delete(product)
-            if commit:
-                self.db.commit()
-            else:
+            # SAVEPOINT: si el DELETE choca con una FK solo se deshace el DELETE
+            with self.db.begin_nested():
+                mark_catalog_changed(self.db)
+                self.db.delete(product)
                 self.db.flush()
-            return True
         except Exception:
-            # Soft delete en caso de restricciones
-            self.db.rollback()
-            product = self.get_by_id(product_id, for_update=True)
-            if not product:
-                return None
+            # Soft delete en caso de restricciones (el producto vuelve a la sesión)
             product.estado = False
+            mark_catalog_changed(self.db)
             if commit:
                 self.db.commit()
             else:
                 self.db.flush()
             return False
+        if commit:
+            self.db.commit()
+        return True
 
     def restore(self, product_id: int, *, commit: bool = True):
         product = self.get_by_id(product_id, for_update=True)
         if product and product.estado is False:
             product.estado = True
+            mark_catalog_changed(self.db)
             if commit:
                 self.db.commit()
             else:
@@ -98,6 +194,7 @@ class SQLProductRepository:
         if not product:
             return False
         product.cantidad = new_stock  # Usa el nuevo campo cantidad
+        mark_catalog_changed(self.db)
         if commit:
             self.db.commit()
         else:
@@ -123,9 +220,82 @@ class SQLProductRepository:
             raise ValueError(f"Stock insuficiente para el producto {product.nombre}.")
 
         product.cantidad = current - quantity  # Usa el nuevo campo cantidad
+        mark_catalog_changed(self.db)
 
         self.db.flush()
         if commit:
             self.db.commit()
 
         return product
+
+    def decrement_stock_bulk(self, quantities: dict):
+        """
+        Descuenta stock de varias líneas en UNA sola sentencia:
+
+            UPDATE productos SET cantidad = cantidad - v.cantidad
+            FROM (VALUES ...) AS v(producto_id, cantidad)
+            WHERE productos.producto_id = v.producto_id AND productos.cantidad >= v.cantidad
+            RETURNING ...
+
+        'quantities' es {producto_id: cantidad}. Devuelve {producto_id: fila} solo para
+        las líneas descontadas; las que faltan no existen o no tienen stock suficiente.
+        No hace commit: se integra a la transacción de la venta.
+
+        Antes del UPDATE se bloquean las filas en orden de producto_id (lock_for_sale),
+        así dos ventas con carritos solapados nunca se bloquean en orden cruzado.
+        """
+        if not quantities:
+            return {}
+
+        ordered = sorted((int(pid), int(qty)) for pid, qty in quantities.items())
+        self.lock_for_sale([pid for pid, _ in ordered])
+
+        lineas = (
+            values(column("producto_id", Integer), column("cantidad", Integer), name="lineas")
+            .data(ordered)
+        )
+        stmt = (
+            update(Product)
+            .where(
+                Product.producto_id == lineas.c.producto_id,
+                Product.cantidad >= lineas.c.cantidad,
+            )
+            .values(cantidad=Product.cantidad - lineas.c.cantidad)
+            .returning(
+                Product.producto_id,
+                Product.nombre,
+                Product.cantidad,
+                Product.costo_venta_1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows = self.db.execute(stmt).all()
+        if rows:
+            mark_catalog_changed(self.db)
+        return {row.producto_id: row for row in rows}
+
+    def lock_for_sale(self, product_ids):
+        """
+        Bloquea (FOR UPDATE) las filas de 'product_ids' en UNA sentencia y en orden
+        determinista (producto_id ascendente) para evitar deadlocks entre cajas.
+        """
+        if not product_ids:
+            return []
+        stmt = (
+            select(Product.producto_id)
+            .where(Product.producto_id.in_(sorted(set(product_ids))))
+            .order_by(Product.producto_id)
+            .with_for_update()
+        )
+        return self.db.execute(stmt).scalars().all()
+
+    def get_stock_levels(self, product_ids):
+        """Devuelve {producto_id: (nombre, cantidad)} para informar faltantes de stock."""
+        if not product_ids:
+            return {}
+        rows = (
+            self.db.query(Product.producto_id, Product.nombre, Product.cantidad)
+            .filter(Product.producto_id.in_(list(product_ids)))
+            .all()
+        )
+        return {row.producto_id: (row.nombre, row.cantidad) for row in rows}
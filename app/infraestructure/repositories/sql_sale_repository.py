@@ -1,7 +1,11 @@
-from app.domain.models.sale import Sale
+from app.domain.models.sale import Sale, SaleDetail
 from app.domain.models.products import Product
 from app.domain.models.user import User
 from app.domain.models.cliente import Cliente
+from app.infraestructure.repositories.sql_venta_diaria_repository import SQLVentaDiariaRepository
+from app.infraestructure.utils.date_utils import chile_day_start_utc
+from datetime import timedelta
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -26,12 +30,28 @@ class SQLSaleRepository:
             joinedload(Sale.usuario)
         ).order_by(Sale.fecha_venta.desc()).all()
 
+    def get_id_by_idempotency_key(self, idempotency_key: str):
+        # Solo lee la PK por el índice único: no bloquea filas ni carga relaciones.
+        return self.db.query(Sale.venta_id).filter(
+            Sale.idempotency_key == idempotency_key
+        ).scalar()
+
     def get_by_user(self, usuario_id: int):
         return self.db.query(Sale).filter(Sale.usuario_id == usuario_id).all()
 
     def save(self, sale: Sale):
+        """
+        Guarda una venta nueva o modificada y mantiene el rollup ventas_diarias en la
+        misma transacción: resta lo que aportaba antes (estado en BD) y suma lo nuevo.
+        """
         try:
+            rollup = SQLVentaDiariaRepository(self.db)
+            if sale.venta_id is not None:
+                with self.db.no_autoflush:  # el aporte previo se lee de la BD sin los cambios
+                    rollup.restar_venta(sale.venta_id)
             self.db.add(sale)
+            self.db.flush()
+            rollup.sumar_venta(sale.venta_id)
             self.db.commit()
             self.db.refresh(sale)
             return sale
@@ -40,10 +60,54 @@ class SQLSaleRepository:
             raise e
 
     def delete(self, venta_id: int):
+        """Borra la venta (y sus detalles) descontándola del rollup ventas_diarias."""
         sale = self.get_by_id(venta_id)
         if sale:
+            SQLVentaDiariaRepository(self.db).restar_venta(venta_id)
             self.db.delete(sale)
             self.db.commit()
             return True
         return False
 
+    def add_details_bulk(self, detalles):
+        """
+        Inserta todas las líneas de una venta con un solo INSERT multi-fila.
+        'detalles' es una lista de dicts con las columnas de detalle_ventas.
+        No hace commit: forma parte de la transacción de la venta.
+        """
+        if not detalles:
+            return
+        self.db.execute(insert(SaleDetail), detalles)
+
+    def export_query(self, fecha_desde=None, fecha_hasta=None):
+        """
+        select() de ventas + detalles (una fila por línea) para exportar en streaming.
+        'fecha_desde'/'fecha_hasta' son fechas (date) del calendario de Chile, ambas
+        inclusive; se traducen a UTC sin zona, como se guarda ventas.fecha_venta.
+        """
+        stmt = (
+            select(
+                Sale.venta_id,
+                Sale.fecha_venta,
+                Cliente.nombres,
+                Cliente.ap_pat,
+                User.username,
+                Product.nombre,
+                SaleDetail.cantidad,
+                SaleDetail.precio_unitario,
+                SaleDetail.subtotal,
+                Sale.total,
+                Sale.metodo_pago,
+            )
+            .select_from(Sale)
+            .outerjoin(SaleDetail, SaleDetail.venta_id == Sale.venta_id)
+            .outerjoin(Product, Product.producto_id == SaleDetail.producto_id)
+            .outerjoin(Cliente, Cliente.cliente_id == Sale.cliente_id)
+            .outerjoin(User, User.usuario_id == Sale.usuario_id)
+            .order_by(Sale.fecha_venta, Sale.venta_id, SaleDetail.detalle_id)
+        )
+        if fecha_desde is not None:
+            stmt = stmt.where(Sale.fecha_venta >= chile_day_start_utc(fecha_desde))
+        if fecha_hasta is not None:
+            stmt = stmt.where(Sale.fecha_venta < chile_day_start_utc(fecha_hasta + timedelta(days=1)))
+        return stmt
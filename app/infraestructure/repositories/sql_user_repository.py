@@ -29,12 +29,16 @@ class SQLUserRepository:
     def save(self, user):
         session = self._get_session()
         try:
-            session.add(user)
+            with session.begin_nested():
+                session.add(user)
+                session.flush()
             session.commit()
             session.refresh(user)
             return user
         except SQLAlchemyError as e:
-            session.rollback()
+            # Un flush fallido ya volvió al SAVEPOINT; solo un COMMIT fallido exige rollback
+            if not session.is_active:
+                session.rollback()
             print(f"Error saving user: {e}")
             return None
         finally:
@@ -46,14 +50,16 @@ class SQLUserRepository:
         user = self.get_by_id(user_id)
         if user:
             try:
-                session.delete(user)
-                session.commit()
-                return True  # Eliminación física
+                # SAVEPOINT: si el DELETE choca con una FK solo se deshace el DELETE
+                with session.begin_nested():
+                    session.delete(user)
+                    session.flush()
             except IntegrityError:
-                session.rollback()
                 setattr(user, 'estado', False)
                 session.commit()
                 return False  # Eliminación lógica
+            session.commit()
+            return True  # Eliminación física
         return False
 
     def restore(self, user_id):
@@ -0,0 +1,161 @@
+from sqlalchemy import Date, cast, delete, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.domain.models.sale import Sale, SaleDetail
+from app.domain.models.venta_diaria import VentaDiaria
+
+# Día calendario de Chile de una venta (fecha_venta se guarda en UTC sin zona)
+FECHA_CHILE = cast(
+    func.timezone('America/Santiago', func.timezone('UTC', Sale.fecha_venta)),
+    Date,
+)
+
+
+class SQLVentaDiariaRepository:
+    def __init__(self, db_session: Session):
+        self.db = db_session
+
+    def acumular(self, fecha, usuario_id, metodo_pago, lineas):
+        """
+        Suma una venta al rollup con un solo INSERT ... ON CONFLICT DO UPDATE.
+        'lineas' = {producto_id: (unidades, monto)}, ya agregadas por producto
+        (ON CONFLICT no puede tocar dos veces la misma fila en una sentencia).
+        No hace commit: forma parte de la transacción de la venta.
+        """
+        if not lineas:
+            return
+        filas = [
+            {
+                "fecha": fecha,
+                "producto_id": producto_id,
+                "usuario_id": usuario_id or 0,
+                "metodo_pago": metodo_pago or "",
+                "unidades": unidades,
+                "monto": monto,
+                "num_ventas": 1,
+            }
+            for producto_id, (unidades, monto) in sorted(lineas.items())
+        ]
+        stmt = pg_insert(VentaDiaria).values(filas)
+        stmt = stmt.on_conflict_do_update(
+            constraint="ventas_diarias_pkey",
+            set_={
+                "unidades": VentaDiaria.unidades + stmt.excluded.unidades,
+                "monto": VentaDiaria.monto + stmt.excluded.monto,
+                "num_ventas": VentaDiaria.num_ventas + stmt.excluded.num_ventas,
+            },
+        )
+        self.db.execute(stmt)
+
+    def sumar_venta(self, venta_id):
+        """Suma al rollup una venta ya guardada (leída de ventas/detalle_ventas). No hace commit."""
+        self._ajustar_venta(venta_id, 1)
+
+    def restar_venta(self, venta_id):
+        """
+        Quita del rollup lo que aporta una venta según su estado actual en la BD; llamar
+        ANTES de borrarla o modificarla, en la misma transacción. No hace commit.
+        """
+        self._ajustar_venta(venta_id, -1)
+
+    def _ajustar_venta(self, venta_id, signo):
+        """
+        Upsert de los aportes de *venta_id* con *signo* (+1/-1), agrupados como en
+        rebuild(), y borrado de las filas de su día que quedan sin ventas.
+        """
+        claves = (
+            FECHA_CHILE,
+            SaleDetail.producto_id,
+            func.coalesce(Sale.usuario_id, 0),
+            func.coalesce(Sale.metodo_pago, literal("")),
+        )
+        origen = (
+            select(
+                *claves,
+                signo * func.sum(SaleDetail.cantidad),
+                signo * func.sum(SaleDetail.subtotal),
+                literal(signo),
+            )
+            .join(SaleDetail, SaleDetail.venta_id == Sale.venta_id)
+            .where(Sale.venta_id == venta_id)
+            .group_by(*claves)
+        )
+        stmt = pg_insert(VentaDiaria).from_select(
+            ["fecha", "producto_id", "usuario_id", "metodo_pago", "unidades", "monto", "num_ventas"],
+            origen,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="ventas_diarias_pkey",
+            set_={
+                "unidades": VentaDiaria.unidades + stmt.excluded.unidades,
+                "monto": VentaDiaria.monto + stmt.excluded.monto,
+                "num_ventas": VentaDiaria.num_ventas + stmt.excluded.num_ventas,
+            },
+        )
+        self.db.execute(stmt)
+        if signo < 0:
+            dia = select(FECHA_CHILE).where(Sale.venta_id == venta_id).scalar_subquery()
+            self.db.execute(
+                delete(VentaDiaria).where(VentaDiaria.fecha == dia, VentaDiaria.num_ventas <= 0)
+            )
+
+    def rebuild(self, desde=None, hasta=None):
+        """
+        Reconstruye el rollup desde ventas/detalle_ventas con un DELETE + INSERT ... SELECT
+        (todo en SQL). 'desde'/'hasta' son fechas de Chile inclusive; sin ellas, todo el historial.
+        Devuelve la cantidad de filas insertadas. No hace commit.
+        """
+        borrar = delete(VentaDiaria)
+        origen = (
+            select(
+                FECHA_CHILE.label("fecha"),
+                SaleDetail.producto_id,
+                func.coalesce(Sale.usuario_id, 0).label("usuario_id"),
+                func.coalesce(Sale.metodo_pago, literal("")).label("metodo_pago"),
+                func.sum(SaleDetail.cantidad).label("unidades"),
+                func.sum(SaleDetail.subtotal).label("monto"),
+                func.count(func.distinct(Sale.venta_id)).label("num_ventas"),
+            )
+            .join(SaleDetail, SaleDetail.venta_id == Sale.venta_id)
+            .group_by(
+                FECHA_CHILE,
+                SaleDetail.producto_id,
+                func.coalesce(Sale.usuario_id, 0),
+                func.coalesce(Sale.metodo_pago, literal("")),
+            )
+        )
+        if desde is not None:
+            borrar = borrar.where(VentaDiaria.fecha >= desde)
+            origen = origen.where(FECHA_CHILE >= desde)
+        if hasta is not None:
+            borrar = borrar.where(VentaDiaria.fecha <= hasta)
+            origen = origen.where(FECHA_CHILE <= hasta)
+
+        self.db.execute(borrar)
+        result = self.db.execute(
+            insert(VentaDiaria).from_select(
+                ["fecha", "producto_id", "usuario_id", "metodo_pago", "unidades", "monto", "num_ventas"],
+                origen,
+            )
+        )
+        return result.rowcount
+
+    # ---------- Lectura ----------
+    def totales(self, desde, hasta):
+        """(monto, unidades) entre dos fechas de Chile, inclusive."""
+        stmt = select(
+            func.coalesce(func.sum(VentaDiaria.monto), 0),
+            func.coalesce(func.sum(VentaDiaria.unidades), 0),
+        ).where(VentaDiaria.fecha.between(desde, hasta))
+        return self.db.execute(stmt).one()
+
+    def por_dia(self, desde, hasta):
+        """Serie diaria de (fecha, monto, unidades) entre dos fechas de Chile."""
+        stmt = (
+            select(VentaDiaria.fecha, func.sum(VentaDiaria.monto), func.sum(VentaDiaria.unidades))
+            .where(VentaDiaria.fecha.between(desde, hasta))
+            .group_by(VentaDiaria.fecha)
+            .order_by(VentaDiaria.fecha)
+        )
+        return self.db.execute(stmt).all()
@@ -0,0 +1,51 @@
+"""
+Completa las columnas numéricas de refracción y agudeza visual de fichas_clinicas
+(esfera_od_d, eje_od_grados, av_od_sc_logmar, ...) a partir de los campos de texto.
+
+Las fichas nuevas o editadas ya las guardan; esto es para el historial previo a
+la columna o tras cambiar las reglas de utils/refraccion.py. Es idempotente.
+
+Uso:
+    python -m app.infraestructure.utils.backfill_refraccion
+    python -m app.infraestructure.utils.backfill_refraccion --lote 5000
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.repositories.refraccion_repository import RefraccionRepository
+
+LOTE_DEFAULT = 2000
+
+
+def backfill_refraccion(lote=LOTE_DEFAULT):
+    print(f"🔄 Normalizando refracción de fichas clínicas (lotes de {lote})...")
+    total = 0
+    ultimo_id = 0
+    with SessionLocal() as db:
+        repo = RefraccionRepository(db)
+        try:
+            while True:
+                filas = repo.lote_textos(ultimo_id, lote)
+                if not filas:
+                    break
+                total += repo.guardar_numericos(filas)
+                db.commit()
+                ultimo_id = filas[-1].ficha_id
+                print(f"   - {total} fichas (hasta ficha_id {ultimo_id})")
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Error normalizando refracción: {e}")
+            raise
+    print(f"✅ Refracción normalizada: {total} fichas.")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Completa las columnas numéricas de refracción")
+    parser.add_argument("--lote", type=int, default=LOTE_DEFAULT, help="fichas por transacción")
+    args = parser.parse_args()
+    backfill_refraccion(max(1, args.lote))
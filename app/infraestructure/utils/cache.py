@@ -0,0 +1,56 @@
+"""
+Caché en memoria del proceso con expiración (TTL), segura entre hilos.
+
+Cada worker de gunicorn tiene la suya: sirve para resultados baratos de
+recalcular y tolerantes a unos segundos de atraso (dashboard, catálogos).
+"""
+import threading
+import time
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expira, valor = item
+            if expira < time.monotonic():
+                del self._data[key]
+                return default
+            return valor
+
+    def set(self, key, value, ttl_seconds: float = None):
+        expira = time.monotonic() + (self.ttl if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            if len(self._data) >= self.max_entries and key not in self._data:
+                # Descarta primero lo vencido; si no alcanza, la entrada más antigua
+                ahora = time.monotonic()
+                for k in [k for k, (exp, _) in self._data.items() if exp < ahora]:
+                    del self._data[k]
+                if len(self._data) >= self.max_entries:
+                    del self._data[next(iter(self._data))]
+            self._data[key] = (expira, value)
+
+    def get_or_set(self, key, factory, ttl_seconds: float = None):
+        """Devuelve el valor cacheado o lo calcula con factory() y lo guarda."""
+        _faltante = object()
+        valor = self.get(key, _faltante)
+        if valor is _faltante:
+            valor = factory()
+            self.set(key, valor, ttl_seconds)
+        return valor
+
+    def invalidate(self, key=None):
+        """Borra una clave, o toda la caché si key es None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
@@ -0,0 +1,82 @@
+"""
+Carga el catálogo CIE-10 (tabla cie10) desde un CSV: código en la primera
+columna y descripción en la segunda (las demás se ignoran).
+
+Acepta separador coma, punto y coma, tabulador o barra; la fila de encabezado
+se omite sola. Los códigos se guardan con punto ('H401' -> 'H40.1'). Todo el
+archivo va en una transacción; con --reemplazar se borra antes el catálogo previo.
+Los workers en marcha ven el catálogo nuevo al reiniciarse (ver utils/cie10.py).
+
+Uso:
+    python -m app.infraestructure.utils.cargar_cie10 cie10.csv
+    python -m app.infraestructure.utils.cargar_cie10 cie10.csv --reemplazar --codificacion latin-1
+"""
+import argparse
+import csv
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.utils.cie10 import formatear_codigo
+from app.infraestructure.repositories.cie10_repository import Cie10Repository
+
+LOTE = 1000
+
+
+def leer_catalogo(ruta, codificacion="utf-8-sig"):
+    """Devuelve ({codigo: descripcion}, filas descartadas)."""
+    catalogo = {}
+    descartadas = 0
+    with open(ruta, newline="", encoding=codificacion) as archivo:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+        except csv.Error:
+            dialecto = csv.excel
+        for n, fila in enumerate(csv.reader(archivo, dialecto)):
+            codigo = formatear_codigo(fila[0]) if fila else None
+            descripcion = fila[1].strip() if len(fila) > 1 else ""
+            if not codigo or not descripcion:
+                if n > 0 and any(c.strip() for c in fila):
+                    descartadas += 1
+                continue
+            catalogo[codigo] = descripcion
+    return catalogo, descartadas
+
+
+def cargar_cie10(ruta, reemplazar=False, codificacion="utf-8-sig"):
+    print(f"🔄 Leyendo catálogo CIE-10 desde {ruta}...")
+    catalogo, descartadas = leer_catalogo(ruta, codificacion)
+    if descartadas:
+        print(f"⚠️ {descartadas} filas sin código CIE-10 válido o sin descripción fueron omitidas")
+    if not catalogo:
+        print("❌ El archivo no contiene códigos CIE-10.")
+        return 0
+
+    filas = [{"codigo": codigo, "descripcion": descripcion} for codigo, descripcion in catalogo.items()]
+    with SessionLocal() as db:
+        repo = Cie10Repository(db)
+        try:
+            if reemplazar:
+                print(f"   - Catálogo anterior borrado ({repo.vaciar()} códigos)")
+            for i in range(0, len(filas), LOTE):
+                repo.guardar_lote(filas[i:i + LOTE])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Error cargando CIE-10: {e}")
+            raise
+    print(f"✅ Catálogo CIE-10 cargado: {len(filas)} códigos. Reinicia la app para actualizar el autocompletado.")
+    return len(filas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga el catálogo CIE-10 desde un CSV (código, descripción)")
+    parser.add_argument("ruta", help="archivo CSV")
+    parser.add_argument("--reemplazar", action="store_true", help="borra los códigos que no vengan en el archivo")
+    parser.add_argument("--codificacion", default="utf-8-sig", help="codificación del archivo (default utf-8-sig)")
+    args = parser.parse_args()
+    cargar_cie10(args.ruta, args.reemplazar, args.codificacion)
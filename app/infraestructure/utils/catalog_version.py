@@ -0,0 +1,62 @@
+"""
+Versión del catálogo de productos, compartida por todos los workers.
+
+La versión es una secuencia de PostgreSQL (catalogo_version_seq). Los repositorios
+marcan la sesión con mark_catalog_changed() al crear/editar/eliminar/restaurar
+productos o tocar stock; cuando esa transacción hace COMMIT se avanza la secuencia.
+Se avanza DESPUÉS del commit para que ningún worker cachee datos viejos bajo
+una versión nueva. Dentro de un request se usa la misma conexión del unit of work.
+"""
+from sqlalchemy import Sequence, event, text
+from sqlalchemy.orm import Session
+
+from app.infraestructure.utils.db import get_engine
+from app.infraestructure.utils.tables import Base
+
+CATALOG_SEQUENCE = "catalogo_version_seq"
+# Registrada en la metadata para que create_all (init_db) también la cree
+catalogo_version_seq = Sequence(CATALOG_SEQUENCE, metadata=Base.metadata)
+_FLAG = "catalogo_modificado"
+
+
+def mark_catalog_changed(session):
+    """Indica que la transacción en curso modifica el catálogo."""
+    session.info[_FLAG] = True
+
+
+def current_catalog_version(session) -> int:
+    """
+    Versión vigente (lectura barata, no consume valores de la secuencia).
+    is_called distingue la secuencia recién creada (1, false) de su primer nextval (1, true).
+    """
+    return int(session.execute(
+        text(f"SELECT last_value + is_called::int FROM {CATALOG_SEQUENCE}")
+    ).scalar())
+
+
+def bump_catalog_version(session=None):
+    """Avanza la versión en su propia transacción corta, ya confirmado el cambio."""
+    conn = getattr(session, "request_connection", None)
+    if conn is not None:
+        # Request: la sesión ya hizo COMMIT; se reutiliza su conexión en vez de pedir otra
+        conn.execute(text(f"SELECT nextval('{CATALOG_SEQUENCE}')"))
+        conn.commit()
+        return
+    with get_engine().connect() as conn:
+        conn.execute(text(f"SELECT nextval('{CATALOG_SEQUENCE}')"))
+        conn.commit()
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    if session.info.pop(_FLAG, False):
+        try:
+            bump_catalog_version(session)
+        except Exception as e:
+            # El dato ya quedó guardado; en el peor caso el catálogo cacheado vence por TTL
+            print(f"⚠️ No se pudo avanzar la versión del catálogo: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session):
+    session.info.pop(_FLAG, None)
@@ -0,0 +1,158 @@
+"""
+Catálogo CIE-10 en memoria para el autocompletado de diagnósticos.
+
+La tabla cie10 se llena con:
+
+    python -m app.infraestructure.utils.cargar_cie10 ruta/cie10.csv
+
+Cada proceso la lee una sola vez (al crear la app o en la primera búsqueda) a dos
+arreglos ordenados: códigos normalizados ('H401') y palabras de las descripciones
+sin tildes. Buscar es un bisect sobre esos arreglos, sin tocar Postgres.
+El catálogo casi no cambia: después de recargar la tabla hay que reiniciar los
+workers para que la vean. Si no se puede leer (p. ej. falta la tabla porque no se
+corrió upgrade_db) se usa un índice vacío y se reintenta pasado CIE10_REINTENTO_SEG.
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.repositories.cie10_repository import Cie10Repository
+
+LIMITE_DEFAULT = 20
+LIMITE_MAX = 50
+REINTENTO_SEG = float(os.getenv("CIE10_REINTENTO_SEG", "300"))
+_PALABRA = re.compile(r"[a-z0-9]+")
+_PREFIJO_CODIGO = re.compile(r"^[A-Z]\d")
+_CODIGO = re.compile(r"^[A-Z]\d{2}[0-9A-Z]{0,4}$")
+_FIN_PREFIJO = "\uffff"
+
+
+def normalizar_codigo(codigo) -> str:
+    """'h40.1 ' / 'H40-1' -> 'H401' (clave del índice)."""
+    return re.sub(r"[\s.\-]", "", str(codigo or "")).upper()
+
+
+def formatear_codigo(codigo) -> Optional[str]:
+    """Forma del catálogo, con punto tras la categoría: 'h401' -> 'H40.1'. None si no es CIE-10."""
+    clave = normalizar_codigo(codigo)
+    if not _CODIGO.match(clave):
+        return None
+    return clave if len(clave) == 3 else f"{clave[:3]}.{clave[3:]}"
+
+
+def _normalizar_texto(texto: str) -> str:
+    sin_tildes = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return sin_tildes.lower()
+
+
+class IndiceCie10:
+    """Índice de prefijos sobre arreglos ordenados (código y palabras de la descripción)."""
+
+    def __init__(self, filas: Iterable[Tuple[str, str]]):
+        entradas = sorted(
+            {normalizar_codigo(codigo): (codigo, descripcion) for codigo, descripcion in filas}.items()
+        )
+        self._claves = [clave for clave, _ in entradas]
+        self._entradas = [entrada for _, entrada in entradas]
+        self._palabras_entrada = [
+            tuple(_PALABRA.findall(_normalizar_texto(descripcion))) for _, descripcion in self._entradas
+        ]
+        palabras = sorted(
+            {(palabra, i) for i, propias in enumerate(self._palabras_entrada) for palabra in propias}
+        )
+        self._palabras = [palabra for palabra, _ in palabras]
+        self._palabra_entrada = [i for _, i in palabras]
+
+    def __len__(self):
+        return len(self._claves)
+
+    def _dict(self, i: int) -> Dict[str, str]:
+        codigo, descripcion = self._entradas[i]
+        return {'codigo': codigo, 'descripcion': descripcion}
+
+    @staticmethod
+    def _rango(arreglo: List[str], prefijo: str) -> Tuple[int, int]:
+        return bisect_left(arreglo, prefijo), bisect_left(arreglo, prefijo + _FIN_PREFIJO)
+
+    def por_codigo(self, codigo) -> Optional[Dict[str, str]]:
+        """Entrada exacta del catálogo para *codigo* (con o sin punto)."""
+        clave = normalizar_codigo(codigo)
+        i = bisect_left(self._claves, clave)
+        if i < len(self._claves) and self._claves[i] == clave:
+            return self._dict(i)
+        return None
+
+    def buscar(self, termino: str, limite: int = LIMITE_DEFAULT) -> List[Dict[str, str]]:
+        """
+        Códigos que empiezan con *termino* y luego descripciones con una palabra que
+        empieza con cada palabra de *termino* ('glauc ang' -> 'Glaucoma de ángulo ...').
+        """
+        encontrados: List[int] = []
+
+        clave = normalizar_codigo(termino)
+        if _PREFIJO_CODIGO.match(clave):
+            inicio, fin = self._rango(self._claves, clave)
+            encontrados.extend(range(inicio, min(fin, inicio + limite)))
+
+        palabras = _PALABRA.findall(_normalizar_texto(termino))
+        if palabras and len(encontrados) < limite:
+            # La palabra más larga acota el rango; las demás se exigen en la entrada
+            guia = max(palabras, key=len)
+            inicio, fin = self._rango(self._palabras, guia)
+            restantes = [p for p in palabras if p != guia]
+            vistos = set(encontrados)
+            for i in sorted(set(self._palabra_entrada[inicio:fin])):
+                if i in vistos:
+                    continue
+                propias = self._palabras_entrada[i]
+                if all(any(w.startswith(p) for w in propias) for p in restantes):
+                    encontrados.append(i)
+                    if len(encontrados) >= limite:
+                        break
+
+        return [self._dict(i) for i in encontrados]
+
+
+_indice: Optional[IndiceCie10] = None
+_VACIO = IndiceCie10(())
+_reintentar_desde = 0.0
+_fallo_avisado = False
+_lock = threading.Lock()
+
+
+def cargar_indice_cie10() -> IndiceCie10:
+    """Lee la tabla cie10 y reemplaza el índice de este proceso."""
+    global _indice
+    with SessionLocal() as session:
+        # SAVEPOINT: dentro de un request un fallo no deja abortada la sesión compartida
+        with session.begin_nested():
+            filas = Cie10Repository(session).todos()
+    _indice = IndiceCie10(filas)
+    return _indice
+
+
+def indice_cie10() -> IndiceCie10:
+    """
+    Índice del proceso; si no se cargó al arrancar, se carga aquí una sola vez.
+    Nunca falla: sin catálogo legible devuelve un índice vacío hasta el próximo reintento.
+    """
+    global _reintentar_desde, _fallo_avisado
+    if _indice is not None:
+        return _indice
+    if time.monotonic() < _reintentar_desde:
+        return _VACIO
+    with _lock:
+        if _indice is None and time.monotonic() >= _reintentar_desde:
+            try:
+                cargar_indice_cie10()
+            except Exception as e:
+                _reintentar_desde = time.monotonic() + REINTENTO_SEG
+                if not _fallo_avisado:
+                    _fallo_avisado = True
+                    print(f"⚠️ Catálogo CIE-10 no disponible, se usa vacío (reintento cada {REINTENTO_SEG:.0f}s): {e}")
+    return _indice if _indice is not None else _VACIO
@@ -48,6 +48,14 @@ def get_day_start_end_chile(target_date=None):
     
     return start_of_day, end_of_day
 
+def to_utc_naive(dt):
+    """Datetime con zona -> UTC sin zona (así se guarda ventas.fecha_venta: datetime.utcnow)."""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+def chile_day_start_utc(target_date):
+    """Inicio (00:00) del día calendario de Chile *target_date*, en UTC sin zona."""
+    return to_utc_naive(get_day_start_end_chile(target_date)[0])
+
 def convert_utc_to_chile(utc_datetime):
     """
     Convierte un datetime UTC a la zona horaria de Chile
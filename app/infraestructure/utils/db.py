@@ -1,14 +1,16 @@
 # app/infraestructure/utils/db.py
 
 import os
+import threading
+import time
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from flask import g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import _app_ctx_id
 
-# Instancia global de Flask-SQLAlchemy usada por los blueprints/controladores
-# Desactivamos autoflush/expire para evitar sorpresas entre requests
-db = SQLAlchemy(session_options={"autoflush": False, "expire_on_commit": False})
+from config.settings import config_by_name
 
 # CONFIGURACIÓN CORREGIDA PARA RENDER
 # Priorizar DATABASE_URL completa de Render
@@ -38,27 +40,216 @@ else:
     )
     print(f"🔧 [db.py] URL local construida: {DATABASE_URL}")
 
-# Engine "clásico" (mantengo porque tu dominio podría usarlo)
-engine = create_engine(
-    DATABASE_URL,
-    echo=True,
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True,
-    connect_args={
-        "client_encoding": "utf8",
-        "application_name": "optica_maipu_app",
-    },
-)
 
-# Session factory "clásica" (para repositorios/UseCases que la usen)
-SessionLocal = sessionmaker(
-    bind=engine,
+def create_db_engine(url: str, options: dict):
+    """
+    Única fábrica de engines de la app. Recibe SQLALCHEMY_ENGINE_OPTIONS de
+    config/settings.py (pool, recycle, statement_timeout, echo).
+    """
+    return create_engine(url, **options)
+
+
+# Engine ÚNICO del proceso: lo comparten SessionLocal y db.session. No se crea al
+# importar: create_app lo arma desde app.config (db.init_app -> init_engine); los
+# scripts sin app usan la config de FLASK_ENV la primera vez que piden get_engine().
+_engine = None
+_engine_config = None
+_statement_timeout_ms = None  # de la config con que se creó el engine (pool_report)
+_engine_lock = threading.Lock()
+
+
+def _valor_config(config, clave, default=None):
+    """Lee *clave* de app.config (dict) o de una clase de config/settings.py."""
+    if isinstance(config, dict):
+        return config.get(clave, default)
+    return getattr(config, clave, default)
+
+
+def init_engine(config):
+    """
+    Crea el engine desde SQLALCHEMY_DATABASE_URI / SQLALCHEMY_ENGINE_OPTIONS de *config*
+    (app.config o una clase de config). Una sola vez por proceso: si ya existe con la
+    misma URI y opciones se reutiliza; con otras (otra app en el mismo proceso, p. ej.
+    pruebas) se reemplaza y el pool anterior se cierra.
+    """
+    global _engine, _engine_config, _statement_timeout_ms
+    url = _valor_config(config, "SQLALCHEMY_DATABASE_URI") or DATABASE_URL
+    options = dict(_valor_config(config, "SQLALCHEMY_ENGINE_OPTIONS") or {})
+    with _engine_lock:
+        if _engine is not None and _engine_config == (url, options):
+            return _engine
+        anterior = _engine
+        _engine = create_db_engine(url, options)
+        _engine_config = (url, options)
+        _statement_timeout_ms = _valor_config(config, "DB_STATEMENT_TIMEOUT_MS")
+    if anterior is not None:
+        anterior.dispose()
+    return _engine
+
+
+def get_engine():
+    """Engine del proceso; sin create_app (scripts) se crea con la config de FLASK_ENV."""
+    if _engine is None:
+        init_engine(config_by_name.get(os.getenv("FLASK_ENV", "development"), config_by_name["development"]))
+    return _engine
+
+
+class _SharedEngineSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy que usa el engine del proceso (creado desde app.config) en vez
+    de un segundo pool, y cuyo db.session ES la sesión de SessionLocal(): dentro de
+    un request, db.session y SessionLocal() son el mismo unit of work y la misma
+    conexión, así mezclarlos no abre una segunda transacción.
+    """
+
+    def _make_engine(self, bind_key, options, app):
+        if bind_key is None:
+            return init_engine(app.config)
+        return super()._make_engine(bind_key, options, app)
+
+    def _make_scoped_session(self, options):
+        # SessionLocal se define más abajo: se resuelve al pedir la sesión
+        return scoped_session(lambda: SessionLocal(), scopefunc=_app_ctx_id)
+
+
+# Instancia global de Flask-SQLAlchemy usada por los blueprints/controladores
+# Desactivamos autoflush/expire para evitar sorpresas entre requests
+db = _SharedEngineSQLAlchemy(session_options={"autoflush": False, "expire_on_commit": False})
+
+
+class RequestScopedSession(Session):
+    """
+    Unit of work de un request HTTP: una sola sesión y UNA sola conexión del pool,
+    pedida de forma perezosa al ejecutar la primera consulta.
+
+    Repositorios, servicios y controladores que llaman a SessionLocal() (o usan
+    db.session) dentro del mismo request reciben esta misma sesión. Sus
+    `with SessionLocal()` / close() no la cierran: se libera en end_request()
+    (teardown), que descarta lo no confirmado y devuelve la conexión.
+
+    Como la transacción es de todo el request, session.rollback() descarta TODO lo no
+    confirmado, no solo lo del llamador: úsese cuando el request falla o cuando un
+    COMMIT falló (la transacción ya no sirve). Para deshacer una parte y seguir
+    (un INSERT que choca con un índice único, un conflicto de versión, un DELETE
+    bloqueado por FK) se usa un SAVEPOINT: `with session.begin_nested(): ...`.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._request_connection = None
+        self._checked_out_at = None
+        self.checkout_ms = None
+
+    def get_bind(self, mapper=None, **kwargs):
+        if self._request_connection is None:
+            inicio = time.perf_counter()
+            self._request_connection = get_engine().connect()
+            self._checked_out_at = time.perf_counter()
+            self.checkout_ms = (self._checked_out_at - inicio) * 1000
+        return self._request_connection
+
+    @property
+    def request_connection(self):
+        """Conexión del request (None si todavía no ejecutó SQL)."""
+        return self._request_connection
+
+    def hold_ms(self):
+        """Milisegundos que el request lleva reteniendo la conexión (None si no la pidió)."""
+        if self._checked_out_at is None:
+            return None
+        return (time.perf_counter() - self._checked_out_at) * 1000
+
+    def close(self):
+        # No-op a propósito: el cierre real lo hace end_request() al terminar el request
+        pass
+
+    def end_request(self):
+        """Descarta lo no confirmado, devuelve la conexión al pool y retorna métricas."""
+        hold = self.hold_ms()
+        try:
+            super().close()  # rollback de lo no confirmado (mismo efecto que el close() clásico)
+        finally:
+            if self._request_connection is not None:
+                self._request_connection.close()
+                self._request_connection = None
+        return {"checkout_ms": self.checkout_ms, "hold_ms": hold}
+
+
+# Session factory "clásica" (scripts, hilos y código fuera de un request).
+# El bind se resuelve al crear cada sesión (ver SessionLocal), no al importar.
+_session_factory = sessionmaker(
     autocommit=False,
     autoflush=False,
     expire_on_commit=False,
 )
 
+# Session factory del request (el bind lo resuelve RequestScopedSession.get_bind)
+_request_session_factory = sessionmaker(
+    class_=RequestScopedSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+def SessionLocal():
+    """
+    Dentro de un request devuelve la sesión compartida del request (unit of work);
+    fuera de él (scripts, init_db, hilos) crea una sesión independiente como antes.
+    """
+    if has_request_context():
+        request_session = g.get("_db_session")
+        if request_session is None:
+            request_session = _request_session_factory()
+            g._db_session = request_session
+        elif not request_session.is_active:
+            # Un uso anterior falló sin rollback: limpiar antes de entregarla de nuevo
+            request_session.rollback()
+        return request_session
+    return _session_factory(bind=get_engine())
+
+
+def end_request_session():
+    """Cierra la sesión del request actual (si se usó) y devuelve sus métricas."""
+    request_session = g.pop("_db_session", None)
+    if request_session is None:
+        return None
+    return request_session.end_request()
+
+
+def pool_report() -> dict:
+    """Configuración efectiva del pool, para dimensionar conexiones de Postgres por worker."""
+    engine = get_engine()
+    pool = engine.pool
+    size = pool.size() if hasattr(pool, "size") else 0
+    overflow = getattr(pool, "_max_overflow", 0)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    return {
+        "pool_class": type(pool).__name__,
+        "pool_size": size,
+        "max_overflow": overflow,
+        "pool_timeout": getattr(pool, "_timeout", None),
+        "pool_recycle": pool._recycle,
+        "statement_timeout_ms": _statement_timeout_ms,
+        "echo": engine.echo,
+        "max_conexiones_por_worker": size + overflow,
+        "workers": workers,
+        "max_conexiones_totales": (size + overflow) * workers,
+    }
+
+
+def print_pool_report():
+    r = pool_report()
+    print(
+        f"🗄️ [db.py] Pool {r['pool_class']}: size={r['pool_size']} overflow={r['max_overflow']} "
+        f"timeout={r['pool_timeout']}s recycle={r['pool_recycle']}s "
+        f"statement_timeout={r['statement_timeout_ms']}ms echo={r['echo']}"
+    )
+    print(
+        f"🗄️ [db.py] Máx. conexiones: {r['max_conexiones_por_worker']} por worker × "
+        f"{r['workers']} worker(s) (WEB_CONCURRENCY) = {r['max_conexiones_totales']}"
+    )
+
+
 def get_connection():
     """Obtiene una conexión directa a la base de datos (psycopg2)."""
     import psycopg2
@@ -1,7 +1,7 @@
 from app.infraestructure.utils.db import SessionLocal
 
 def get_db_session():
-    """Obtiene una sesión de base de datos"""
+    """Obtiene una sesión de base de datos (la del request en curso si hay uno)"""
     db = SessionLocal()
     try:
         return db
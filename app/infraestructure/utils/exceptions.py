@@ -3,4 +3,16 @@ class ProductCreationError(Exception):
     pass
 class ProductNotFoundError(Exception):
     """Excepción para productos no encontrados"""
-    pass
\ No newline at end of file
+    pass
+class InsufficientStockError(ValueError):
+    """Excepción para ventas que no pueden descontar stock en una o más líneas"""
+    def __init__(self, lineas):
+        # lineas: [{'producto_id', 'nombre', 'solicitado', 'disponible'}]
+        self.lineas = lineas
+        detalle = "; ".join(
+            f"{l.get('nombre') or 'Producto ID ' + str(l['producto_id'])}: "
+            + ("no existe" if l.get('disponible') is None
+               else f"solicitado {l['solicitado']}, disponible {l['disponible']}")
+            for l in lineas
+        )
+        super().__init__(f"Stock insuficiente: {detalle}.")
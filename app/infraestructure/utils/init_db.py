@@ -5,14 +5,18 @@ from werkzeug.security import generate_password_hash
 load_dotenv()
 print("🔄 Cargando variables de entorno para inicialización...")
 
-from app.infraestructure.utils.db import engine, SessionLocal
+from app.infraestructure.utils.db import get_engine, SessionLocal
 from app.infraestructure.utils.tables import Base
 from app.domain.models.user import User
 from app.domain.models.rol import Rol
 from app.domain.models.products import Product
 from app.domain.models.sale import Sale
+from app.domain.models.venta_diaria import VentaDiaria
 from app.domain.models.cliente import Cliente
 from app.domain.models.proveedor import Proveedor
+from app.domain.models.cie10 import Cie10
+from app.infraestructure.utils import catalog_version  # noqa: F401  (secuencia del catálogo)
+from app.infraestructure.utils import numeracion  # noqa: F401  (secuencias de numero_ficha/numero_consulta)
 
 _ALLOWED_RESET_VALUES = {"1", "true", "yes", "on"}
 
@@ -34,9 +38,9 @@ def initialize_database():
     print("Conectando a la base de datos para inicialización...")
     try:
         print("Borrando tablas existentes (si las hay)...")
-        Base.metadata.drop_all(bind=engine)
+        Base.metadata.drop_all(bind=get_engine())
         print("Creando todas las tablas nuevas...")
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
     except Exception as e:
         print(f"❌ ERROR CRÍTICO durante la creación de tablas: {e}")
         return
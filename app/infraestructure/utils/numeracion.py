@@ -0,0 +1,41 @@
+"""
+Numeración correlativa de fichas de paciente y de consultas.
+
+El correlativo sale de una secuencia de PostgreSQL evaluada dentro del propio
+INSERT (la expresión se asigna a la columna), así que dos registros simultáneos
+nunca chocan y no hace falta consultar antes si el número ya existe.
+El prefijo con la fecha lo arma la aplicación en hora local, igual que fecha_consulta.
+
+    FM-YYYYMM-0000001      numero_ficha   (pacientes_medicos)
+    CONS-YYMMDD-0000001    numero_consulta (fichas_clinicas)
+
+Los 7 dígitos dejan ambos bajo el límite de 20 caracteres de las columnas y no
+coinciden en largo con los números aleatorios que generaba el front (6 y 4 dígitos).
+"""
+from datetime import datetime
+
+from sqlalchemy import Sequence, func
+
+from app.infraestructure.utils.tables import Base
+
+# Registradas en la metadata para que create_all (init_db) también las cree
+NUMERO_FICHA_SEQ = Sequence("pacientes_numero_ficha_seq", metadata=Base.metadata)
+NUMERO_CONSULTA_SEQ = Sequence("fichas_numero_consulta_seq", metadata=Base.metadata)
+
+_FORMATO_CORRELATIVO = "FM0000000"
+
+
+def _numero(prefijo: str, secuencia: Sequence):
+    return func.concat(prefijo, func.to_char(secuencia.next_value(), _FORMATO_CORRELATIVO))
+
+
+def numero_ficha_sql(fecha: datetime = None):
+    """Expresión SQL para PacienteMedico.numero_ficha (prefijo por mes)."""
+    fecha = fecha or datetime.now()
+    return _numero(f"FM-{fecha:%Y%m}-", NUMERO_FICHA_SEQ)
+
+
+def numero_consulta_sql(fecha: datetime = None):
+    """Expresión SQL para FichaClinica.numero_consulta (prefijo por día de la consulta)."""
+    fecha = fecha or datetime.now()
+    return _numero(f"CONS-{fecha:%y%m%d}-", NUMERO_CONSULTA_SEQ)
@@ -0,0 +1,142 @@
+"""
+Contador de sentencias SQL por request y detector de N+1.
+
+Se engancha a before_cursor_execute/after_cursor_execute de los engines (clase Engine,
+así cubre el engine que create_app arme desde app.config):
+- Cuenta sentencias y tiempo total en BD de cada request.
+- Agrupa por "forma" de la sentencia (SQL sin literales) y avisa en el log cuando
+  una misma forma se repite N_PLUS_ONE_THRESHOLD veces o más (patrón N+1).
+- En desarrollo (o con DB_QUERY_HEADERS=true) agrega X-DB-Queries y X-DB-Time.
+
+query_budget() sirve para verificar un presupuesto máximo de consultas por endpoint
+desde scripts o pruebas manuales con app.test_client():
+
+    with query_budget(5, "GET /api/fichas-clinicas"):
+        client.get("/api/fichas-clinicas")
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+
+# Listas de parámetros expandidas (IN (%(id_1)s, %(id_2)s, ...)) colapsan a una sola forma
+_PARAM_LIST_RE = re.compile(r"\(\s*%\(\w+?\)s(?:\s*,\s*%\(\w+?\)s)*\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+_local = threading.local()
+_installed = False
+
+
+def statement_shape(statement):
+    """Normaliza una sentencia para comparar su forma sin importar los parámetros."""
+    shape = _PARAM_LIST_RE.sub("(?)", statement)
+    return _SPACES_RE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    """Acumulador de sentencias ejecutadas (por request o por presupuesto)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Formas que se repitieron al menos *threshold* veces, de más a menos."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _active_budgets():
+    if not hasattr(_local, "budgets"):
+        _local.budgets = []
+    return _local.budgets
+
+
+# El inicio se guarda en el contexto de ejecución de la sentencia y no en la conexión:
+# si la sentencia falla no hay after_cursor_execute y no debe quedar nada pendiente.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_query_start", None)
+    elapsed_ms = (time.perf_counter() - inicio) * 1000 if inicio is not None else 0.0
+
+    for stats in _active_budgets():
+        stats.record(statement, elapsed_ms)
+
+    if has_request_context():
+        stats = g.get("_query_stats")
+        if stats is not None:
+            stats.record(statement, elapsed_ms)
+
+
+def install_query_listeners():
+    """Engancha los listeners a Engine (una sola vez por proceso, vale para todo engine)."""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+
+@contextmanager
+def query_budget(max_queries, label=""):
+    """Falla (QueryBudgetExceeded) si el bloque ejecuta más de *max_queries* sentencias."""
+    install_query_listeners()
+    stats = QueryStats()
+    budgets = _active_budgets()
+    budgets.append(stats)
+    try:
+        yield stats
+    finally:
+        budgets.remove(stats)
+
+    if stats.count > max_queries:
+        detalle = "\n".join(f"  {n}× {shape[:160]}" for shape, n in stats.shapes.most_common(5))
+        raise QueryBudgetExceeded(
+            f"{label or 'bloque'}: {stats.count} consultas (máximo {max_queries}).\n{detalle}"
+        )
+
+
+def init_query_counter(app):
+    """Registra el conteo por request, la alerta de N+1 y los headers de desarrollo."""
+    install_query_listeners()
+    headers_enabled = app.debug or os.getenv("DB_QUERY_HEADERS", "").strip().lower() in ("1", "true", "yes", "on")
+
+    @app.before_request
+    def _start_query_stats():
+        g._query_stats = QueryStats()
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.get("_query_stats")
+        if stats is None:
+            return response
+
+        for shape, n in stats.repeated():
+            print(f"⚠️ [N+1] {request.method} {request.path}: {n}× {shape[:200]}")
+
+        if headers_enabled:
+            response.headers["X-DB-Queries"] = str(stats.count)
+            response.headers["X-DB-Time"] = f"{stats.total_ms:.1f}"
+        return response
@@ -0,0 +1,48 @@
+"""
+Reconstruye el rollup ventas_diarias desde ventas/detalle_ventas (backfill en bloque).
+
+La app lo mantiene en la misma transacción al registrar (SaleService), guardar o
+borrar (SQLSaleRepository.save/delete) una venta. Ventas o detalles cambiados por
+fuera de esos caminos (SQL a mano, restauraciones) requieren correr este script
+para los días afectados.
+
+Uso:
+    python -m app.infraestructure.utils.rebuild_ventas_diarias                 # todo el historial
+    python -m app.infraestructure.utils.rebuild_ventas_diarias --desde 2024-01-01 --hasta 2024-12-31
+"""
+import argparse
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.infraestructure.utils.db import SessionLocal
+from app.infraestructure.repositories.sql_venta_diaria_repository import SQLVentaDiariaRepository
+
+
+def _fecha(valor):
+    return datetime.strptime(valor, "%Y-%m-%d").date()
+
+
+def rebuild_ventas_diarias(desde=None, hasta=None):
+    rango = f"{desde or 'inicio'} → {hasta or 'hoy'}"
+    print(f"🔄 Reconstruyendo ventas_diarias ({rango})...")
+    with SessionLocal() as db:
+        try:
+            filas = SQLVentaDiariaRepository(db).rebuild(desde, hasta)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Error reconstruyendo ventas_diarias: {e}")
+            raise
+    print(f"✅ ventas_diarias reconstruida: {filas} filas.")
+    return filas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye el rollup ventas_diarias")
+    parser.add_argument("--desde", type=_fecha, default=None, help="fecha de Chile inicial (YYYY-MM-DD)")
+    parser.add_argument("--hasta", type=_fecha, default=None, help="fecha de Chile final (YYYY-MM-DD)")
+    args = parser.parse_args()
+    rebuild_ventas_diarias(args.desde, args.hasta)
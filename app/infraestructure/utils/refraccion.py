@@ -0,0 +1,119 @@
+"""
+Normalización de refracción y agudeza visual de la ficha clínica.
+
+Los campos del formulario son texto libre ('+1,25', 'plano', 'x90°', '20/40', 'CD');
+aquí se interpretan a números que se guardan en columnas paralelas de
+fichas_clinicas al guardar la ficha (ver FichaClinica) y con el backfill:
+
+    python -m app.infraestructure.utils.backfill_refraccion
+
+    esfera/cilindro/adición -> dioptrías      (esfera_od_d, cilindro_od_d, adicion_od_d)
+    eje                     -> grados 0-180   (eje_od_grados)
+    agudeza visual sc/cc/ph -> logMAR         (av_od_sc_logmar, ...)
+
+Lo que no se reconoce queda en NULL; el texto original nunca se modifica.
+La agudeza de cerca (notación Jaeger/M) no se convierte.
+"""
+import math
+import re
+from typing import Any, Dict, Mapping, Optional
+
+_PLANO = {"plano", "pl", "plan", "neutro", "n"}
+_NUMERO = re.compile(r"^([+-]?)(\d+(?:\.\d*)?|\.\d+)$")
+_FRACCION = re.compile(r"^(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)")
+_DIOPTRIAS_MAX = 30.0
+
+# Baja visión en escala logMAR (Schulze-Bonsel et al., 2006); PL/NPL no tienen equivalente
+_BAJA_VISION = (
+    (("CD", "CF", "CUENTA"), 1.9),
+    (("MM", "HM", "MOVIMIENTO"), 2.3),
+)
+
+
+def _texto(valor: Any) -> str:
+    return str(valor).strip().lower().replace(",", ".") if valor is not None else ""
+
+
+def parse_dioptrias(valor: Any) -> Optional[float]:
+    """
+    '+1,25' / '-0.75D' / 'plano' -> dioptrías. Un entero de dos o más cifras sin
+    punto que es múltiplo de 25 se lee en centésimas ('-25' -> -0.25, '-050' -> -0.50,
+    '-125' -> -1.25); el resto de los enteros son dioptrías ('-4', '10').
+    """
+    texto = re.sub(r"\s+|dpt?$|d$", "", _texto(valor))
+    if not texto:
+        return None
+    if texto in _PLANO:
+        return 0.0
+    match = _NUMERO.match(texto)
+    if not match:
+        return None
+    cifras = match.group(2)
+    numero = float(cifras)
+    if cifras.isdigit() and len(cifras) >= 2 and int(cifras) % 25 == 0:
+        numero /= 100
+    if numero > _DIOPTRIAS_MAX:
+        return None
+    return round(-numero if match.group(1) == "-" else numero, 2)
+
+
+def parse_eje(valor: Any) -> Optional[int]:
+    """'x90°' / '180' -> grados enteros entre 0 y 180."""
+    texto = re.sub(r"[x°º\s]|grados?", "", _texto(valor))
+    if not texto.isdigit():
+        return None
+    grados = int(texto)
+    return grados if 0 <= grados <= 180 else None
+
+
+def parse_agudeza_logmar(valor: Any) -> Optional[float]:
+    """Snellen ('20/40', '6/12-2'), decimal ('0.5') o CD/MM -> logMAR."""
+    texto = _texto(valor).upper()
+    if not texto:
+        return None
+    for prefijos, logmar in _BAJA_VISION:
+        if texto.startswith(prefijos):
+            return logmar
+
+    match = _FRACCION.match(texto)
+    if match:
+        numerador, denominador = float(match.group(1)), float(match.group(2))
+        if numerador <= 0 or denominador <= 0:
+            return None
+        logmar = math.log10(denominador / numerador)
+    else:
+        match = _NUMERO.match(texto)
+        if not match or match.group(1) == "-":
+            return None
+        decimal = float(match.group(2))
+        if not 0 < decimal <= 2.0:
+            return None
+        logmar = -math.log10(decimal)
+
+    # + 0.0 evita devolver -0.0 para visión 1.0
+    return round(logmar, 2) + 0.0 if -0.3 <= logmar <= 3.0 else None
+
+
+# columna de texto -> (columna numérica, parser)
+COLUMNAS_NUMERICAS: Dict[str, tuple] = {}
+for _ojo in ("od", "oi"):
+    COLUMNAS_NUMERICAS.update({
+        f"esfera_{_ojo}": (f"esfera_{_ojo}_d", parse_dioptrias),
+        f"cilindro_{_ojo}": (f"cilindro_{_ojo}_d", parse_dioptrias),
+        f"eje_{_ojo}": (f"eje_{_ojo}_grados", parse_eje),
+        f"adicion_{_ojo}": (f"adicion_{_ojo}_d", parse_dioptrias),
+        f"av_{_ojo}_sc": (f"av_{_ojo}_sc_logmar", parse_agudeza_logmar),
+        f"av_{_ojo}_cc": (f"av_{_ojo}_cc_logmar", parse_agudeza_logmar),
+        f"av_{_ojo}_ph": (f"av_{_ojo}_ph_logmar", parse_agudeza_logmar),
+    })
+
+COLUMNAS_DERIVADAS = frozenset(destino for destino, _ in COLUMNAS_NUMERICAS.values())
+
+
+def valores_numericos(fuente: Mapping[str, Any]) -> Dict[str, Any]:
+    """Columnas numéricas de los campos de texto presentes en *fuente*."""
+    valores = {}
+    for campo, (destino, parser) in COLUMNAS_NUMERICAS.items():
+        if campo in fuente:
+            valores[destino] = parser(fuente[campo])
+    return valores
@@ -1,5 +1,16 @@
+from sqlalchemy import Column, FetchedValue, String
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
 # Los modelos se importarán en otros lugares donde sea necesario
+
+
+def columna_version():
+    """Versión de fila para concurrencia optimista: la columna de sistema xmin de PostgreSQL.
+
+    Cambia en cada INSERT/UPDATE de la fila sin columnas ni triggers extra. Es solo
+    lectura (system=True: no entra en el CREATE TABLE ni en los INSERT/UPDATE del ORM).
+    """
+    return Column('xmin', String, system=True,
+                  server_default=FetchedValue(), server_onupdate=FetchedValue())
@@ -0,0 +1,180 @@
+"""
+Motor de exportación tabular en streaming (XLSX write_only o CSV).
+
+Recibe cualquier consulta SQLAlchemy (Query ORM o select()) y una especificación
+de columnas; recorre los resultados con cursor del lado del servidor (yield_per)
+y escribe a un archivo temporal, así la memoria no depende del número de filas.
+
+    columnas = [
+        Columna("ID", "venta_id", ancho=10),
+        Columna("Fecha", "fecha_venta", zona=CHILE_TIMEZONE),  # UTC sin zona -> hora de Chile
+        Columna("Cliente", lambda r: f"{r.nombres} {r.ap_pat}"),  # ancho por muestreo
+    ]
+    return export_response(db, stmt, columnas, "ventas_2024", formato="xlsx")
+"""
+import csv
+import io
+import tempfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from itertools import chain, islice
+
+from flask import send_file
+from openpyxl.utils import get_column_letter
+from sqlalchemy.orm import Query
+
+FORMATOS = ("xlsx", "csv")
+MIMETYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+CHUNK_SIZE = 1000      # filas por fetch del cursor del servidor
+SAMPLE_ROWS = 200      # filas usadas para estimar anchos de columnas sin ancho fijo
+MAX_WIDTH = 50
+FORMATO_FECHA_HORA = "%d-%m-%Y %H:%M"
+FORMATO_FECHA = "%d-%m-%Y"
+# Mismos formatos en las celdas de fecha del XLSX
+NUMBER_FORMAT_FECHA_HORA = "DD-MM-YYYY HH:MM"
+NUMBER_FORMAT_FECHA = "DD-MM-YYYY"
+
+
+class Columna:
+    """
+    Columna exportable: título, cómo obtener el valor de la fila y ancho opcional.
+    Con *zona* los datetimes (guardados en UTC sin zona) se pasan a esa zona horaria;
+    ambos formatos (XLSX y CSV) reciben el valor ya convertido.
+    """
+
+    def __init__(self, titulo, valor, ancho=None, zona=None):
+        self.titulo = titulo
+        # 'valor' puede ser el nombre de un atributo/columna o una función fila -> valor
+        self._getter = valor if callable(valor) else (lambda fila, attr=valor: getattr(fila, attr, None))
+        self.ancho = ancho
+        self.zona = zona
+
+    def extraer(self, fila):
+        valor = self._getter(fila)
+        if isinstance(valor, Decimal):
+            return float(valor)
+        if self.zona is not None and isinstance(valor, datetime):
+            if valor.tzinfo is None:
+                valor = valor.replace(tzinfo=timezone.utc)
+            # openpyxl no admite datetimes con zona: hora local sin zona
+            return valor.astimezone(self.zona).replace(tzinfo=None)
+        return valor
+
+
+def iter_query(session, query, chunk_size=CHUNK_SIZE):
+    """Itera una Query ORM o un select() en bloques de *chunk_size* filas."""
+    if isinstance(query, Query):
+        return iter(query.yield_per(chunk_size))
+    return iter(session.execute(query.execution_options(yield_per=chunk_size)))
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime(FORMATO_FECHA_HORA)
+    if isinstance(valor, date):
+        return valor.strftime(FORMATO_FECHA)
+    return str(valor)
+
+
+def _celdas_xlsx(ws, fila):
+    """Fechas como celdas de fecha con el mismo formato que el CSV; el resto tal cual."""
+    from openpyxl.cell import WriteOnlyCell
+
+    celdas = []
+    for valor in fila:
+        if isinstance(valor, date):
+            celda = WriteOnlyCell(ws, value=valor)
+            celda.number_format = (
+                NUMBER_FORMAT_FECHA_HORA if isinstance(valor, datetime) else NUMBER_FORMAT_FECHA
+            )
+            celdas.append(celda)
+        else:
+            celdas.append(valor)
+    return celdas
+
+
+def _anchos(columnas, muestra):
+    """Ancho fijo si la columna lo define; si no, el máximo observado en la muestra."""
+    anchos = []
+    for idx, col in enumerate(columnas):
+        if col.ancho:
+            anchos.append(col.ancho)
+            continue
+        largo = max([len(col.titulo)] + [len(_texto(fila[idx])) for fila in muestra])
+        anchos.append(min(largo + 2, MAX_WIDTH))
+    return anchos
+
+
+def write_xlsx(filas, columnas, output, titulo_hoja="Datos", color_encabezado="366092"):
+    """Escribe *filas* (ya extraídas, listas de valores) a *output* en modo write_only."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font, PatternFill
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titulo_hoja)
+
+    # En write_only los anchos deben fijarse antes de la primera fila:
+    # se toma una muestra acotada, se calculan y luego se escribe muestra + resto.
+    muestra = list(islice(filas, SAMPLE_ROWS))
+    for idx, ancho in enumerate(_anchos(columnas, muestra), 1):
+        ws.column_dimensions[get_column_letter(idx)].width = ancho
+
+    fill = PatternFill(start_color=color_encabezado, end_color=color_encabezado, fill_type="solid")
+    font = Font(bold=True, color="FFFFFF")
+    encabezado = []
+    for col in columnas:
+        cell = WriteOnlyCell(ws, value=col.titulo)
+        cell.fill = fill
+        cell.font = font
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        encabezado.append(cell)
+    ws.append(encabezado)
+
+    for fila in chain(muestra, filas):
+        ws.append(_celdas_xlsx(ws, fila))
+
+    wb.save(output)
+
+
+def write_csv(filas, columnas, output):
+    """Escribe *filas* como CSV UTF-8 con BOM (se abre bien en Excel) a *output* binario."""
+    texto = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    writer = csv.writer(texto)
+    writer.writerow([col.titulo for col in columnas])
+    for fila in filas:
+        writer.writerow([_texto(v) for v in fila])
+    texto.flush()
+    texto.detach()  # no cerrar 'output' al liberar el wrapper
+
+
+def export_to_file(session, query, columnas, formato="xlsx", **xlsx_options):
+    """Ejecuta *query* en streaming y devuelve un archivo temporal posicionado al inicio."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    filas = ([col.extraer(r) for col in columnas] for r in iter_query(session, query))
+    output = tempfile.TemporaryFile(suffix=f".{formato}")
+    if formato == "xlsx":
+        write_xlsx(filas, columnas, output, **xlsx_options)
+    else:
+        write_csv(filas, columnas, output)
+    output.seek(0)
+    return output
+
+
+def export_response(session, query, columnas, nombre_archivo, formato="xlsx", **xlsx_options):
+    """Respuesta Flask de descarga; el temporal se elimina al terminar de enviarse."""
+    output = export_to_file(session, query, columnas, formato, **xlsx_options)
+    return send_file(
+        output,
+        mimetype=MIMETYPES[formato],
+        as_attachment=True,
+        download_name=f"{nombre_archivo}.{formato}",
+    )
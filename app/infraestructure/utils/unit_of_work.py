@@ -0,0 +1,72 @@
+"""
+Ciclo de vida de la sesión por request (ver RequestScopedSession en db.py) y
+métricas de conexión: cuánto tardó el request en obtener su conexión del pool
+(checkout) y cuánto tiempo la retuvo (hold).
+
+- Cada respuesta que usó la BD lleva X-DB-Checkout-Ms y X-DB-Hold-Ms.
+- db_metrics_snapshot() entrega los acumulados del proceso (worker).
+"""
+import os
+import threading
+
+from flask import g, request
+
+from app.infraestructure.utils.db import end_request_session
+
+# Requests que retienen la conexión más de este umbral se registran en el log
+SLOW_HOLD_MS = float(os.getenv("DB_SLOW_HOLD_MS", "1000"))
+
+_lock = threading.Lock()
+_stats = {
+    "requests_con_bd": 0,
+    "checkout_ms_total": 0.0,
+    "checkout_ms_max": 0.0,
+    "hold_ms_total": 0.0,
+    "hold_ms_max": 0.0,
+}
+
+
+def _registrar(metricas):
+    with _lock:
+        _stats["requests_con_bd"] += 1
+        _stats["checkout_ms_total"] += metricas["checkout_ms"]
+        _stats["checkout_ms_max"] = max(_stats["checkout_ms_max"], metricas["checkout_ms"])
+        _stats["hold_ms_total"] += metricas["hold_ms"]
+        _stats["hold_ms_max"] = max(_stats["hold_ms_max"], metricas["hold_ms"])
+
+
+def db_metrics_snapshot():
+    """Acumulados de checkout/hold de conexiones de este worker."""
+    with _lock:
+        n = _stats["requests_con_bd"]
+        return {
+            "requests_con_bd": n,
+            "checkout_ms_promedio": round(_stats["checkout_ms_total"] / n, 2) if n else 0.0,
+            "checkout_ms_max": round(_stats["checkout_ms_max"], 2),
+            "hold_ms_promedio": round(_stats["hold_ms_total"] / n, 2) if n else 0.0,
+            "hold_ms_max": round(_stats["hold_ms_max"], 2),
+        }
+
+
+def init_unit_of_work(app):
+    """Registra los hooks que cierran la sesión del request y publican sus métricas."""
+
+    @app.after_request
+    def _db_connection_headers(response):
+        request_session = g.get("_db_session")
+        if request_session is not None and request_session.checkout_ms is not None:
+            response.headers["X-DB-Checkout-Ms"] = f"{request_session.checkout_ms:.1f}"
+            response.headers["X-DB-Hold-Ms"] = f"{request_session.hold_ms():.1f}"
+        return response
+
+    @app.teardown_request
+    def _end_request_session(exc):
+        metricas = end_request_session()
+        if not metricas or metricas["checkout_ms"] is None:
+            return
+        _registrar(metricas)
+        if metricas["hold_ms"] > SLOW_HOLD_MS:
+            print(
+                f"⚠️ [unit_of_work] {request.method} {request.path} retuvo la conexión "
+                f"{metricas['hold_ms']:.0f} ms (checkout {metricas['checkout_ms']:.1f} ms)"
+            )
@@ -0,0 +1,197 @@
+"""
+Actualización de esquema NO destructiva para bases ya existentes.
+
+init_db.py recrea todo desde cero (drop_all/create_all); este script solo agrega
+columnas e índices nuevos de los modelos con sentencias idempotentes
+(IF NOT EXISTS), por lo que puede ejecutarse en cada despliegue.
+
+Nunca borra datos clínicos por su cuenta: si un examen tiene más de una fila por
+ficha, se detiene con el detalle y el operador decide si archivarlas
+(--archivar-duplicados las mueve a <tabla>_duplicados y deja la más reciente).
+
+Uso:
+    python -m app.infraestructure.utils.upgrade_db
+    python -m app.infraestructure.utils.upgrade_db --archivar-duplicados
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+from app.infraestructure.utils.db import get_engine
+from app.domain.models.cliente import BUSQUEDA_SQL
+from app.infraestructure.utils.refraccion import COLUMNAS_DERIVADAS
+
+# Exámenes con una sola fila por ficha (upsert ON CONFLICT (ficha_id)): (tabla, pk, fecha)
+_EXAMENES_POR_FICHA = (
+    ("biomicroscopia", "biomicroscopia_id", "fecha_examen"),
+    ("reflejos_pupilares", "reflejo_id", "fecha_registro"),
+    ("fondo_ojo", "fondo_ojo_id", "fecha_examen"),
+    ("parametros_clinicos", "parametro_id", "fecha_registro"),
+)
+
+
+def _tipo_refraccion(columna):
+    if columna.endswith("_grados"):
+        return "SMALLINT"
+    return "NUMERIC(4, 2)" if columna.endswith("_logmar") else "NUMERIC(5, 2)"
+
+
+# (descripción, sentencia) en orden de aplicación
+UPGRADES = [
+    (
+        "ventas.idempotency_key",
+        "ALTER TABLE ventas ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)",
+    ),
+    (
+        "índice único ventas_idempotency_key_key",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ventas_idempotency_key_key ON ventas (idempotency_key)",
+    ),
+    (
+        "tabla ventas_diarias (rollup; luego: python -m app.infraestructure.utils.rebuild_ventas_diarias)",
+        """
+        CREATE TABLE IF NOT EXISTS ventas_diarias (
+            fecha DATE NOT NULL,
+            producto_id INTEGER NOT NULL,
+            usuario_id INTEGER NOT NULL DEFAULT 0,
+            metodo_pago VARCHAR(50) NOT NULL DEFAULT '',
+            unidades INTEGER NOT NULL DEFAULT 0,
+            monto NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            num_ventas INTEGER NOT NULL DEFAULT 0,
+            CONSTRAINT ventas_diarias_pkey PRIMARY KEY (fecha, producto_id, usuario_id, metodo_pago)
+        )
+        """,
+    ),
+    (
+        "índice idx_ventas_diarias_producto",
+        "CREATE INDEX IF NOT EXISTS idx_ventas_diarias_producto ON ventas_diarias (producto_id, fecha)",
+    ),
+    (
+        "secuencia catalogo_version_seq (versión del catálogo para caché/ETag)",
+        "CREATE SEQUENCE IF NOT EXISTS catalogo_version_seq",
+    ),
+    (
+        "extensión pg_trgm (búsqueda de personas)",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    ),
+    (
+        "clientes.busqueda (nombre completo + rut normalizado)",
+        f"ALTER TABLE clientes ADD COLUMN IF NOT EXISTS busqueda TEXT GENERATED ALWAYS AS ({BUSQUEDA_SQL}) STORED",
+    ),
+    (
+        "índice idx_clientes_busqueda_trgm",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_busqueda_trgm ON clientes USING gin (busqueda gin_trgm_ops)",
+    ),
+    (
+        "índice idx_clientes_rut",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_rut ON clientes (rut)",
+    ),
+    (
+        "índice idx_fichas_fecha_id (paginación por cursor de fichas)",
+        "CREATE INDEX IF NOT EXISTS idx_fichas_fecha_id ON fichas_clinicas (fecha_consulta, ficha_id)",
+    ),
+    (
+        "índice idx_fichas_fecha (reemplazado por idx_fichas_fecha_id)",
+        "DROP INDEX IF EXISTS idx_fichas_fecha",
+    ),
+    (
+        "índice idx_fichas_paciente_fecha (línea de tiempo del paciente)",
+        "CREATE INDEX IF NOT EXISTS idx_fichas_paciente_fecha "
+        "ON fichas_clinicas (paciente_medico_id, fecha_consulta, ficha_id)",
+    ),
+    (
+        "secuencia pacientes_numero_ficha_seq (numero_ficha)",
+        "CREATE SEQUENCE IF NOT EXISTS pacientes_numero_ficha_seq",
+    ),
+    (
+        "secuencia fichas_numero_consulta_seq (numero_consulta)",
+        "CREATE SEQUENCE IF NOT EXISTS fichas_numero_consulta_seq",
+    ),
+    (
+        "fichas_clinicas: refracción y agudeza numéricas "
+        "(luego: python -m app.infraestructure.utils.backfill_refraccion)",
+        "ALTER TABLE fichas_clinicas "
+        + ", ".join(
+            f"ADD COLUMN IF NOT EXISTS {columna} {_tipo_refraccion(columna)}"
+            for columna in sorted(COLUMNAS_DERIVADAS)
+        ),
+    ),
+    (
+        "tabla cie10 (luego: python -m app.infraestructure.utils.cargar_cie10 <archivo.csv>)",
+        "CREATE TABLE IF NOT EXISTS cie10 (codigo VARCHAR(10) PRIMARY KEY, descripcion TEXT NOT NULL)",
+    ),
+]
+
+
+def _duplicados_sql(tabla, pk, fecha):
+    """pk de las filas sobrantes por ficha: todas menos la más reciente (fecha NULL = la más antigua)."""
+    return (
+        f"SELECT {pk} FROM ("
+        f"SELECT {pk}, row_number() OVER (PARTITION BY ficha_id "
+        f"ORDER BY coalesce({fecha}, '-infinity') DESC, {pk} DESC) AS n FROM {tabla}"
+        f") r WHERE n > 1"
+    )
+
+
+def _indices_unicos_examenes(conn, archivar_duplicados):
+    """
+    Índice único (ficha_id) de cada examen de una fila por ficha. Devuelve
+    {tabla: duplicados} de las tablas que no se pudieron indexar.
+    """
+    pendientes = {}
+    for tabla, pk, fecha in _EXAMENES_POR_FICHA:
+        indice = f"{tabla}_ficha_id_key"
+        if conn.execute(text("SELECT to_regclass(:indice)"), {"indice": indice}).scalar():
+            continue
+        duplicados = conn.execute(text(f"SELECT count(*) FROM ({_duplicados_sql(tabla, pk, fecha)}) d")).scalar()
+        if duplicados and not archivar_duplicados:
+            pendientes[tabla] = duplicados
+            continue
+        if duplicados:
+            print(f"   - {tabla}: archivando {duplicados} duplicados en {tabla}_duplicados")
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {tabla}_duplicados (LIKE {tabla}, "
+                f"archivado_en TIMESTAMP NOT NULL DEFAULT now())"
+            ))
+            conn.execute(text(
+                f"WITH archivados AS ("
+                f"INSERT INTO {tabla}_duplicados SELECT t.* FROM {tabla} t "
+                f"WHERE t.{pk} IN ({_duplicados_sql(tabla, pk, fecha)}) RETURNING {pk}) "
+                f"DELETE FROM {tabla} t USING archivados a WHERE t.{pk} = a.{pk}"
+            ))
+        print(f"   - índice único {indice}")
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {indice} ON {tabla} (ficha_id)"))
+    return pendientes
+
+
+def upgrade_database(archivar_duplicados=False):
+    print("🔄 Aplicando actualizaciones de esquema...")
+    with get_engine().begin() as conn:
+        for descripcion, sentencia in UPGRADES:
+            print(f"   - {descripcion}")
+            conn.execute(text(sentencia))
+
+    # Transacción aparte: si hay duplicados lo anterior ya quedó aplicado
+    with get_engine().begin() as conn:
+        pendientes = _indices_unicos_examenes(conn, archivar_duplicados)
+    if pendientes:
+        print("❌ Exámenes con más de una fila por ficha; no se creó su índice único:")
+        for tabla, duplicados in pendientes.items():
+            print(f"   - {tabla}: {duplicados} filas sobrantes (se conservaría la más reciente)")
+        print("   Revísalas y ejecuta de nuevo con --archivar-duplicados para moverlas a <tabla>_duplicados.")
+        return False
+    print("✅ Esquema actualizado.")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualización de esquema no destructiva")
+    parser.add_argument(
+        "--archivar-duplicados", action="store_true",
+        help="mueve los exámenes duplicados por ficha a <tabla>_duplicados antes del índice único",
+    )
+    args = parser.parse_args()
+    sys.exit(0 if upgrade_database(args.archivar_duplicados) else 1)
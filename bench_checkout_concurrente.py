@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark de checkouts concurrentes contra una base PostgreSQL LOCAL.
+
+Lanza N ventas en paralelo con carritos solapados (mismos productos en distinto
+orden) sobre SaleService.register_sale_from_cart y reporta throughput, latencias
+y cuántos deadlocks / reintentos hubo. Crea sus propios productos de prueba y
+los elimina al terminar.
+
+Uso:
+    python bench_checkout_concurrente.py --workers 8 --ventas 400 --productos 5 --lineas 3
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+# Cargar variables de entorno
+load_dotenv()
+
+from sqlalchemy.exc import DBAPIError
+
+from app.infraestructure.utils.db import SessionLocal, DATABASE_URL
+from app.infraestructure.utils.exceptions import InsufficientStockError
+from app.domain.models.products import Product
+from app.domain.models.sale import Sale, SaleDetail
+from app.domain.models.venta_diaria import VentaDiaria
+from app.domain.use_cases.services.sale_service import SaleService
+
+# SQLSTATE de PostgreSQL que justifican reintentar la venta completa
+PG_DEADLOCK = "40P01"
+PG_SERIALIZATION = "40001"
+MAX_REINTENTOS = 3
+
+
+def _es_local(url):
+    return urlparse(url or "").hostname in ("localhost", "127.0.0.1")
+
+
+def crear_productos(cantidad, stock):
+    """Crea productos de prueba con stock abundante y devuelve sus IDs."""
+    with SessionLocal() as db:
+        productos = [
+            Product(
+                nombre=f"BENCH-{i}",
+                cantidad=stock,
+                costo_unitario=1000,
+                costo_venta_1=3000,
+                costo_venta_2=2000,
+                estado=True,
+            )
+            for i in range(cantidad)
+        ]
+        db.add_all(productos)
+        db.commit()
+        return [p.producto_id for p in productos]
+
+
+def limpiar(producto_ids, venta_ids):
+    """Elimina las ventas, su rollup diario y los productos creados por el benchmark."""
+    with SessionLocal() as db:
+        if venta_ids:
+            db.query(SaleDetail).filter(SaleDetail.venta_id.in_(venta_ids)).delete(synchronize_session=False)
+            db.query(Sale).filter(Sale.venta_id.in_(venta_ids)).delete(synchronize_session=False)
+        db.query(SaleDetail).filter(SaleDetail.producto_id.in_(producto_ids)).delete(synchronize_session=False)
+        # Los productos BENCH-* son solo del benchmark: todo su rollup es de estas ventas
+        db.query(VentaDiaria).filter(VentaDiaria.producto_id.in_(producto_ids)).delete(synchronize_session=False)
+        db.query(Product).filter(Product.producto_id.in_(producto_ids)).delete(synchronize_session=False)
+        db.commit()
+
+
+def un_checkout(service, producto_ids, lineas, usuario_id):
+    """Ejecuta una venta con reintentos ante deadlock/serialización."""
+    carrito = random.sample(producto_ids, min(lineas, len(producto_ids)))
+    random.shuffle(carrito)  # orden distinto en cada caja
+    items = [{"producto_id": pid, "cantidad": 1} for pid in carrito]
+
+    resultado = {"venta_id": None, "deadlocks": 0, "reintentos": 0, "sin_stock": False, "error": None}
+    inicio = time.perf_counter()
+    for intento in range(MAX_REINTENTOS + 1):
+        try:
+            resultado["venta_id"] = service.register_sale_from_cart(items, usuario_id)
+            break
+        except InsufficientStockError:
+            resultado["sin_stock"] = True
+            break
+        except DBAPIError as e:
+            pgcode = getattr(getattr(e, "orig", None), "pgcode", None)
+            if pgcode == PG_DEADLOCK:
+                resultado["deadlocks"] += 1
+            if pgcode in (PG_DEADLOCK, PG_SERIALIZATION) and intento < MAX_REINTENTOS:
+                resultado["reintentos"] += 1
+                continue
+            resultado["error"] = str(e)
+            break
+        except Exception as e:
+            resultado["error"] = str(e)
+            break
+    resultado["latencia"] = time.perf_counter() - inicio
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de checkouts concurrentes")
+    parser.add_argument("--workers", type=int, default=8, help="hilos en paralelo (cajas)")
+    parser.add_argument("--ventas", type=int, default=200, help="total de ventas a registrar")
+    parser.add_argument("--productos", type=int, default=5, help="productos compartidos entre carritos")
+    parser.add_argument("--lineas", type=int, default=3, help="líneas por carrito")
+    parser.add_argument("--usuario-id", type=int, default=None, help="vendedor a asociar (opcional)")
+    parser.add_argument("--force", action="store_true", help="permite ejecutar contra una BD no local")
+    args = parser.parse_args()
+
+    if not _es_local(DATABASE_URL) and not args.force:
+        print("❌ El benchmark solo corre contra PostgreSQL local (usa --force si sabes lo que haces).")
+        sys.exit(1)
+
+    print("🚀 BENCHMARK DE CHECKOUT CONCURRENTE")
+    print("=" * 50)
+    print(f"   Workers: {args.workers} | Ventas: {args.ventas} | Productos: {args.productos} | Líneas: {args.lineas}")
+
+    producto_ids = crear_productos(args.productos, stock=args.ventas * args.lineas)
+    service = SaleService()
+    resultados = []
+
+    inicio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futuros = [
+                pool.submit(un_checkout, service, producto_ids, args.lineas, args.usuario_id)
+                for _ in range(args.ventas)
+            ]
+            for futuro in as_completed(futuros):
+                resultados.append(futuro.result())
+        duracion = time.perf_counter() - inicio
+    finally:
+        limpiar(producto_ids, [r["venta_id"] for r in resultados if r["venta_id"]])
+
+    ok = sum(1 for r in resultados if r["venta_id"])
+    latencias = sorted(r["latencia"] for r in resultados)
+    p95 = latencias[int(len(latencias) * 0.95) - 1] if latencias else 0
+
+    print("\n📊 RESULTADOS")
+    print(f"   Ventas OK:          {ok}/{len(resultados)}")
+    print(f"   Throughput:         {ok / duracion:.1f} ventas/s ({duracion:.2f} s)")
+    print(f"   Latencia p50 / p95: {statistics.median(latencias) * 1000:.1f} ms / {p95 * 1000:.1f} ms")
+    print(f"   Deadlocks:          {sum(r['deadlocks'] for r in resultados)}")
+    print(f"   Reintentos:         {sum(r['reintentos'] for r in resultados)}")
+    print(f"   Sin stock:          {sum(1 for r in resultados if r['sin_stock'])}")
+    errores = [r["error"] for r in resultados if r["error"]]
+    print(f"   Errores:            {len(errores)}")
+    for err in errores[:3]:
+        print(f"   - {err[:120]}")
+
+
+if __name__ == "__main__":
+    main()
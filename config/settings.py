@@ -39,16 +39,27 @@ class BaseConfig:
         print(f"🏠 [BaseConfig] Construyendo URL local: postgresql://{db_user}:***@{db_host}:{db_port}/{db_name}")
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool de conexiones (uno solo por proceso, compartido por SessionLocal y db.session).
+    # Conexiones máximas por worker = DB_POOL_SIZE + DB_MAX_OVERFLOW.
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))        # segundos esperando conexión libre
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '300'))       # segundos antes de reciclar una conexión
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))  # 0 = sin límite
+    SQLALCHEMY_ECHO = os.getenv('SQLALCHEMY_ECHO', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
-        'pool_recycle': 300,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
         'connect_args': {
             'client_encoding': 'utf8',
             'application_name': 'optica_maipu_app',
-            'options': '-c client_encoding=utf8'
+            'options': f'-c client_encoding=utf8 -c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
         },
-        'echo': False,
-        'isolation_level': 'AUTOCOMMIT'
+        'echo': SQLALCHEMY_ECHO,
     }
 
 class DevelopmentConfig(BaseConfig):
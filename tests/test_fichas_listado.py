@@ -0,0 +1,122 @@
+"""
+Regresión de N+1 en GET /api/fichas-clinicas sin base de datos: el handler corre
+contra una sesión y un FichaExamenesRepository falsos que cuentan las consultas;
+la cantidad no debe crecer con el número de fichas de la página.
+
+La verificación con SQL real (PostgreSQL de pruebas) está en test_fichas_query_count.py.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from adapters.input.flask_app.controllers import ficha_clinica_controller_nuevo as modulo
+
+
+class _Fila(SimpleNamespace):
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class _QueryFalsa:
+    """Query encadenable: cada método devuelve la misma query; leer filas cuenta una consulta."""
+
+    def __init__(self, sesion):
+        self._sesion = sesion
+
+    def __getattr__(self, nombre):
+        return lambda *args, **kwargs: self
+
+    def all(self):
+        self._sesion.consultas += 1
+        return list(self._sesion.fichas)
+
+    def first(self):
+        self._sesion.consultas += 1
+        return None
+
+
+class _SesionFalsa:
+    def __init__(self, fichas):
+        self.fichas = fichas
+        self.consultas = 0
+
+    def query(self, *entidades):
+        return _QueryFalsa(self)
+
+    def execute(self, *args, **kwargs):
+        raise AssertionError("el listado no debería ejecutar SQL fuera de la query de fichas")
+
+    scalar = scalars = execute
+
+    def close(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class _RepositorioExamenesFalso:
+    llamadas = 0
+
+    def __init__(self, session):
+        pass
+
+    def cargar_examenes(self, ficha_ids, *args, **kwargs):
+        type(self).llamadas += 1
+        examenes = defaultdict(dict)
+        for ficha_id in ficha_ids:
+            examenes["diagnostico"][ficha_id] = _Fila(diagnostico_principal="Miopía")
+            examenes["tratamiento"][ficha_id] = _Fila(medicamentos="Lubricante")
+        return examenes
+
+
+def _fichas(n):
+    inicio = datetime(2024, 1, 1)
+    paciente = _Fila(
+        paciente_medico_id=1,
+        numero_ficha="F-1",
+        cliente=_Fila(nombres="Ana", ap_pat="Pérez", ap_mat=None, rut="1710034065"),
+    )
+    usuario = _Fila(usuario_id=1, nombre="Médico", username="medico")
+    return [
+        _Fila(
+            ficha_id=i,
+            fecha_consulta=inicio + timedelta(days=i),
+            paciente_medico=paciente,
+            usuario=usuario,
+        )
+        for i in range(n, 0, -1)
+    ]
+
+
+@pytest.fixture
+def listar(monkeypatch):
+    app = Flask(__name__)
+    controller = modulo.FichaClinicaController()
+
+    def _listar(n):
+        sesion = _SesionFalsa(_fichas(n))
+        _RepositorioExamenesFalso.llamadas = 0
+        monkeypatch.setattr(modulo, "SessionLocal", lambda: sesion)
+        monkeypatch.setattr(modulo, "FichaExamenesRepository", _RepositorioExamenesFalso)
+        with app.test_request_context("/api/fichas-clinicas"):
+            resp = controller.get_all_fichas_clinicas()
+            body = resp.get_json()
+        assert body["success"] is True
+        assert len(body["data"]) == n
+        assert all("diagnostico" in f and "tratamiento" in f for f in body["data"])
+        return sesion.consultas, _RepositorioExamenesFalso.llamadas
+
+    return _listar
+
+
+def test_listado_fichas_consultas_constantes_sin_bd(listar):
+    pocas = listar(2)
+    muchas = listar(20)
+
+    assert muchas == pocas
+    # Fichas en una sola lectura y todos los exámenes en una sola llamada al repositorio
+    assert muchas == (1, 1)
@@ -0,0 +1,78 @@
+import pytest
+
+from adapters.input.flask_app.controllers.paciente_controller import PacienteMedicoController
+from app.infraestructure.repositories.sql_persona_search_repository import (
+    BUSQUEDA_LIMIT_DEFAULT,
+    BUSQUEDA_LIMIT_MAX,
+    SQLPersonaSearchRepository,
+    limite_busqueda,
+)
+
+normalizar = SQLPersonaSearchRepository.normalizar
+escape_like = SQLPersonaSearchRepository._escape_like
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [
+        ("  José   PÉREZ ", "jose perez"),
+        ("Ñuñez\tMüller", "nunez muller"),
+        ("1710034065", "1710034065"),
+        ("", ""),
+        (None, ""),
+    ],
+)
+def test_normalizar(texto, esperado):
+    assert normalizar(texto) == esperado
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [
+        ("perez", "perez"),
+        ("100%", r"100\%"),
+        ("ana_maria", r"ana\_maria"),
+        ("c:\\x", r"c:\\x"),
+        ("%_\\", r"\%\_\\"),
+    ],
+)
+def test_escape_like_escapa_comodines(texto, esperado):
+    assert escape_like(texto) == esperado
+
+
+@pytest.mark.parametrize(
+    "valor, esperado",
+    [
+        (None, BUSQUEDA_LIMIT_DEFAULT),
+        ("abc", BUSQUEDA_LIMIT_DEFAULT),
+        ("5", 5),
+        ("0", 1),
+        ("-3", 1),
+        ("1000", BUSQUEDA_LIMIT_MAX),
+    ],
+)
+def test_limite_busqueda(valor, esperado):
+    assert limite_busqueda(valor) == esperado
+
+
+@pytest.mark.parametrize(
+    "q, esperado",
+    [
+        # Cédula válida, con o sin separadores
+        ("1710034065", "1710034065"),
+        ("171003406-5", "1710034065"),
+        (" 1710 034 065 ", "1710034065"),
+        # RUC persona natural
+        ("1710034065001", "1710034065001"),
+        # Verificador incorrecto, provincia inválida o largo distinto
+        ("1710034066", None),
+        ("9910034065", None),
+        ("17100340", None),
+        # Texto: búsqueda por nombre
+        ("perez 1710034065", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_rut_si_identificacion(q, esperado):
+    assert PacienteMedicoController()._rut_si_identificacion(q) == esperado
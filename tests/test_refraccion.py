@@ -0,0 +1,79 @@
+import pytest
+
+from app.infraestructure.utils.refraccion import (
+    parse_agudeza_logmar,
+    parse_dioptrias,
+    parse_eje,
+    valores_numericos,
+)
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [
+        # Notación abreviada en centésimas: cualquier múltiplo de 25 sin punto
+        ("-25", -0.25),
+        ("-50", -0.50),
+        ("-75", -0.75),
+        ("-050", -0.50),
+        ("-125", -1.25),
+        ("+100", 1.00),
+        ("-400", -4.00),
+        # Enteros que no son múltiplo de 25: dioptrías
+        ("-4", -4.0),
+        ("10", 10.0),
+        ("20", 20.0),
+        ("0", 0.0),
+        # Con decimales / unidades / plano
+        ("-1,25", -1.25),
+        ("+0.75D", 0.75),
+        ("-3.00 dp", -3.0),
+        ("plano", 0.0),
+        ("PL", 0.0),
+    ],
+)
+def test_parse_dioptrias(texto, esperado):
+    assert parse_dioptrias(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", ["130", "35", "-45", "abc", "", None, "1.2.3"])
+def test_parse_dioptrias_no_interpretable(texto):
+    assert parse_dioptrias(texto) is None
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [("x90°", 90), ("180", 180), ("0", 0), ("181", None), ("90.5", None), ("", None)],
+)
+def test_parse_eje(texto, esperado):
+    assert parse_eje(texto) == esperado
+
+
+@pytest.mark.parametrize(
+    "texto, esperado",
+    [
+        ("20/20", 0.0),
+        ("20/40", 0.3),
+        ("6/12-2", 0.3),
+        ("1.0", 0.0),
+        ("0,5", 0.3),
+        ("CD", 1.9),
+        ("MM", 2.3),
+        ("PL", None),
+        ("0/20", None),
+        ("", None),
+    ],
+)
+def test_parse_agudeza_logmar(texto, esperado):
+    assert parse_agudeza_logmar(texto) == esperado
+
+
+def test_parse_agudeza_sin_cero_negativo():
+    assert str(parse_agudeza_logmar("1.0")) == "0.0"
+
+
+def test_valores_numericos_solo_campos_presentes():
+    assert valores_numericos({"esfera_od": "-125", "eje_od": "x90"}) == {
+        "esfera_od_d": -1.25,
+        "eje_od_grados": 90,
+    }